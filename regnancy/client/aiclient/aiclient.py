@@ -40,8 +40,8 @@ names = [
     ]
 
 
-def get_random_name():
-    return random.choice(names)
+def get_random_name(rng=random):
+    return rng.choice(names)
 
 def get_aiclient(pipe):
     return _AiClient(pipe, _BigMoneyStrategy())
@@ -61,7 +61,7 @@ def can_afford(aiclient, card):
     return aiclient.player.money >= card.cost[0] and aiclient.player.potion >= card.cost[1]  
 
 def count(aiclient, card):
-    return len([c for c in aiclient.deck if isinstance(c, card)])
+    return sum(n for (cls, n) in aiclient.deck.iteritems() if issubclass(cls, card))
 
 class _Strategy(object):
 
@@ -116,7 +116,7 @@ class _AiClient(object):
         self.id = None
         self.last_id = 0
         self.board = []
-        self.deck = []
+        self.deck = {}  # key: card class value: number of these cards
         self.players = []
         self.strategy = strategy
 
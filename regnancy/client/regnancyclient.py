@@ -1,12 +1,12 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
-import framework.networking as nwp
-
 from framework.PodSixNet.Connection import ConnectionListener
 from framework.locals import *
 from framework.event import *
-from game.pile import KingdomPile
+from framework.regnancyexception import OutOfSyncException
+from game import sync, wire
+from game.compression import COMPRESSION
 import socket
 
 class RegnancyClient(ConnectionListener):
@@ -16,10 +16,12 @@ class RegnancyClient(ConnectionListener):
         self.sub_id = None
         self.global_gamestate = None
         self.result = None
+        self.mirror = sync.Mirror()
         self.net_handler = {PLAYERINFO: self.proceed_playerinfo,
                             PHASE: self.proceed_phase,
                             SUBID: self.proceed_subid,
                             HAND: self.proceed_hand,
+                            DECK: self.proceed_hand,
                             BOARD: self.proceed_board,
                             BOARDSETUP: self.proceed_boardsetup,
                             BOARDCOMMON: self.proceed_boardcommon}
@@ -39,6 +41,7 @@ class RegnancyClient(ConnectionListener):
         (host, port) = event.con_data
         self.con_data = (host, port)
         self.Connect((host, port))
+        self.connection.compression = COMPRESSION
 
     def handle_tickevent(self, event):
         if hasattr(self, 'connection'):
@@ -46,19 +49,19 @@ class RegnancyClient(ConnectionListener):
             self.Pump()
 
     def handle_playcardevent(self, event):
-        self.connection.Send({ACTION: RESPONSE,
-                              PLAYCARD: nwp.pack(event.card_id),
-                              ID: self.id})
+        self.connection.Send(wire.encode({ACTION: RESPONSE,
+                                          PLAYCARD: event.card_id,
+                                          ID: self.id}))
 
     def handle_answerevent(self, event):
-        self.connection.Send({ACTION: RESPONSE,
-                              ANSWER: nwp.pack(event.answer),
-                              ID: self.id, SUBID: nwp.pack(self.sub_id)})
+        self.connection.Send(wire.encode({ACTION: RESPONSE,
+                                          ANSWER: event.answer,
+                                          ID: self.id, SUBID: self.sub_id}))
 
     def handle_buycardevent(self, event):
-        self.connection.Send({ACTION: RESPONSE,
-                              BUYFROMPILE: nwp.pack(event.pile_id),
-                              ID: self.id})
+        self.connection.Send(wire.encode({ACTION: RESPONSE,
+                                          BUYFROMPILE: event.pile_id,
+                                          ID: self.id}))
 
     def handle_requeststartgame(self, event):
             self.connection.Send({ACTION: REQUEST,
@@ -70,6 +73,23 @@ class RegnancyClient(ConnectionListener):
                               VALUE: event.name,
                               ID: self.id})
 
+    def handle_requestrooms(self, event):
+        self.connection.Send({ACTION: REQUEST,
+                              VALUE: ROOMS,
+                              ID: self.id})
+
+    def handle_requestcreateroom(self, event):
+        self.connection.Send({ACTION: REQUEST,
+                              VALUE: CREATEROOM,
+                              INFO: event.name,
+                              ID: self.id})
+
+    def handle_requestjoinroom(self, event):
+        self.connection.Send({ACTION: REQUEST,
+                              VALUE: JOINROOM,
+                              ROOM: event.room_id,
+                              ID: self.id})
+
     def handle_endphaseevent(self, event):
         self.connection.Send({ACTION: REQUEST,
                               VALUE: ENDPHASE,
@@ -99,18 +119,26 @@ class RegnancyClient(ConnectionListener):
     def Network_setmaster(self, data):
         SetMasterEvent(data[VALUE]).post(self.ev)
 
+    def Network_room(self, data):
+        # the server sends the new room all it sees from scratch
+        self.mirror = sync.Mirror()
+        RoomJoinedEvent(data[ROOM], data[INFO]).post(self.ev)
+
+    def Network_rooms(self, data):
+        RoomsEvent(data[ROOMS]).post(self.ev)
+
     def Network_message(self, data):
         self.add_message(data[MESSAGE])
 
     def Network_end(self, data):
-        result = nwp.unpack(data[RESULT])
+        result = wire.decode(data)[RESULT]
         EndGameEvent(result).post(self.ev)
 
     def Network_start(self, data):
         GameStartedEvent().post(self.ev)
 
     def proceed_playerinfo(self, data):
-        PlayerInfoEvent(nwp.unpack(data[PLAYERINFO])).post(self.ev)
+        PlayerInfoEvent(data[PLAYERINFO]).post(self.ev)
 
     def proceed_phase(self, data):
         phase = data[PHASE]
@@ -122,38 +150,38 @@ class RegnancyClient(ConnectionListener):
 
     def proceed_subid(self, data):
         if data[CLIENTID] == self.id:
-            info = nwp.unpack(data[INFO]) if INFO in data else None
-            self.sub_id = nwp.unpack(data[SUBID])
+            info = data.get(INFO)
+            self.sub_id = data[SUBID]
             SubPhaseChangedEvent(data[SUBPHASE], info, self.sub_id).post(self.ev)
 
     def proceed_hand(self, data):
-        NewHandEvent(nwp.unpack(data[HAND]), nwp.unpack(data[DECK])).post(self.ev)
+        NewHandEvent(self.mirror.parts.get(HAND, []), self.mirror.parts.get(DECK, {})).post(self.ev)
 
     def proceed_board(self, data):
-        NewBoardEvent(nwp.unpack(data[BOARD])).post(self.ev)
+        NewBoardEvent(data[BOARD]).post(self.ev)
 
     def proceed_boardsetup(self, data):
-        newboardsetup = nwp.unpack(data[BOARDSETUP])
-        self.boardsetup = []
-        for item in newboardsetup:
-            pile = KingdomPile(item[1], item[2])
-            pile.id = item[0]
-            pile.calc_cost = item[3]
-            self.boardsetup.append(pile)
+        self.boardsetup = data[BOARDSETUP]
         NewBoardSetupEvent(self.boardsetup).post(self.ev)
 
     def proceed_boardcommon(self, data):
-        newboardcommon = nwp.unpack(data[BOARDCOMMON])
-        self.boardcommon = []
-        for item in newboardcommon:
-            pile = KingdomPile(item[1], item[2])
-            pile.id = item[0]
-            pile.calc_cost = item[3]
-            self.boardcommon.append(pile)
+        self.boardcommon = data[BOARDCOMMON]
         NewBoardCommonEvent(self.boardcommon).post(self.ev)
 
     def Network_update(self, data):
-        for key in self.net_handler:
-            if key in data:
-                self.net_handler[key](data)
-                return
+        data = wire.decode(data)
+        for field in sync.PARTS:
+            if field in data:
+                try:
+                    part = self.mirror.update(field, data.pop(field))
+                except OutOfSyncException, e:
+                    logging.warning("%s, asking for a resync", e)
+                    self.connection.Send({ACTION: REQUEST, VALUE: RESYNC, ID: self.id})
+                    continue
+                if part is not None:
+                    data[field] = part
+        handled = set()
+        for (key, handler) in self.net_handler.iteritems():
+            if key in data and not handler in handled:
+                handled.add(handler)
+                handler(data)
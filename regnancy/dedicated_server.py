@@ -3,6 +3,7 @@
 
 import sys
 import server.regnancyserver
+import server.shard
 
 try:
     import psyco
@@ -15,10 +16,13 @@ if __name__ == "__main__":
     if len(sys.argv) < 2:
         print "Missing port number."
         print "Usage:"
-        print "  python start_server.py 9989"
+        print "  python start_server.py 9989 [worker processes]"
         sys.exit()
     
     port = (sys.argv)[1]
-    s = server.regnancyserver.RegnancyServer(port=int(port))
+    if len(sys.argv) > 2:
+        s = server.shard.ShardedServer(int((sys.argv)[2]), port=int(port))
+    else:
+        s = server.regnancyserver.RegnancyServer(port=int(port))
     
     s.Launch()
@@ -1,10 +1,13 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
+import logging
+import struct
 import sys
 import traceback
 from errno import EWOULDBLOCK
-from async import asynchat
+from async import Stream
+from compress import MAX_SIZE
 from rencode import loads, dumps
 
 from threading import Lock
@@ -27,44 +30,117 @@ class IdGenProxy(object):
         
 id = IdGenProxy()
 
+# every message is sent as its size, followed by its rencoded data
+FRAME = struct.Struct('!I')
 
-class Channel(asynchat.async_chat):
+# set in the size of a message that is compressed, see compress.Compression
+COMPRESSED = 1 << 31
 
-    endchars = '\0---\0'
+# the size a message may have, the other end is cut off when it announces
+# a larger one instead of buffering it
+MAX_FRAME = MAX_SIZE
+
+_action_tables = {}
+
+
+def get_action_table(cls):
+    """
+    Returns the handlers of the messages for a Channel class, as a dict
+    of action: (Network_<action>, Network) and a tuple of the handlers of
+    any other action: (Network,). Handlers a class doesn't have are left
+    out. The tables are made once for each class."""
+
+    if cls not in _action_tables:
+        default = tuple(getattr(cls, n) for n in ('Network',) if hasattr(cls, n))
+        table = dict((n[len('Network_'):], (getattr(cls, n),) + default)
+                     for n in dir(cls) if n.startswith('Network_'))
+        _action_tables[cls] = (table, default)
+    return _action_tables[cls]
+
+
+class Channel(Stream):
+
+    # a compress.Compression to send large messages compressed, which the
+    # other end has to use as well, or None to send all as they are
+    compression = None
+
+    # False to close the channel when the other end sends a compressed
+    # message, as it is never meant to compress
+    accept_compressed = True
 
     def __init__(self, conn=None, addr=(), server=None, map=None):
-        asynchat.async_chat.__init__(self, conn, map)
+        Stream.__init__(self, conn, map)
         self.addr = addr
         self._server = server
-        self._ibuffer = ""
-        self.set_terminator(self.endchars)
+        (self._actions, self._default_actions) = get_action_table(self.__class__)
         self.sendqueue = []
 
-    def collect_incoming_data(self, data):
-        self._ibuffer += data
-
-    def found_terminator(self):
-        data = loads(self._ibuffer)
-        self._ibuffer = ""
+    def handle_incoming(self, data):
+        """Handles every complete message in data, see found_terminator"""
+
+        handled = 0
+        while len(data) - handled >= FRAME.size and self.connected:
+            start = handled + FRAME.size
+            size = FRAME.unpack_from(data, handled)[0]
+            if size & ~COMPRESSED > MAX_FRAME:
+                self.reject("a message of %d bytes", size & ~COMPRESSED)
+                return len(data)
+            end = start + (size & ~COMPRESSED)
+            if end > len(data):
+                break
+            self.found_terminator(data[start:end], size & COMPRESSED)
+            handled = end
+        return handled
+
+    def reject(self, what, *args):
+        """Closes the channel because the other end sent what it mustn't"""
+
+        logging.warning("closing %s, it sent " + what, self.addr, *args)
+        self.handle_close()
+
+    def found_terminator(self, message, compressed=False):
+        # rencode decodes a memoryview in place, but slicing a memoryview
+        # is slow in Python 2, so one copy and decoding that is faster
+        message = message.tobytes()
+        if compressed:
+            if not (self.accept_compressed and self.compression):
+                self.reject("a compressed message")
+                return
+            size = len(message)
+            message = self.compression.decompress(message)
+            if message is None:
+                self.reject("a compressed message of %d bytes too large to decompress", size)
+                return
+        data = loads(message)
 
         if type(dict()) == type(data) and data.has_key('action'):
-            [getattr(self, n)(data) for n in ('Network_' + data['action'],
-             'Network') if hasattr(self, n)]
+            for f in self._actions.get(data['action'], self._default_actions):
+                f(self, data)
         else:
             print "OOB data:", data
 
     def Pump(self):
-        [asynchat.async_chat.push(self, d) for d in self.sendqueue]
-        self.sendqueue = []
+        if self.sendqueue:
+            self.write(''.join(self.sendqueue))
+            self.sendqueue = []
 
     def Send(self, data):
-        """Returns the number of bytes sent after enoding."""
+        """
+        Queues the message until the next Pump, or the next flush of the
+        server. Returns the number of bytes sent after enoding."""
 
         data['PID'] = id.next()
 
-        outgoing = dumps(data) + self.endchars
+        outgoing = dumps(data)
+        size = len(outgoing)
+        if self.compression:
+            (outgoing, compressed) = self.compression.compress(data.get('action'), outgoing)
+            size = len(outgoing) | (COMPRESSED if compressed else 0)
+        if not self.sendqueue and self._server is not None:
+            self._server.pending.append(self)
+        self.sendqueue.append(FRAME.pack(size))
         self.sendqueue.append(outgoing)
-        return len(outgoing)
+        return FRAME.size + len(outgoing)
 
     def handle_connect(self):
         if hasattr(self, "Connected"):
@@ -84,7 +160,7 @@ class Channel(asynchat.async_chat):
         if hasattr(self, "Error"):
             self.Error(sys.exc_info()[1])
         else:
-            asynchat.async_chat.handle_error(self)
+            Stream.handle_error(self)
 
     def handle_expt(self):
         pass
@@ -92,6 +168,8 @@ class Channel(asynchat.async_chat):
     def handle_close(self):
         if hasattr(self, "Close"):
             self.Close()
-        asynchat.async_chat.handle_close(self)
+        if self._server and self in self._server.channels:
+            self._server.channels.remove(self)
+        Stream.handle_close(self)
 
 
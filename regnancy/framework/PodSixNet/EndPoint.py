@@ -3,10 +3,14 @@
 
 import socket
 import sys
+from time import time
 
 from async import poll
 from Channel import Channel
 
+# seconds DoConnect waits for the server before it gives up
+CONNECT_TIMEOUT = 10.0
+
 
 class EndPoint(Channel):
 
@@ -18,6 +22,7 @@ class EndPoint(Channel):
         self.address = address
         self.isConnected = False
         self.queue = []
+        self.connect_deadline = None
         if map is None:
             self._map = {}
         else:
@@ -28,6 +33,7 @@ class EndPoint(Channel):
             self.address = address
         try:
             Channel.__init__(self, map=self._map)
+            self.connect_deadline = time() + CONNECT_TIMEOUT
             self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
             self.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
             self.connect(self.address)
@@ -43,6 +49,11 @@ class EndPoint(Channel):
         Channel.Pump(self)
         self.queue = []
         poll(map=self._map)
+        if self.connect_deadline and time() > self.connect_deadline:
+            self.connect_deadline = None
+            if not self.connected:
+                self.close()
+                self.ConnectionError()
 
     def Close(self):
         self.isConnected = False
@@ -50,6 +61,7 @@ class EndPoint(Channel):
         self.queue.append({"action": "disconnected"})
 
     def Connected(self):
+        self.connect_deadline = None
         self.queue.append({"action": "socketConnect"})
 
     def Network_connected(self, data):
@@ -13,11 +13,12 @@ class Server(asyncore.dispatcher):
     channelClass = Channel
 
     def __init__(self, channelClass=None, localaddr=("127.0.0.1", 31425),
-                 listeners=15):
+                 listeners=socket.SOMAXCONN):
         if channelClass:
             self.channelClass = channelClass
         self._map = {}
         self.channels = []
+        self.pending = []  # the channels that have queued messages, see flush
         asyncore.dispatcher.__init__(self, map=self._map)
         self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
         self.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
@@ -26,22 +27,40 @@ class Server(asyncore.dispatcher):
         self.listen(listeners)
 
     def handle_accept(self):
+        """Accepts all clients that are waiting, not just the first one"""
+
+        while self.accept_one():
+            pass
+
+    def accept_one(self):
         try:
             (conn, addr) = self.accept()
         except socket.error:
             print 'warning: server accept() threw an exception'
-            return
+            return False
         except TypeError:
-            print 'warning: server accept() threw EWOULDBLOCK'
-            return
+            # accept() returned None: EWOULDBLOCK, nobody is waiting anymore
+            return False
 
         self.channels.append(self.channelClass(conn, addr, self, self._map))
         (self.channels)[-1].Send({"action": "connected"})
         if hasattr(self, "Connected"):
             self.Connected((self.channels)[-1], addr)
+        return True
+
+    def flush(self):
+        """
+        Writes the messages each channel queued since the last flush, all
+        at once, see Channel.Send. Channels closed meanwhile may queue more
+        messages to the others, which get written as well."""
+
+        while self.pending:
+            (pending, self.pending) = (self.pending, [])
+            for channel in pending:
+                channel.Pump()
 
     def Pump(self):
-        [c.Pump() for c in self.channels]
+        self.flush()
         poll(map=self._map)
 
 
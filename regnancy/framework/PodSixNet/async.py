@@ -1,14 +1,16 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
-""" monkey patched version of asynchat to allow map argument on all version of Python, and the best version of the poll function. """
+""" monkey patched version of asynchat to allow map argument on all version of Python, the best version of the poll function, and a buffered Stream to build channels on. """
 
 from sys import version
 
 import asynchat
 import asyncore
+import socket
 
-if float(version[:3]) < 2.5:
+if float(version[:3]) < 2.5 or hasattr(asyncore.select, 'poll'):
+    # poll(2) has no limit on the number of sockets, unlike select(2)
     from asyncore import poll2 as poll
 else:
     from asyncore import poll
@@ -25,3 +27,98 @@ if float(version[:3]) < 2.6:
 
     asynchat.async_chat.__init__ = asynchat_monkey_init
 
+
+class Stream(asyncore.dispatcher):
+
+    """
+    A buffered byte stream over a socket. It reads as much as the socket
+    has (up to read_size) right into a bytearray and lets handle_incoming
+    take what it can use of it, and keeps everything written to it until
+    the socket takes it, sending as much as possible at once instead of the
+    small chunks of asynchat. It only waits for the socket to become
+    writable while there is something left to send."""
+
+    read_size = 65536
+
+    def __init__(self, conn=None, map=None):
+        asyncore.dispatcher.__init__(self, sock=conn, map=map)
+        self._obuffer = bytearray()
+        self._ibuffer = bytearray(self.read_size)
+        self._istart = 0  # _ibuffer[_istart:_iend] is read but not handled yet
+        self._iend = 0
+
+    def handle_incoming(self, data):
+        """
+        Called with a memoryview of the data read but not handled yet.
+        Returns how many bytes from its start got handled, the rest is
+        passed again with the next data read."""
+
+        return len(data)
+
+    def recv_into(self, buffer):
+        """Like recv, but reads into the buffer and returns the number of bytes read"""
+
+        try:
+            read = self.socket.recv_into(buffer)
+        except socket.error, why:
+            if why.args[0] in asyncore._DISCONNECTED:
+                self.handle_close()
+                return 0
+            raise
+        if not read:
+            self.handle_close()
+        return read
+
+    def __make_room(self):
+        """Makes room for read_size more bytes after the data not handled yet"""
+
+        if len(self._ibuffer) - self._iend >= self.read_size:
+            return
+        pending = self._ibuffer[self._istart:self._iend]
+        if len(pending) + self.read_size > len(self._ibuffer):
+            self._ibuffer = bytearray(max(2 * len(self._ibuffer), len(pending) + self.read_size))
+        self._ibuffer[:len(pending)] = pending
+        (self._istart, self._iend) = (0, len(pending))
+
+    def write(self, data):
+        self._obuffer.extend(data)
+        self.flush()
+
+    def flush(self):
+        """Sends as much of the buffered data as the socket takes right now"""
+
+        while self._obuffer and self.connected:
+            try:
+                sent = self.send(self._obuffer)
+            except socket.error:
+                self.handle_error()
+                return
+            if not sent:
+                return
+            del (self._obuffer)[:sent]
+
+    def handle_read(self):
+        self.__make_room()
+        view = memoryview(self._ibuffer)
+        read = self.recv_into(view[self._iend:])
+        if not read:
+            return
+        self._iend += read
+        self._istart += self.handle_incoming(view[self._istart:self._iend])
+        if self._istart == self._iend:
+            (self._istart, self._iend) = (0, 0)
+            if len(self._ibuffer) > 4 * self.read_size:
+                # don't keep the room a single large message needed
+                self._ibuffer = bytearray(self.read_size)
+
+    def handle_write(self):
+        self.flush()
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return bool(self._obuffer) or not self.connected
+
+    def handle_close(self):
+        self.close()
@@ -0,0 +1,98 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Compression of the messages a Channel sends.
+
+A Compression decides by the action of a message and its size whether
+to send it compressed: messages smaller than the threshold of their
+action go out as they are, as the work and the bytes of compressing
+them don't pay off. Larger ones are deflated against a preset
+dictionary of typical messages, so even a message of a few dozen bytes
+shrinks, since most of its keys and values are found in the dictionary.
+
+zlib of Python 2 takes no dictionary, so the compressor is primed with
+it once and copied for each message, and so is the decompressor. Both
+ends have to use the same dictionary. A small window keeps the copies
+cheap, and limits the dictionary to MAX_DICTIONARY bytes.
+
+A few hundred bytes of deflate inflate to megabytes, so a message that
+would grow beyond max_size is not decompressed.
+"""
+
+from time import time
+import zlib
+
+LEVEL = 6
+WINDOW_BITS = 11
+MEM_LEVEL = 4
+
+# deflate can't refer back to the last bytes of its window
+MAX_DICTIONARY = (1 << WINDOW_BITS) - 262
+
+# every compressed message ends with the empty block of a sync flush,
+# which is left out on the wire
+SYNC_TAIL = '\x00\x00\xff\xff'
+
+# the size a message may have once decompressed
+MAX_SIZE = 1 << 22
+
+
+class Compression(object):
+
+    def __init__(self, dictionary, thresholds=None, threshold=None, max_size=MAX_SIZE):
+        """
+        dictionary: typical messages, the most common last
+        thresholds: key: action value: the size from which its messages
+                    get compressed, None to never compress them
+        threshold: the same for the actions not in thresholds
+        max_size: the size a message may have once decompressed"""
+
+        assert len(dictionary) <= MAX_DICTIONARY, "dictionary is too large"
+        self.thresholds = thresholds or {}
+        self.threshold = threshold
+        self.max_size = max_size
+        self.stats = {}  # key: action value: [messages, compressed, bytes, bytes sent, seconds]
+
+        self._compressor = zlib.compressobj(LEVEL, zlib.DEFLATED, -WINDOW_BITS, MEM_LEVEL)
+        primer = self._compressor.compress(dictionary) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        self._decompressor = zlib.decompressobj(-WINDOW_BITS)
+        self._decompressor.decompress(primer)
+
+    def compress(self, action, data):
+        """Returns what to send of the encoded message, and if it is compressed"""
+
+        start = time()
+        threshold = self.thresholds.get(action, self.threshold)
+        size = len(data)
+        if threshold is not None and size >= threshold:
+            compressor = self._compressor.copy()
+            deflated = (compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH))[:-len(SYNC_TAIL)]
+            if len(deflated) < size:
+                data = deflated
+        compressed = len(data) < size
+        stats = self.stats.get(action)
+        if stats is None:
+            stats = (self.stats)[action] = [0, 0, 0, 0, 0.0]
+        stats[0] += 1
+        stats[1] += compressed
+        stats[2] += size
+        stats[3] += len(data)
+        stats[4] += time() - start
+        return (data, compressed)
+
+    def decompress(self, data):
+        """Returns the decompressed message, or None if it is larger than max_size"""
+
+        decompressor = self._decompressor.copy()
+        message = decompressor.decompress(data + SYNC_TAIL, self.max_size + 1)
+        if decompressor.unconsumed_tail or len(message) > self.max_size:
+            return None
+        return message
+
+    def report(self):
+        """Returns a line about the messages of each action sent so far"""
+
+        return ["%s: %i messages, %i compressed, %i -> %i bytes, %.1f us each" %
+                (action, n, compressed, size, sent, 1e6 * seconds / n)
+                for (action, (n, compressed, size, sent, seconds)) in sorted(self.stats.items())]
@@ -0,0 +1,214 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+A benchmark of the channels over the loopback interface: a server in a
+process of its own echoes the messages of many clients, each of which
+sends the next message as soon as it got the last one back.
+
+It runs once with the channels of this package, and once with the
+asynchat channels they replaced, which are kept here for that only:
+they frame messages by a terminator, push them in 4 KiB pieces and
+wait on select, and their server pumps every channel on every loop.
+
+    python loopback.py [clients] [seconds] [payload size]
+"""
+
+import asynchat
+import asyncore
+import socket
+import sys
+from multiprocessing import Pipe, Process
+from time import time
+
+from async import poll
+from Channel import Channel
+from EndPoint import EndPoint
+from Server import Server
+from rencode import dumps, loads
+
+TRANSPORTS = ('asynchat', 'stream')
+
+
+class ChatChannel(asynchat.async_chat):
+
+    """A channel as it was before async.Stream, see the module"""
+
+    endchars = '\0---\0'
+
+    def __init__(self, conn=None, addr=(), server=None, map=None):
+        asynchat.async_chat.__init__(self, conn, map)
+        self.addr = addr
+        self._server = server
+        self._ibuffer = ''
+        self.set_terminator(self.endchars)
+        self.sendqueue = []
+
+    def collect_incoming_data(self, data):
+        self._ibuffer += data
+
+    def found_terminator(self):
+        data = loads(self._ibuffer)
+        self._ibuffer = ''
+        for n in ('Network_' + data['action'], 'Network'):
+            if hasattr(self, n):
+                getattr(self, n)(data)
+
+    def Pump(self):
+        for d in self.sendqueue:
+            self.push(d)
+        self.sendqueue = []
+
+    def Send(self, data):
+        self.sendqueue.append(dumps(data) + self.endchars)
+
+    def handle_connect(self):
+        pass
+
+
+class ChatServer(asyncore.dispatcher):
+
+    """A server as it was before async.Stream, see the module"""
+
+    def __init__(self, channelClass, localaddr):
+        self.channelClass = channelClass
+        self._map = {}
+        self.channels = []
+        asyncore.dispatcher.__init__(self, map=self._map)
+        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.set_reuse_addr()
+        self.bind(localaddr)
+        self.listen(15)
+
+    def handle_accept(self):
+        accepted = self.accept()
+        if accepted:
+            self.channels.append(self.channelClass(accepted[0], accepted[1], self, self._map))
+            (self.channels)[-1].Send({'action': 'connected'})
+
+    def Pump(self):
+        for c in self.channels:
+            c.Pump()
+        asyncore.poll(map=self._map)
+
+
+class ChatEcho(ChatChannel):
+
+    def Network_ping(self, data):
+        self.Send({'action': 'pong', 'data': data['data']})
+
+
+class StreamEcho(Channel):
+
+    def Network_ping(self, data):
+        self.Send({'action': 'pong', 'data': data['data']})
+
+
+class Pinger(object):
+
+    """The client side, mixed into the channel of a transport"""
+
+    payload = ''
+    pongs = 0
+    wrong = 0  # pongs that didn't bring the payload back
+    isConnected = False
+
+    def Network(self, data):
+        pass  # rather than queue every message like EndPoint
+
+    def Network_connected(self, data):
+        self.isConnected = True
+        self.Send({'action': 'ping', 'data': self.payload})
+
+    def Network_pong(self, data):
+        self.pongs += 1
+        self.wrong += data['data'] != self.payload
+        self.Send({'action': 'ping', 'data': self.payload})
+
+
+class ChatPinger(Pinger, ChatChannel):
+
+    def __init__(self, address, map):
+        ChatChannel.__init__(self, map=map)
+        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.connect(address)
+
+
+class StreamPinger(Pinger, EndPoint):
+
+    def __init__(self, address, map):
+        EndPoint.__init__(self, address, map)
+        self.DoConnect()
+
+
+def serve(transport, pipe):
+    """Runs an echo server of the transport, and sends its address to the pipe"""
+
+    if transport == 'stream':
+        server = Server(StreamEcho, ('127.0.0.1', 0))
+    else:
+        server = ChatServer(ChatEcho, ('127.0.0.1', 0))
+    pipe.send(server.socket.getsockname())
+    while True:
+        server.Pump()
+        if transport == 'stream':
+            poll(0.05, server._map)
+
+
+def run(transport, clients=300, seconds=5, size=16):
+    """
+    Runs the benchmark for one of TRANSPORTS. Returns the number of clients
+    that connected within 30 seconds, the seconds they took, the round trips
+    per second and the number of messages that came back wrong."""
+
+    (pipe, child_pipe) = Pipe()
+    server = Process(target=serve, args=(transport, child_pipe))
+    server.daemon = True
+    server.start()
+    address = pipe.recv()
+    # the clients wait on poll for both, so only the server is compared
+    if transport == 'stream':
+        (pinger, pump) = (StreamPinger, Channel.Pump)
+    else:
+        (pinger, pump) = (ChatPinger, ChatChannel.Pump)
+    shared = {}
+    pingers = []
+    try:
+        start = time()
+        for _ in xrange(clients):
+            p = pinger(address, shared)
+            p.payload = 'x' * size
+            pingers.append(p)
+        while not all(p.isConnected for p in pingers) and time() - start < 30:
+            for p in pingers:
+                pump(p)
+            poll(0.01, shared)
+        connected = time()
+        pongs = sum(p.pongs for p in pingers)
+        while time() - connected < seconds:
+            for p in pingers:
+                pump(p)
+            poll(0.01, shared)
+        pongs = sum(p.pongs for p in pingers) - pongs
+        return (sum(p.isConnected for p in pingers), connected - start,
+                pongs / (time() - connected), sum(p.wrong for p in pingers))
+    finally:
+        server.terminate()
+        server.join()
+        for p in pingers:
+            p.close()
+
+
+def bench(clients=300, seconds=5, size=16):
+    """Prints the results of run for all TRANSPORTS, and returns them by transport"""
+
+    results = {}
+    for transport in TRANSPORTS:
+        (connected, took, rate, _) = results[transport] = run(transport, clients, seconds, size)
+        print '%-9s %d of %d clients connected after %.2f s, %.0f round trips/s with %d bytes of data' % \
+            (transport, connected, clients, took, rate, size)
+    return results
+
+
+if __name__ == '__main__':
+    bench(*[int(a) for a in sys.argv[1:4]])
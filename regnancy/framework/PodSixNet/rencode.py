@@ -17,20 +17,28 @@ b-encodings:
 The rencode format is not standardized, and may change with different
 rencode module versions, so you should check that you are using the
 same rencode version throughout your project.
+
+dumps and loads share no state but caches of the encodings of ints and
+short strings, so they take no lock. loads decodes a str, or a buffer
+given as memoryview, in place: ints and floats are unpacked at their
+offset, only strings get sliced out. For messages of a few hundred
+bytes, copying the memoryview into a str once and decoding that is
+still faster, as slicing a memoryview is slow in Python 2.
+
+    python rencode.py bench [path of another rencode.py to compare with]
 """
 
 __version__ = '1.0.0-ntk'
 __all__ = ['dumps', 'loads', 'serializable']
 
-from base64 import b64encode, b64decode
+from binascii import a2b_base64, b2a_base64
 
 import inspect
 import struct
-
-from threading import Lock
+import sys
 
 from types import StringType, IntType, LongType, DictType, ListType, \
-    TupleType, FloatType, NoneType
+    TupleType, FloatType, NoneType, BooleanType
 
 
 class AlreadyRegistered(Exception):
@@ -142,65 +150,104 @@ TUPLE_FIXED_START = LIST_FIXED_START + LIST_FIXED_COUNT
 TUPLE_FIXED_COUNT = 32
 
 
+# the encodings of the ints from -128 to 127, and of the headers of the
+# containers of a fixed length
+_INTS = dict((i, chr(INT_POS_FIXED_START + i)) for i in range(INT_POS_FIXED_COUNT))
+_INTS.update((-1 - i, chr(INT_NEG_FIXED_START + i)) for i in range(INT_NEG_FIXED_COUNT))
+_INTS.update((i, CHR_INT1 + struct.pack('!b', i)) for i in range(-128, 128) if not i in _INTS)
+_LIST_HEADERS = tuple(chr(LIST_FIXED_START + i) for i in range(LIST_FIXED_COUNT))
+_TUPLE_HEADERS = tuple(chr(TUPLE_FIXED_START + i) for i in range(TUPLE_FIXED_COUNT))
+_DICT_HEADERS = tuple(chr(DICT_FIXED_START + i) for i in range(DICT_FIXED_COUNT))
+
+# the encodings of the short strings seen last, as most strings sent are
+# the keys and names that come up in every message
+MAX_CACHED_STRINGS = 4096
+_strings = {}
+_decoded = {}  # the same the other way around
+
+_pack_h = struct.Struct('!h').pack
+_pack_l = struct.Struct('!l').pack
+_pack_q = struct.Struct('!q').pack
+_pack_f = struct.Struct('!f').pack
+_pack_d = struct.Struct('!d').pack
+_unpack_b = struct.Struct('!b').unpack_from
+_unpack_h = struct.Struct('!h').unpack_from
+_unpack_l = struct.Struct('!l').unpack_from
+_unpack_q = struct.Struct('!q').unpack_from
+_unpack_f = struct.Struct('!f').unpack_from
+_unpack_d = struct.Struct('!d').unpack_from
+
+# the data is decoded where it is, a str or a memoryview of a buffer, by
+# unpacking at an offset instead of slicing, and x[f] is a character of both
+
+
+def _bytes(x, start, end):
+    if type(x) is str:
+        return x[start:end]
+    return x[start:end].tobytes()
+
+
+def _find(x, c, f, limit):
+    """Returns the position of the character c in x after f, within limit bytes"""
+
+    i = _bytes(x, f, f + limit).find(c)
+    if i < 0:
+        raise ValueError('overflow' if len(x) > f + limit else 'truncated')
+    return f + i
+
+
 def decode_int(x, f):
     f += 1
-    newf = x.index(CHR_TERM, f)
-    if newf - f >= MAX_INT_LENGTH:
-        raise ValueError('overflow')
+    newf = _find(x, CHR_TERM, f, MAX_INT_LENGTH)
+    s = _bytes(x, f, newf)
     try:
-        n = int(x[f:newf])
+        n = int(s)
     except (OverflowError, ValueError):
-        n = long(x[f:newf])
-    if x[f] == '-':
-        if x[f + 1] == '0':
+        n = long(s)
+    if s[0] == '-':
+        if s[1] == '0':
             raise ValueError
-    elif x[f] == '0' and newf != f + 1:
+    elif s[0] == '0' and newf != f + 1:
         raise ValueError
     return (n, newf + 1)
 
 
 def decode_intb(x, f):
-    f += 1
-    return (struct.unpack('!b', x[f:f + 1])[0], f + 1)
+    return (_unpack_b(x, f + 1)[0], f + 2)
 
 
 def decode_inth(x, f):
-    f += 1
-    return (struct.unpack('!h', x[f:f + 2])[0], f + 2)
+    return (_unpack_h(x, f + 1)[0], f + 3)
 
 
 def decode_intl(x, f):
-    f += 1
-    return (struct.unpack('!l', x[f:f + 4])[0], f + 4)
+    return (_unpack_l(x, f + 1)[0], f + 5)
 
 
 def decode_intq(x, f):
-    f += 1
-    return (struct.unpack('!q', x[f:f + 8])[0], f + 8)
+    return (_unpack_q(x, f + 1)[0], f + 9)
 
 
 def decode_float(x, f):
-    f += 1
     if FLOAT_BITS == 32:
-        n = struct.unpack('!f', x[f:f + 4])[0]
-        return (n, f + 4)
+        return (_unpack_f(x, f + 1)[0], f + 5)
     elif FLOAT_BITS == 64:
-        n = struct.unpack('!d', x[f:f + 8])[0]
-        return (n, f + 8)
+        return (_unpack_d(x, f + 1)[0], f + 9)
     else:
         raise ValueError
 
 
 def decode_string(x, f):
-    colon = x.index(':', f)
+    colon = _find(x, ':', f, MAX_INT_LENGTH)
+    s = _bytes(x, f, colon)
     try:
-        n = int(x[f:colon])
+        n = int(s)
     except (OverflowError, ValueError):
-        n = long(x[f:colon])
-    if x[f] == '0' and colon != f + 1:
+        n = long(s)
+    if s[0] == '0' and colon != f + 1:
         raise ValueError
     colon += 1
-    return (b64decode(x[colon:colon + n]), colon + n)
+    return (a2b_base64(x[colon:colon + n]), colon + n)
 
 
 def decode_list(x, f):
@@ -212,11 +259,8 @@ def decode_list(x, f):
 
 
 def decode_tuple(x, f):
-    (r, f) = ([], f + 1)
-    while x[f] != CHR_TERM:
-        (v, f) = decode_func[x[f]](x, f)
-        r.append(v)
-    return (tuple(r), f + 1)
+    (r, f) = decode_list(x, f)
+    return (tuple(r), f)
 
 
 def decode_dict(x, f):
@@ -250,17 +294,32 @@ def decode_instance(x, f):
     return (r, f + 1)
 
 
+# key: type character value: the value of a single character
+_SINGLE = {CHR_TRUE: True, CHR_FALSE: False, CHR_NONE: None}
+_SINGLE.update((s, n) for (n, s) in _INTS.iteritems() if len(s) == 1)
+_MULTIPLE = object()
+
+
+def decode_items(x, f, n):
+    """Decodes the n values from f on, returns them as a list and where they end"""
+
+    r = []
+    append = r.append
+    single = _SINGLE.get
+    for _ in xrange(n):
+        c = x[f]
+        v = single(c, _MULTIPLE)
+        if v is _MULTIPLE:
+            (v, f) = decode_func[c](x, f)
+        else:
+            f += 1
+        append(v)
+    return (r, f)
+
+
 decode_func = {}
-decode_func['0'] = decode_string
-decode_func['1'] = decode_string
-decode_func['2'] = decode_string
-decode_func['3'] = decode_string
-decode_func['4'] = decode_string
-decode_func['5'] = decode_string
-decode_func['6'] = decode_string
-decode_func['7'] = decode_string
-decode_func['8'] = decode_string
-decode_func['9'] = decode_string
+for c in '0123456789':
+    decode_func[c] = decode_string
 decode_func[CHR_LIST] = decode_list
 decode_func[CHR_TUPLE] = decode_tuple
 decode_func[CHR_DICT] = decode_dict
@@ -281,7 +340,17 @@ def make_fixed_length_string_decoders():
     def make_decoder(slen):
 
         def f_fixed_string(x, f):
-            return (b64decode(x[f + 1:f + 1 + slen]), f + 1 + slen)
+            end = f + 1 + slen
+            s = x[f:end]
+            if type(s) is not str:
+                s = s.tobytes()
+            v = _decoded.get(s)
+            if v is None:
+                v = a2b_base64(s[1:])
+                if len(_decoded) >= MAX_CACHED_STRINGS:
+                    _decoded.clear()
+                _decoded[s] = v
+            return (v, end)
 
         return f_fixed_string
 
@@ -297,11 +366,7 @@ def make_fixed_length_list_decoders():
     def make_decoder(slen):
 
         def f_fixed_list(x, f):
-            (r, f) = ([], f + 1)
-            for i in range(slen):
-                (v, f) = decode_func[x[f]](x, f)
-                r.append(v)
-            return (r, f)
+            return decode_items(x, f + 1, slen)
 
         return f_fixed_list
 
@@ -317,10 +382,7 @@ def make_fixed_length_tuple_decoders():
     def make_decoder(slen):
 
         def f_fixed_tuple(x, f):
-            (r, f) = ([], f + 1)
-            for i in range(slen):
-                (v, f) = decode_func[x[f]](x, f)
-                r.append(v)
+            (r, f) = decode_items(x, f + 1, slen)
             return (tuple(r), f)
 
         return f_fixed_tuple
@@ -356,7 +418,7 @@ def make_fixed_length_dict_decoders():
 
         def f(x, f):
             (r, f) = ({}, f + 1)
-            for j in range(slen):
+            for j in xrange(slen):
                 (k, f) = decode_func[x[f]](x, f)
                 (r[k], f) = decode_func[x[f]](x, f)
             return (r, f)
@@ -371,28 +433,26 @@ make_fixed_length_dict_decoders()
 
 
 def loads(x):
-    try:
-        (r, l) = decode_func[x[0]](x, 0)
-    except (IndexError, KeyError):
-        raise
+    """Decodes a str, or a buffer given as memoryview, without copying it"""
+
+    if type(x) is bytearray:
+        x = memoryview(x)
+    (r, l) = decode_func[x[0]](x, 0)
     if l != len(x):
         raise ValueError
     return r
 
 
 def encode_int(x, r):
-    if 0 <= x < INT_POS_FIXED_COUNT:
-        r.append(chr(INT_POS_FIXED_START + x))
-    elif -INT_NEG_FIXED_COUNT <= x < 0:
-        r.append(chr((INT_NEG_FIXED_START - 1) - x))
-    elif -128 <= x < 128:
-        r.extend((CHR_INT1, struct.pack('!b', x)))
+    s = _INTS.get(x)
+    if s is not None:
+        r.append(s)
     elif -32768 <= x < 32768:
-        r.extend((CHR_INT2, struct.pack('!h', x)))
+        r.extend((CHR_INT2, _pack_h(x)))
     elif -2147483648 <= x < 2147483648:
-        r.extend((CHR_INT4, struct.pack('!l', x)))
+        r.extend((CHR_INT4, _pack_l(x)))
     elif -9223372036854775808 <= x < 9223372036854775808:
-        r.extend((CHR_INT8, struct.pack('!q', x)))
+        r.extend((CHR_INT8, _pack_q(x)))
     else:
         s = str(x)
         if len(s) >= MAX_INT_LENGTH:
@@ -402,64 +462,69 @@ def encode_int(x, r):
 
 def encode_float(x, r):
     if FLOAT_BITS == 32:
-        r.extend((CHR_FLOAT, struct.pack('!f', x)))
+        r.extend((CHR_FLOAT, _pack_f(x)))
     elif FLOAT_BITS == 64:
-        r.extend((CHR_FLOAT, struct.pack('!d', x)))
+        r.extend((CHR_FLOAT, _pack_d(x)))
     else:
         raise ValueError
 
 
 def encode_bool(x, r):
-    r.extend({False: CHR_FALSE, True: CHR_TRUE}[bool(x)])
+    r.append(CHR_TRUE if x else CHR_FALSE)
 
 
 def encode_none(x, r):
-    r.extend(CHR_NONE)
+    r.append(CHR_NONE)
 
 
 def encode_string(x, r):
-    x = b64encode(x)
-    if len(x) < STR_FIXED_COUNT:
-        r.extend((chr(STR_FIXED_START + len(x)), x))
-    else:
-        r.extend((str(len(x)), ':', x))
+    s = _strings.get(x)
+    if s is None:
+        s = b2a_base64(x)[:-1]
+        if len(s) < STR_FIXED_COUNT:
+            s = chr(STR_FIXED_START + len(s)) + s
+            if len(_strings) >= MAX_CACHED_STRINGS:
+                _strings.clear()
+            _strings[x] = s
+        else:
+            s = '%i:%s' % (len(s), s)
+    r.append(s)
+
+
+def encode_items(x, r):
+    for i in x:
+        encode_func.get(type(i), encode_instance)(i, r)
 
 
 def encode_list(x, r):
     if len(x) < LIST_FIXED_COUNT:
-        r.append(chr(LIST_FIXED_START + len(x)))
-        for i in x:
-            encode_func.get(type(i), encode_instance)(i, r)
+        r.append(_LIST_HEADERS[len(x)])
+        encode_items(x, r)
     else:
         r.append(CHR_LIST)
-        for i in x:
-            encode_func.get(type(i), encode_instance)(i, r)
+        encode_items(x, r)
         r.append(CHR_TERM)
 
 
 def encode_tuple(x, r):
     if len(x) < TUPLE_FIXED_COUNT:
-        r.append(chr(TUPLE_FIXED_START + len(x)))
-        for i in x:
-            encode_func.get(type(i), encode_instance)(i, r)
+        r.append(_TUPLE_HEADERS[len(x)])
+        encode_items(x, r)
     else:
         r.append(CHR_TUPLE)
-        for i in x:
-            encode_func.get(type(i), encode_instance)(i, r)
+        encode_items(x, r)
         r.append(CHR_TERM)
 
 
 def encode_dict(x, r):
     if len(x) < DICT_FIXED_COUNT:
-        r.append(chr(DICT_FIXED_START + len(x)))
-        for (k, v) in x.items():
-            encode_func[type(k)](k, r)
-            encode_func[type(v)](v, r)
+        r.append(_DICT_HEADERS[len(x)])
     else:
         r.append(CHR_DICT)
-        for (k, v) in x.items():
-            encode_func[type(k)](k, r)
-            encode_func[type(v)](v, r)
+    for (k, v) in x.iteritems():
+        encode_func[type(k)](k, r)
+        encode_func[type(v)](v, r)
+    if len(x) >= DICT_FIXED_COUNT:
         r.append(CHR_TERM)
 
 
@@ -472,12 +537,7 @@ encode_func[ListType] = encode_list
 encode_func[TupleType] = encode_tuple
 encode_func[DictType] = encode_dict
 encode_func[NoneType] = encode_none
-
-try:
-    from types import BooleanType
-    encode_func[BooleanType] = encode_bool
-except ImportError:
-    pass
+encode_func[BooleanType] = encode_bool
 
 
 def encode_instance(x, r):
@@ -492,15 +552,10 @@ def encode_instance(x, r):
             raise NotRegistered(x.__class__.__name__)
 
 
-lock = Lock()
-
-
 def dumps(x):
-    lock.acquire()
     r = []
     encode_func.get(type(x), encode_instance)(x, r)
-    lock.release()
-    return ('').join(r)
+    return ''.join(r)
 
 
 def test():
@@ -554,6 +609,9 @@ def test():
     assert loads(dumps(L)) == L
     assert loads(dumps(None)) == None
     assert loads(dumps({None: None})) == {None: None}
+    L = ({'a': (1, -1, 2 ** 40, 'b' * 50), 'c': [None, 2.5, 300]}, 'a' * 100)
+    assert loads(memoryview(dumps(L))) == L
+    assert loads(bytearray(dumps(L))) == L
 
 
     class A(object):
@@ -573,5 +631,49 @@ def test():
     print loads(dumps(instance))
 
 
+def bench(reference=None, rounds=5):
+    """Prints how long dumps and loads take for messages like those of a
+    game, and for the rencode module at the path reference if given"""
+
+    from imp import load_source
+    from time import time
+
+    messages = [{'action': 'update', 'update_PHASE': 'buy', 'update_CLIENTID': '12', 'PID': 4711},
+                {'action': 'update', 'subid': 3817, 'update_SUBPHASE': 'pickcard',
+                 'info': (0, 'Pick a card', (0, 'Cellar')), 'update_CLIENTID': '12', 'PID': 4712},
+                {'action': 'update', 'update_HAND': (0, [9, 3817, 2, 0, 117, 3818, 5, 0] * 3)},
+                {'action': 'update', 'update_PLAYERINFO': (1, [(0, [(1, 5), (4, 0), (6, 3)]),
+                                                               (2, [(7, True)])])},
+                {'action': 'update', 'update_BOARDSETUP': (0, [(-8093146563021446797, 6082918372938478501,
+                                                                i, 10, 4, 0) for i in range(10)])},
+                {'action': 'message', 'message': 'Player 1 bought Gold', 'PID': 4713}]
+    modules = [('this', sys.modules[__name__])]
+    if reference:
+        modules.append((reference, load_source('rencode_reference', reference)))
+    for (name, module) in modules:
+        encoded = [module.dumps(m) for m in messages]
+        views = [memoryview(bytearray(e)) for e in encoded]
+        cases = [('dumps', module.dumps, messages),
+                 ('loads', module.loads, encoded),
+                 ('loads(view.tobytes())', lambda v: module.loads(v.tobytes()), views)]
+        if module is sys.modules[__name__]:
+            cases.append(('loads(view)', module.loads, views))
+        times = {}
+        for _ in xrange(rounds):
+            for (what, f, args) in cases:
+                start = time()
+                for _ in xrange(2000):
+                    for a in args:
+                        f(a)
+                took = 1e6 * (time() - start) / (2000 * len(args))
+                times[what] = min(times.get(what, took), took)
+        print name
+        for what in sorted(times):
+            print '    %-22s %.2f us' % (what, times[what])
+
+
 if __name__ == '__main__':
-    test()
+    if sys.argv[1:2] == ['bench']:
+        bench(*sys.argv[2:3])
+    else:
+        test()
@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 from multiprocessing import Process, Pipe
+from time import time
 import platform
 
 class CancelToken(object):
@@ -11,6 +12,10 @@ class CancelToken(object):
 PP_QUIT = "QUIT"
 PP_KEEP_ALIVE = "KEEP_ALIVE"
 
+# seconds TimeOutPipe.poll_alive waits for a message before giving up,
+# about as long as TimeOutToken waits in a loop that calls check all the time
+PIPE_TIMEOUT = 400.0
+
 def get_timeout_pipe(pipe):
     return TimeOutPipe(pipe) if pipe else DummyTimeOutPipe()
 
@@ -19,6 +24,7 @@ class TimeOutPipe(object):
     def __init__(self, pipe, timeouttoken=None):
         self.pipe = pipe
         self.__timeouttoken = timeouttoken or TimeOutToken()
+        self.__last_message = time()
 
     def send(self, *args):
         self.pipe.send(*args)
@@ -26,6 +32,18 @@ class TimeOutPipe(object):
     def check(self):
         return self.__timeouttoken.check_pipe_timeout(self.pipe)
 
+    def poll_alive(self, timeout=PIPE_TIMEOUT):
+        """
+        Like check, but doesn't wait for the pipe. Returns False if a quit
+        command came in, or no message at all for timeout seconds"""
+
+        now = time()
+        while self.pipe.poll():
+            self.__last_message = now
+            if PP_QUIT in self.pipe.recv():
+                return False
+        return now - self.__last_message < timeout
+
 class DummyTimeOutPipe(TimeOutPipe):
     
     def __init__(self, *args):
@@ -33,6 +51,9 @@ class DummyTimeOutPipe(TimeOutPipe):
     
     def check(self):
         return True
+
+    def poll_alive(self, timeout=PIPE_TIMEOUT):
+        return True
     
     def send(self, *args):
         pass
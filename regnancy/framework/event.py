@@ -2,7 +2,16 @@
 # -*- coding: utf-8 -*-
 
 from weakref import WeakKeyDictionary
+from heapq import heappush, heappop
+from itertools import count
+from time import time, sleep
+import asyncore
 import logging
+import select
+
+# asyncore.poll2 uses poll(2), which unlike select(2) has no limit on the
+# number of sockets
+poll = asyncore.poll2 if hasattr(select, 'poll') else asyncore.poll
 
 class CPUSpinnerController(object):
 
@@ -17,6 +26,46 @@ class CPUSpinnerController(object):
         if isinstance(event, QuitEvent):
             self.keepGoing = False
 
+class SelectController(object):
+
+    """
+    Like CPUSpinnerController, but instead of posting TickEvents all the
+    time it waits until a socket of the asyncore map is ready or a timer
+    (see call_later) is due, and posts one TickEvent after handling them."""
+
+    def __init__(self, socket_map):
+        self.keepGoing = True
+        self.map = socket_map
+        self.timers = []  # heap of (due time, number, function)
+        self.__numbers = count()
+
+    def call_later(self, delay, f):
+        """Calls f after delay seconds"""
+
+        heappush(self.timers, (time() + delay, next(self.__numbers), f))
+
+    def __run_timers(self):
+        now = time()
+        while self.timers and (self.timers)[0][0] <= now:
+            heappop(self.timers)[2]()
+
+    def run(self, ev):
+        while self.keepGoing:
+            self.__run_timers()
+            if not self.keepGoing:
+                break
+            timeout = max(0.0, (self.timers)[0][0] - time()) if self.timers else None
+            if self.map:
+                poll(timeout, self.map)
+            else:
+                sleep(timeout or 0.1)
+            if self.keepGoing:
+                TickEvent().post(ev)
+
+    def notify(self, event):
+        if isinstance(event, QuitEvent):
+            self.keepGoing = False
+
 class EventLogger(object):
 
     def notify(self, event):
@@ -83,6 +132,23 @@ class RequestStartGame(Event):
         self.deck_name = deck_name
 
 
+class RequestRooms(Event):
+
+    pass
+
+
+class RequestCreateRoom(Event):
+
+    def __init__(self, name):
+        self.name = name.encode('utf8')
+
+
+class RequestJoinRoom(Event):
+
+    def __init__(self, room_id):
+        self.room_id = room_id
+
+
 class MessageEvent(Event):
 
     def __init__(self, message, reciever=None):
@@ -202,6 +268,19 @@ class SubPhaseChangedEvent(Event):
         self.subid = subid
 
 
+class RoomJoinedEvent(Event):
+
+    def __init__(self, room_id, name):
+        self.room_id = room_id
+        self.name = name
+
+
+class RoomsEvent(Event):
+
+    def __init__(self, rooms):
+        self.rooms = rooms  # (id, name, number of players, playing) for each room
+
+
 class SetMasterEvent(Event):
 
     def __init__(self, master):
@@ -32,6 +32,12 @@ ANSWER = 'response_ANSWER'
 
 GAMESTART = 'gamestart'  # tell the server to start the game
 ENDPHASE = 'endphase'  # tell the server the player wants to end the current phase
+CREATEROOM = 'createroom'  # tell the server to create a room and join it. Needs its name in INFO.
+JOINROOM = 'joinroom'  # tell the server the player wants to join the room with the id in ROOM.
+RESYNC = 'resync'  # ask the server for the whole state of the game again, since an update did not fit.
+
+ROOM = 'room'  # contains the id of a room. Also tells the client which room it has joined, with its name in INFO.
+ROOMS = 'rooms'  # ask the server for all rooms, or contains them as (id, name, number of players, playing).
 
 MESSAGE = 'message'  # contains a message-string.
 ID = 'id'  # contains an ID, usually the sending client.
@@ -3,37 +3,8 @@
 
 import os
 import socket
-import zlib
-import traceback
 import logging
 
-try:
-    import cPickle as pickle
-except:
-    import pickle
-
-
-def pack(obj):
-    """pickle and compress object"""
-
-    try:
-        dump = pickle.dumps(obj, 2)
-    except Exception, e:
-        logging.critical("- pickle error -")
-        logging.critical(traceback.extract_stack())
-        logging.critical("----------------")
-        logging.critical(obj)
-        logging.critical(obj.__class__)
-        logging.critical("----------------")
-        raise e
-    return zlib.compress(dump, 4)
-
-
-def unpack(obj):
-    """unpicke and decompress object"""
-
-    return pickle.loads(zlib.decompress(obj))
-
 if os.name != "nt":
     import fcntl
     import struct
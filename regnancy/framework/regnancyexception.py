@@ -41,3 +41,15 @@ class CardToExpensiveToPickException(RegnancyException):
     pass
 
 
+class SimulationException(RegnancyException):
+
+    """A simulated game could not be played to its end"""
+
+    pass
+
+
+class OutOfSyncException(RegnancyException):
+
+    """An update of the server does not fit the state the client has"""
+
+    pass
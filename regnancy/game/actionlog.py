@@ -0,0 +1,299 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Records the input of all players of a game, and plays it again.
+
+The server writes one ActionLog per game. It contains the setup and seed
+of the game and every input of a player the game accepted (buying a card,
+playing a card, answering a question and ending a phase) as small binary
+records, and how often the game got updated (see Game.update) in between,
+not counting the updates that didn't change anything. Cards and piles are
+not stored by their id, which is different each time a game is played, but
+by their number (see Game.card_number) and their position in Game.allpiles.
+The stream is flushed when a turn begins and when the game ends.
+
+A Replay plays such a log in a headless game, without any networking, e.g.
+
+    game = Replay(open(path, 'rb').read()).run(turn=12)
+"""
+
+import struct
+import cPickle as pickle
+from uuid import UUID
+
+from framework.regnancyexception import RegnancyException, \
+    PileIsEmptyException, NotEnoughMoneyException
+from game import Game
+from player import Player
+from snapshot import DroppingEventManager
+
+# record types
+A_START = 'S'
+A_BUY = 'B'
+A_PLAY = 'P'
+A_ANSWER = 'A'
+A_ENDPHASE = 'E'
+A_UPDATE = 'U'
+
+# each record starts with its type, the number of the player (or NO_PLAYER)
+# and the size of the rest of the record
+HEADER = struct.Struct('<cBH')
+NO_PLAYER = 0xFF
+
+# the kinds of answers, see ActionLog.answer
+R_NONE = 'N'
+R_BOOL = 'b'
+R_INT = 'i'
+R_CARDS = 'C'
+R_PILE = 'P'
+R_TEXT = 'S'
+R_OTHER = 'R'
+
+def _pack_text(text):
+    data = text.encode('utf-8')
+    return struct.pack('<H', len(data)) + data
+
+
+def _unpack_text(data, pos):
+    (size,) = struct.unpack_from('<H', data, pos)
+    pos += 2
+    return (data[pos:pos + size].decode('utf-8'), pos + size)
+
+
+class ActionLog(object):
+
+    """
+    Writes the records of a game to a stream (e.g. a file opened with
+    'ab'), or keeps them in memory if there is no stream"""
+
+    def __init__(self, game, stream=None):
+        self.game = game
+        self.stream = stream
+        self.data = bytearray()
+        self.__updates = 0  # updates that are not written yet
+
+    def __state(self):
+        """Returns what an update of the game may change"""
+
+        game = self.game
+        return (game.turn, game.phase.current_phase, game.subphaseinfo,
+                len(game.subphase_cache), len(game.precleanupstack),
+                game.running_trigger, sum(len(t) for t in game.pending_trigger.values()),
+                game.running)
+
+    def __write(self, action, player, payload=''):
+        self.__write_updates()
+        self.__append(action, NO_PLAYER if player is None else self.game.players.index(player),
+                      payload)
+
+    def __write_updates(self):
+        if self.__updates:
+            self.__append(A_UPDATE, NO_PLAYER, struct.pack('<H', self.__updates))
+            self.__updates = 0
+
+    def __append(self, action, number, payload):
+        record = HEADER.pack(action, number, len(payload)) + payload
+        if self.stream:
+            self.stream.write(record)
+        else:
+            self.data.extend(record)
+
+    def __pile_number(self, pile_id):
+        pile = self.game.get_pile(pile_id)
+        if pile is None:
+            return None
+        return self.game.allpiles.index(pile)
+
+    def getvalue(self):
+        """Returns all records kept in memory"""
+
+        return str(self.data)
+
+    def start(self, setup):
+        """Records the start of the game, call it after Game.setup(setup, ...)"""
+
+        if setup == 'random':
+            kingdom = []
+        else:
+            kingdom = [pile.name for pile in self.game.kingdompiles]
+        payload = [struct.pack('<qB', self.game.seed, len(self.game.players))]
+        payload.extend(_pack_text(p.name) for p in self.game.players)
+        payload.append(struct.pack('<B', len(kingdom)))
+        payload.extend(_pack_text(name) for name in kingdom)
+        self.__write(A_START, None, ''.join(payload))
+
+    def update(self):
+        """
+        Updates the game, use it instead of Game.update. Returns if the
+        update changed the game. Closes the log when the game is over."""
+
+        before = self.__state()
+        failed = True  # an update that raises is counted, so a replay gets up to it
+        try:
+            self.game.update()
+            failed = False
+        finally:
+            after = None if failed else self.__state()
+            changed = failed or after != before
+            if changed:
+                self.__updates += 1
+            if failed or self.__updates == 0xFFFF:
+                self.__write_updates()
+            if not self.game.running:
+                self.close()
+            elif failed or after[0] != before[0]:
+                self.flush()
+        return changed
+
+    def flush(self):
+        """Flushes the stream, update does it when a turn begins"""
+
+        if self.stream:
+            self.stream.flush()
+
+    def close(self):
+        """Writes the updates not written yet and closes the stream, call it when the game is over"""
+
+        self.__write_updates()
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+
+    def buy(self, player, pile_id):
+        number = self.__pile_number(pile_id)
+        if number is not None:
+            self.__write(A_BUY, player, struct.pack('<B', number))
+
+    def play(self, player, card_id):
+        number = self.game.card_number(card_id)
+        if number is not None:
+            self.__write(A_PLAY, player, struct.pack('<H', number))
+
+    def endphase(self, player):
+        self.__write(A_ENDPHASE, player)
+
+    def answer(self, player, result):
+        game = self.game
+        if result is None:
+            payload = R_NONE
+        elif isinstance(result, str):
+            payload = R_TEXT + result
+        elif isinstance(result, UUID) and self.__pile_number(result) is not None:
+            payload = R_PILE + struct.pack('<B', self.__pile_number(result))
+        elif isinstance(result, bool):
+            payload = R_BOOL + struct.pack('<?', result)
+        elif isinstance(result, (int, long)) and -1 << 63 <= result < 1 << 63:
+            payload = R_INT + struct.pack('<q', result)
+        else:
+            try:
+                numbers = [game.card_number(card_id) for card_id in result]
+            except TypeError:
+                numbers = None
+            if numbers is not None and not None in numbers:
+                payload = R_CARDS + struct.pack('<%iH' % len(numbers), *numbers)
+            else:
+                payload = R_OTHER + pickle.dumps(result, 2)
+        self.__write(A_ANSWER, player, payload)
+
+
+def read_actions(data):
+    """Yields the records of a log as tuples (type, player number, payload)"""
+
+    pos = 0
+    while pos < len(data):
+        (action, player, size) = HEADER.unpack_from(data, pos)
+        pos += HEADER.size
+        yield (action, None if player == NO_PLAYER else player, data[pos:pos + size])
+        pos += size
+
+
+def read_start(payload):
+    """Returns the seed, the player names and the setup of a start record"""
+
+    (seed, count) = struct.unpack_from('<qB', payload)
+    pos = struct.calcsize('<qB')
+    names = []
+    for _ in xrange(count):
+        (name, pos) = _unpack_text(payload, pos)
+        names.append(name)
+    (count,) = struct.unpack_from('<B', payload, pos)
+    pos += 1
+    kingdom = []
+    for _ in xrange(count):
+        (name, pos) = _unpack_text(payload, pos)
+        kingdom.append(name)
+    return (seed, names, kingdom or 'random')
+
+
+def read_answer(game, payload):
+    """Returns the answer of an answer record, with the ids of the cards and piles of the game"""
+
+    (kind, data) = (payload[0], payload[1:])
+    if kind == R_NONE:
+        return None
+    elif kind == R_TEXT:
+        return data
+    elif kind == R_PILE:
+        return (game.allpiles)[struct.unpack('<B', data)[0]].id
+    elif kind == R_BOOL:
+        return struct.unpack('<?', data)[0]
+    elif kind == R_INT:
+        return struct.unpack('<q', data)[0]
+    elif kind == R_CARDS:
+        numbers = struct.unpack('<%iH' % (len(data) / 2), data)
+        return [game.card_by_number(n).id for n in numbers]
+    return pickle.loads(data)
+
+
+class Replay(object):
+
+    """Plays the records of an ActionLog in a headless game"""
+
+    def __init__(self, data, ev=None):
+        self.actions = read_actions(data)
+        (action, _, payload) = next(self.actions)
+        if action != A_START:
+            raise RegnancyException("action log does not start with a game")
+
+        (self.seed, names, self.setup) = read_start(payload)
+        self.game = Game(ev or DroppingEventManager())
+        self.players = [Player(name, self.game, i + 1) for (i, name) in enumerate(names)]
+        self.handler = {A_BUY: self.buy,
+                        A_PLAY: self.play,
+                        A_ANSWER: self.answer,
+                        A_ENDPHASE: self.endphase,
+                        A_UPDATE: self.update}
+
+    def run(self, turn=None):
+        """Plays the log to its end, or until the given turn has begun, and returns the game"""
+
+        game = self.game
+        if not game.running:
+            game.setup(self.setup, self.players, self.seed)
+        for (action, player, payload) in self.actions:
+            if (turn is not None and game.turn >= turn) or not game.running:
+                return game
+            (self.handler)[action](player is not None and (self.players)[player], payload)
+        return game
+
+    def update(self, player, payload):
+        for _ in xrange(struct.unpack('<H', payload)[0]):
+            self.game.update()
+
+    def buy(self, player, payload):
+        pile = (self.game.allpiles)[struct.unpack('<B', payload)[0]]
+        try:
+            self.game.buy_card(player, pile.id)
+        except (NotEnoughMoneyException, PileIsEmptyException):
+            pass
+
+    def play(self, player, payload):
+        card = self.game.card_by_number(struct.unpack('<H', payload)[0])
+        self.game.play_card(player, card.id)
+
+    def endphase(self, player, payload):
+        self.game.endphase(player)
+
+    def answer(self, player, payload):
+        self.game.answered(player, read_answer(self.game, payload), None)
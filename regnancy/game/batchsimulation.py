@@ -0,0 +1,189 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Plays many simulated games on all cores.
+
+A BatchSimulation starts one long-lived worker process per core (via
+framework.async.ProcessProxy). The workers get the games to play over their
+pipes and send back one compact GameRecord per game, which are yielded as
+soon as they arrive, e.g.
+
+    batch = BatchSimulation()
+    stats = BatchStatistics()
+    for record in batch.run(jobs):
+        stats.add(record)
+    print stats
+"""
+
+import logging
+import platform
+import random
+import select
+from collections import namedtuple, defaultdict
+from multiprocessing import cpu_count
+
+from framework.async import ProcessProxy, PP_QUIT
+from simulation import Simulation
+
+PP_SIMULATE = "SIMULATE"
+
+# number of games sent to a worker before it has to report a result,
+# so it never idles while its last result is on the way back
+GAMES_IN_FLIGHT = 2
+
+# scores: the score of each player
+# bought: for each player a tuple of the names of the cards he bought
+# end_reason: see rules.game_end and simulation.END_TURN_LIMIT
+# error: None, or the description of the exception that stopped the game
+# seed: the seed of the game, to replay it with Simulation(..., seed=seed)
+GameRecord = namedtuple('GameRecord', 'job kingdom players scores turns bought end_reason error seed')
+
+
+def play(job, kingdom, strategies, **kwargs):
+    """Plays a single game and returns its GameRecord"""
+
+    sim = Simulation(kingdom, strategies, **kwargs)
+    names = tuple(p.name for p in sim.players)
+    try:
+        sim.run()
+    except Exception, e:
+        # a broken card should only cost this game, not the whole batch
+        logging.exception("game %s failed", job)
+        return GameRecord(job, kingdom, names, None, sim.game.turn, None, None,
+                          "%s: %s" % (e.__class__.__name__, e), sim.game.seed)
+
+    return GameRecord(job, kingdom, names,
+                      tuple(score for (_, score) in sim.result),
+                      sim.game.turn,
+                      tuple(tuple((sim.bought)[p]) for p in sim.players),
+                      sim.end_reason,
+                      None,
+                      sim.seed)
+
+
+def _worker(pipe):
+    """Main loop of a worker process: plays games until it receives PP_QUIT"""
+
+    while True:
+        cmd = pipe.recv()
+        if PP_QUIT in cmd:
+            break
+        (_, job, kingdom, strategies, kwargs) = cmd
+        pipe.send(play(job, kingdom, strategies, **kwargs))
+
+
+def _wait(pipes):
+    """Blocks until at least one of the pipes has data and returns those pipes"""
+
+    if platform.system() == "Windows":  # ProcessProxy uses threads there, no select on pipes
+        while True:
+            ready = [p for p in pipes if p.poll(0.001)]
+            if ready:
+                return ready
+    return select.select(pipes, [], [])[0]
+
+
+class BatchSimulation(object):
+
+    """Plays simulated games in a pool of worker processes"""
+
+    def __init__(self, workers=None):
+        self.workers = workers or cpu_count()
+
+    def run(self, jobs, seed=None, **kwargs):
+        """
+        Plays all jobs, each a tuple (kingdom, strategies), and yields a
+        GameRecord for each game as soon as it is finished (so not
+        necessarily in the order of the jobs). The kingdom should be a list
+        of card names, so it can be send to the workers cheaply. kwargs are
+        passed to each Simulation.
+
+        The seed of each game is drawn from a random number generator
+        seeded with seed, so two runs with the same seed and jobs play the
+        same games, no matter which worker plays which game."""
+
+        jobs = enumerate(jobs)
+        seeds = random.Random(seed)
+        pool = [ProcessProxy(_worker) for _ in xrange(self.workers)]
+        pending = {}  # key: pipe value: number of games the worker is playing
+
+        def feed(pp):
+            for (job, (kingdom, strategies)) in jobs:
+                pp.pipe.send([PP_SIMULATE, job, kingdom, strategies,
+                              dict(kwargs, seed=seeds.getrandbits(32))])
+                pending[pp.pipe] += 1
+                if pending[pp.pipe] >= GAMES_IN_FLIGHT:
+                    return
+
+        try:
+            for pp in pool:
+                pp.start()
+                pending[pp.pipe] = 0
+                feed(pp)
+
+            pipes = dict((pp.pipe, pp) for pp in pool)
+            while any(pending.values()):
+                for pipe in _wait([p for p in pending if pending[p]]):
+                    record = pipe.recv()
+                    pending[pipe] -= 1
+                    feed(pipes[pipe])
+                    yield record
+        finally:
+            for pp in pool:
+                if pp.started:
+                    pp.join()
+
+
+class BatchStatistics(object):
+
+    """Aggregates GameRecords, keyed by the position of the players"""
+
+    def __init__(self):
+        self.games = 0
+        self.errors = defaultdict(int)
+        self.error_seeds = {}  # key: error value: seed of the first game with it
+        self.wins = defaultdict(float)
+        self.scores = defaultdict(int)
+        self.turns = 0
+        self.end_reasons = defaultdict(int)
+        self.bought = defaultdict(lambda: defaultdict(int))
+        self.names = ()
+
+    def add(self, record):
+        if record.error:
+            (self.errors)[record.error] += 1
+            self.error_seeds.setdefault(record.error, record.seed)
+            return
+
+        self.games += 1
+        self.turns += record.turns
+        self.names = record.players
+        (self.end_reasons)[record.end_reason] += 1
+
+        best = max(record.scores)
+        winners = [i for (i, s) in enumerate(record.scores) if s == best]
+        for (i, score) in enumerate(record.scores):
+            (self.scores)[i] += score
+            if i in winners:
+                (self.wins)[i] += 1.0 / len(winners)
+            for name in (record.bought)[i]:
+                (self.bought)[i][name] += 1
+
+    def __str__(self):
+        if not self.games:
+            return "no games played, %i failed" % sum(self.errors.values())
+
+        lines = ["%i games, %i failed, %.1f turns per game" %
+                 (self.games, sum(self.errors.values()), float(self.turns) / self.games)]
+        for (i, name) in enumerate(self.names):
+            top = sorted((self.bought)[i].items(), key=lambda t: -t[1])[:5]
+            lines.append("%s: %.1f%% wins, %.1f points, bought %s" %
+                         (name, 100 * (self.wins)[i] / self.games,
+                          float((self.scores)[i]) / self.games,
+                          ", ".join("%.1f %s" % (float(c) / self.games, n) for (n, c) in top)))
+        for (reason, count) in sorted(self.end_reasons.items()):
+            lines.append("ended by %s: %i" % (reason, count))
+        for (error, count) in sorted(self.errors.items()):
+            lines.append("error (%ix, e.g. seed %s): %s" % (count, (self.error_seeds)[error], error))
+        return "\n".join(lines)
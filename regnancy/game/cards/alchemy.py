@@ -51,6 +51,7 @@ class ScryingPool(Card):
     cardtype = ACTION | ATTACK
     cost = (2, 1)
     name = "Scrying Pool"
+    __slots__ = ('revealed',)
 
     def __init__(self):
         Card.__init__(self)
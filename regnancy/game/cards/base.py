@@ -83,6 +83,7 @@ class ThroneRoom(Card):
     cardtype = ACTION
     cost = (4, 0)
     name = "Throne Room"
+    __slots__ = ('doubled_card',)
 
     def __init__(self):
         Card.__init__(self)
@@ -164,6 +165,7 @@ class Library(Card):
     cardtype = ACTION
     cost = (5, 0)
     name = "Library"
+    __slots__ = ('picked_cards', 'last_card')
 
     def __init__(self):
         Card.__init__(self)
@@ -338,6 +340,7 @@ class Moat(Card):
     cardtype = ACTION | REACTION
     cost = (2, 0)
     name = "Moat"
+    triggers = (T_ATTACK,)
 
     def __init__(self):
         Card.__init__(self)
@@ -410,6 +413,7 @@ class Spy(Card):
     cardtype = ACTION | ATTACK
     cost = (4, 0)
     name = "Spy"
+    __slots__ = ('revealed',)
 
     def __init__(self):
         Card.__init__(self)
@@ -457,6 +461,7 @@ class Thief(Card):
     cardtype = ACTION | ATTACK
     cost = (4, 0)
     name = "Thief"
+    __slots__ = ('revealed',)
 
     def __init__(self):
         Card.__init__(self)
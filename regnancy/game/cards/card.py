@@ -13,10 +13,47 @@ DURATION = 0x0020
 VICTORY = 0x0040
 
 
+class CardType(type):
+
+    """
+    Metaclass of all cards. Cards use __slots__ instead of a __dict__ per
+    instance, so a card class without own state doesn't have to declare
+    an empty __slots__ itself. A card with own state has to list it in its
+    __slots__, the static data (name, cost, cardtype) stays on the class."""
+
+    def __new__(mcs, name, bases, attrs):
+        attrs.setdefault('__slots__', ())
+        return type.__new__(mcs, name, bases, attrs)
+
+
+class CostModifier(object):
+
+    """
+    A cost modifier (see Game.add_cost_mod) a card adds when the player
+    plays it, which calls Card.modify_cost. It is an object instead of a
+    closure, so a copy of the game (see game.snapshot) gets its own."""
+
+    def __init__(self, card, player):
+        self.card = card
+        self.player = player
+
+    def __call__(self, coins, potions, card):
+        return self.card.modify_cost(self.player, coins, potions, card)
+
+
 class Card(object):
 
     """Represents a Card"""
 
+    __metaclass__ = CardType
+
+    # calc_cost is set by the server, get_rect by the pygame client
+    __slots__ = ('id', 'virtual', 'calc_cost', 'get_rect')
+
+    # the triggers (see gametrigger) handle_trigger may react to while the
+    # card is in a hand
+    triggers = ()
+
     def __init__(self):
         self.id = get_id()
         self.virtual = False
@@ -66,4 +103,11 @@ class Card(object):
         raise Exception('This handler is supposed to be overriden')
 
     def handle_trigger(self, trigger):
+        """Returns how the card reacts to one of its triggers, or None"""
+
         pass
+
+    def modify_cost(self, player, coins, potions, card):
+        """Returns the cost of card while the CostModifier of this card is in effect"""
+
+        return (coins, potions)
@@ -1,7 +1,7 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
-from game.cards.card import Card, ACTION, ATTACK, TREASURE, VICTORY
+from game.cards.card import Card, CostModifier, ACTION, ATTACK, TREASURE, VICTORY
 from game.askplayerinfo import AskYesNo
 from framework.latecall import LateCall
 from game.cards.common import Curse, Estate, Gold, Silver
@@ -67,6 +67,7 @@ class TrustySteed(Card):
     cardtype = ACTION
     cost = (0, 0)
     name = "Trusty Steed"
+    __slots__ = ('actions_list',)
 
     def __init__(self):
         Card.__init__(self)
@@ -202,21 +203,20 @@ class Princess(Card):
 
     def action_step(self, game, player):
         player.buys += 1
-
-        def mod(coins, potions, card):
-            if self in player.board:
-                return (coins - 2, potions)
-
-        game.add_cost_mod(mod)
-
+        game.add_cost_mod(CostModifier(self, player))
         game.resolved(self)
 
+    def modify_cost(self, player, coins, potions, card):
+        if self in player.board:
+            return (coins - 2, potions)
+
 
 class Tournament(Card):
 
     cardtype = ACTION
     cost = (4, 0)
     name = "Tournament"
+    __slots__ = ('pending', 'province_discarded', 'other_revealed')
 
     prices = [BagOfGold, Diadem, Followers, Princess, TrustySteed]
 
@@ -153,6 +153,7 @@ class FoolsGold(Card):
     cardtype = TREASURE | REACTION
     cost = (2, 0)
     name = "Fool's Gold"
+    triggers = (T_GAIN,)
     
     def __init__(self):
         Card.__init__(self)
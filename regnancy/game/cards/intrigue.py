@@ -3,7 +3,7 @@
 
 from functools import partial
 
-from game.cards.card import Card, ACTION, VICTORY, TREASURE, ATTACK, REACTION
+from game.cards.card import Card, CostModifier, ACTION, VICTORY, TREASURE, ATTACK, REACTION
 from framework.latecall import LateCall
 from game.subphaseinfo import SubPhaseInfo
 from game.cards.common import Duchy, Silver, Copper, Estate, Curse
@@ -42,6 +42,7 @@ class Swindler(Card):
     cardtype = ACTION | ATTACK
     cost = (3, 0)
     name = "Swindler"
+    __slots__ = ('revealed',)
 
     def __init__(self):
         Card.__init__(self)
@@ -91,6 +92,7 @@ class SecretChamber(Card):
     cardtype = ACTION | REACTION
     cost = (2, 0)
     name = "Secret Chamber"
+    triggers = (T_ATTACK,)
 
     def __init__(self):
         Card.__init__(self)
@@ -190,6 +192,7 @@ class Saboteur(Card):
     cardtype = ACTION | ATTACK
     cost = (5, 0)
     name = "Saboteur"
+    __slots__ = ('trashed',)
 
     def __init__(self):
         Card.__init__(self)
@@ -464,6 +467,7 @@ class Pawn(Card):
     cardtype = ACTION
     cost = (2, 0)
     name = "Pawn"
+    __slots__ = ('actions_list',)
 
     def __init__(self):
         Card.__init__(self)
@@ -508,14 +512,12 @@ class Bridge(Card):
     def action_step(self, game, player):
         player.buys += 1
         player.money += 1
-
-        def mod(coins, potions, card):
-            return (coins - 1, potions)
-
-        game.add_cost_mod(mod)
-
+        game.add_cost_mod(CostModifier(self, player))
         game.resolved(self)
 
+    def modify_cost(self, player, coins, potions, card):
+        return (coins - 1, potions)
+
 
 class Steward(Card):
 
@@ -759,6 +761,7 @@ class Masquerade(Card):
     cardtype = ACTION
     cost = (3, 0)
     name = "Masquerade"
+    __slots__ = ('pending', 'choosed')
 
     def __init__(self):
         Card.__init__(self)
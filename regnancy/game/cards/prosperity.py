@@ -1,8 +1,9 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
-from game.cards.card import Card, ACTION, TREASURE, REACTION
+from game.cards.card import Card, CostModifier, ACTION, TREASURE, REACTION
 from game.cards.common import Copper
+from game.gametrigger import T_GAIN
 
 
 class Loan(Card):
@@ -178,6 +179,7 @@ class Watchtower(Card):
   cardtype = ACTION | REACTION
   cost = (3, 0)
   name = "Watchtower"
+  triggers = (T_GAIN,)
 
   def __init__(self):
     Card.__init__(self)
@@ -238,6 +240,7 @@ class Bishop(Card):
   cardtype = ACTION
   cost = (4, 0)
   name = "Bishop"
+  __slots__ = ('pending',)
 
   def __init__(self):
     Card.__init__(self)
@@ -329,18 +332,16 @@ class Quarry(Card):
 
   def buy_step(self, game, player):
     player.money += 2
-
-    def mod(coins, potions, card):
-      if self in player.board:
-        if card.type & ACTION:
-          return (coins - 2, potions)
-        else:
-          return (coins, potions)
-
-    game.add_cost_mod(mod)
-
+    game.add_cost_mod(CostModifier(self, player))
     game.resolved(self)
 
+  def modify_cost(self, player, coins, potions, card):
+    if self in player.board:
+      if card.cardtype & ACTION:
+        return (coins - 2, potions)
+      else:
+        return (coins, potions)
+
   def action_step(self, game, player):
     self.buy_step(game, player)
 
@@ -370,6 +371,7 @@ class Contraband(Card):
   cardtype = TREASURE
   cost = (5, 0)
   name = "Contraband"
+  __slots__ = ('named_card',)
 
   def __init__(self):
     Card.__init__(self)
@@ -390,13 +392,13 @@ class Contraband(Card):
     #g = game.ask_all_players(
     #fix the above line so it compiles
 
-    def mod(coins, potions, card):
-      if card.name == self.named_card:
-        return (42, 42)
-      else:
-        return (coins, potions)
+    game.add_cost_mod(CostModifier(self, player))
 
-    game.add_cost_mod(mod)
+  def modify_cost(self, player, coins, potions, card):
+    if card.name == self.named_card:
+      return (42, 42)
+    else:
+      return (coins, potions)
 
   def action_step(self, game, player):
     self.buy_step(game, player)
@@ -169,7 +169,7 @@ class PearlDiver(Card):
         game.draw_card()
         player.actions += 1
         if not player.drawpile:
-            player.discardpile.shuffle_into(player.drawpile)
+            player.discardpile.shuffle_into(player.drawpile, game.random)
         if player.drawpile:
             bottom_card = player.drawpile.bottom_card
             game.ask_yes_no(self, 'Put %s on top of your deck?' % bottom_card.name.replace("_", " "))
@@ -279,6 +279,7 @@ class Tactician(Card):
     cardtype = ACTION | DURATION
     cost = (5, 0)
     name = "Tactician"
+    __slots__ = ('any_cards',)
 
     def __init__(self):
         Card.__init__(self)
@@ -301,6 +302,7 @@ class Haven(Card):
     cardtype = ACTION | DURATION
     cost = (2, 0)
     name = "Haven"
+    __slots__ = ('card',)
 
     def __init__(self):
         Card.__init__(self)
@@ -406,6 +408,7 @@ class Lighthouse(Card):
     cardtype = ACTION | DURATION 
     cost = (2, 0)
     name = "Lighthouse"
+    triggers = (T_ATTACK,)
 
     def __init__(self):
         Card.__init__(self)
@@ -472,6 +475,7 @@ class PirateShip(Card):
     cardtype = ACTION | ATTACK
     cost = (4, 0)
     name = "Pirate Ship"
+    __slots__ = ('revealed',)
 
 
     def __init__(self):
@@ -0,0 +1,63 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+How the server and the clients compress their messages, see
+framework.PodSixNet.compress.
+
+The preset dictionary is made of rencoded samples of the messages the
+server sends most, so it follows the encoding. The requests and
+responses of the clients are a few dozen bytes of ids and go out as
+they are; so do updates too small to gain from compressing.
+"""
+
+from itertools import chain
+
+from framework.locals import *
+from framework.PodSixNet.compress import Compression
+from framework.PodSixNet.rencode import dumps
+from gamestates import *
+import sync
+
+# key: action value: the size from which its messages get compressed,
+# None to never compress them
+THRESHOLDS = {REQUEST: None,
+              RESPONSE: None,
+              CHANGENAME: None}
+
+# the same for the other actions
+THRESHOLD = 64
+
+# names in the samples
+SAMPLE_PLAYER = "Player 1"
+SAMPLE_CARDS = ("Silver", "Gold", "Province")
+
+
+def sample(message):
+    """Returns the message encoded with its keys and values in a fixed order"""
+
+    return dumps(list(chain(*sorted(message.items()))) + ['PID', 1])
+
+
+def dictionary():
+    """Returns samples of the messages of the server, the most common last"""
+
+    samples = [{ACTION: END, RESULT: [(0, SAMPLE_PLAYER, 3)]}]
+    samples.extend({ACTION: MESSAGE, MESSAGE: "%s bought %s" % (SAMPLE_PLAYER, card)}
+                   for card in SAMPLE_CARDS)
+    samples.append({ACTION: MESSAGE, MESSAGE: "It's now %ss turn" % SAMPLE_PLAYER})
+    samples.extend({ACTION: UPDATE, field: (sync.CHANGES, [(0, 1, 0, 0)])}
+                   for field in (BOARDCOMMON, BOARDSETUP))
+    samples.append({ACTION: UPDATE, DECK: (sync.CHANGES, {0: 1})})
+    samples.extend({ACTION: UPDATE, field: (sync.CHANGES, ([1], [0, 1, 0, 0]))}
+                   for field in (HAND, BOARD))
+    samples.append({ACTION: UPDATE, PLAYERINFO: (sync.CHANGES, [(0, [(1, 5), (7, True)])])})
+    samples.extend({ACTION: UPDATE, PHASE: phase, CLIENTID: '1'}
+                   for phase in (P_END, P_CLEANUP, P_PRECLEANUP, P_BUY, P_ACTION))
+    samples.extend({ACTION: UPDATE, SUBID: 0, SUBPHASE: subphase, INFO: None, CLIENTID: '1'}
+                   for subphase in (SP_ORDERCARDS, SP_PICKCARD, SP_PICKCARDSFROMHAND,
+                                    SP_ASKPLAYER, SP_PLAYERINPUT, SP_WAIT))
+    return ''.join(sample(m) for m in samples)
+
+
+COMPRESSION = Compression(dictionary(), THRESHOLDS, THRESHOLD)
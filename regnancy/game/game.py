@@ -2,11 +2,12 @@
 # -*- coding: utf-8 -*-
 
 from framework.regnancyexception import PileIsEmptyException, \
-    NotEnoughMoneyException, RegnancyException
+    NotEnoughMoneyException, RegnancyException, CardNotInHandException
 from gamestates import SP_PLAYERINPUT, SP_WAIT, P_BUY, P_ACTION, \
     P_CLEANUP, P_PRECLEANUP
 from phase import ActionPhase, BuyPhase, CleanupPhase, PreCleanupPhase, PhaseManager
-from rules import commonpiles, standarddeck, prepare_piles, game_end, get_setup
+from rules import commonpiles, standarddeck, prepare_piles, game_end, get_setup, \
+    new_seed
 from itertools import chain
 from uuid import uuid4
 from gamestates import SP_ASKPLAYER, SP_PICKCARDSFROMHAND, SP_PICKCARD, CANCEL_ATTACK, SP_ORDERCARDS
@@ -21,7 +22,9 @@ from triggerinfo import TriggerInfo
 from infotoken import InfoToken
 from pile import Pile
 from pile import KingdomPile
+from snapshot import copy_game
 import logging
+import random
 from framework.event import ChangePhaseEvent, ChangeSubPhaseEvent,\
     ChangePilesEvent, ChangeBoardEvent, ChangeHandEvent, MessageEvent,\
     PlayerInfoEvent, GameEndEvent
@@ -37,6 +40,25 @@ END = 7
 SUBPHASE = 8
 
 
+def step(f):
+    """
+    Decorator for the methods that handle a client request or an update()
+    step of the game. State changes made while they run (and while the
+    methods they call run) are collected and sent once at the end."""
+
+    def _step(self, *args, **kwargs):
+        self._step_depth += 1
+        try:
+            result = f(self, *args, **kwargs)
+        finally:
+            self._step_depth -= 1
+        if not self._step_depth:
+            self.flush()
+        return result
+
+    return _step
+
+
 class Game(object):
 
     def __init__(self, ev):
@@ -83,10 +105,16 @@ class Game(object):
 
         # some cards need to modify the costs of all other cards.
         # Thus they can register a cost-modifying callable.
-        # This callable has to takes (coins, potions) and
+        # This callable has to takes (coins, potions, card class) and
         # returns (modified_coins, modified_potions)
         self.cost_mod = []
 
+        # get_cost caches the costs of each card class until the cost
+        # modifiers change, which bumps cost_mod_generation
+        self.cost_mod_generation = 0
+        self._cost_cache = {}
+        self._cost_cache_generation = 0
+
         self.last_played_cards = defaultdict(list)
         self.last_gained_cards = defaultdict(list)
         self.last_bought_cards = defaultdict(list)
@@ -94,6 +122,45 @@ class Game(object):
         self.pending_trigger = defaultdict(list)
         self.running_trigger = None
 
+        # why the game ended, see rules.game_end
+        self.end_reason = None
+
+        # all supply piles that are empty right now, kept up to date by the
+        # piles themselves (see Pile.watcher) so the end condition doesn't
+        # have to look at every pile
+        self.empty_piles = set()
+
+        # every shuffle and random choice of the game uses this random
+        # number generator, so a game can be replayed from its seed
+        self.seed = None
+        self.random = random.Random()
+
+        # number of the current turn, counting the turns of all players
+        self.turn = 1
+
+        # changes to hands, boards, piles and player infos are not sent
+        # right away, but marked as dirty and sent by flush()
+        self.dirty_hands = set()
+        self.dirty_boards = set()
+        self.dirty_piles = False
+        self.dirty_playerinfo = False
+        self._step_depth = 0
+
+        # all piles by card class, card name and pile id, see get_pile,
+        # and the ordered views of the piles. See invalidate_piles
+        self._pile_index = {}
+        self._kingdompiles_view = None
+        self._allpiles_view = None
+
+        # all cards of the game by id, and all players by id, see get_card
+        # and get_player_by_id. The cards are also numbered in the order the
+        # game got to know them, which unlike the ids is the same each time
+        # a game is played again, see card_number
+        self._cards = {}
+        self._card_numbers = {}
+        self._numbered_cards = []
+        self._player_index = {}
+
         self.phase = PhaseManager(self, (ActionPhase(self), BuyPhase(self),
                                   PreCleanupPhase(self), CleanupPhase(self)),
                                   self.__phase_enter, self.__phase_entered,
@@ -113,8 +180,8 @@ class Game(object):
                 if self._active_player in d:
                     del d[self._active_player]
 
-        ChangePhaseEvent(self._active_player, phase.key).post(self.ev)
-        ChangeSubPhaseEvent(0, self._active_player, SP_WAIT).post(self.ev)
+        self.post(ChangePhaseEvent(self._active_player, phase.key))
+        self.post(ChangeSubPhaseEvent(0, self._active_player, SP_WAIT))
 
     def __phase_entered(self, phase):
         """Called when entering a new game phase"""
@@ -128,16 +195,17 @@ class Game(object):
         if phase.key == P_PRECLEANUP:
             self.precleanupstack.extend(self._active_player.board)
         else:
-            ChangeSubPhaseEvent(0, self._active_player, SP_PLAYERINPUT).post(self.ev)
+            self.post(ChangeSubPhaseEvent(0, self._active_player, SP_PLAYERINPUT))
 
     def __phase_leave(self, phase):
         """Called when leaving a game phase"""
 
         if phase.key == P_CLEANUP:
-            self.cost_mod = []
-            ChangePilesEvent().post(self.ev)
-            ChangeHandEvent(self.active_player).post(self.ev)
+            self.clear_cost_mods()
+            self.dirty_piles = True
+            self.dirty_hands.add(self.active_player)
 
+    @step
     def play_card(self, player, card_id, free=False, is_duration=False, update=True):
         """Let the player play a card"""
 
@@ -145,18 +213,16 @@ class Game(object):
             logging.error("won't play %i if player %s is not active", card_id, player.name)
             return
 
-        if not card_id in [c.id for c in player.hand]:
+        card = self.get_card(card_id, player)
+        if card is None or not card in player.hand:
             logging.critical("card %i is not in hand of %s", card_id, player.name)
-            try:
-                card = player.deck.get_card(card_id)
+            if card is not None:
                 logging.critical("card is %s", card.name)
-            except StopIteration:
+            else:
                 logging.critical("could not find card in player deck")
             logging.critical("hand is %s", ", ".join([str(c.id) for c in player.hand]))
             raise RegnancyException()
 
-        card = next(c for c in player.hand if c.id == card_id)
-
         if self.phase == P_ACTION and not card.cardtype & ACTION:
             return
 
@@ -190,19 +256,36 @@ class Game(object):
 
     def add_cost_mod(self, mod):
         self.cost_mod.append(mod)
-        ChangePilesEvent().post(self.ev)
-        ChangeBoardEvent(self.active_player).post(self.ev)
+        self.cost_mod_generation += 1
+        self.dirty_piles = True
+        self.dirty_boards.add(self.active_player)
+
+    def clear_cost_mods(self):
+        self.cost_mod = []
+        self.cost_mod_generation += 1
 
     def get_cost(self, pile_or_card):
-        (coins, potions) = pile_or_card.cost
+        """Get the cost of a card or the cards of a pile, with all cost modifiers applied"""
+
         if isinstance(pile_or_card, KingdomPile):
-          card = pile_or_card.card
+            card = pile_or_card.card
         else:
-          card = pile_or_card
-        for mod in self.cost_mod:
-            (coins, potions) = mod(coins, potions, card)
-        return (max(coins, 0), max(potions, 0))
-
+            card = pile_or_card.__class__
+
+        if self._cost_cache_generation != self.cost_mod_generation:
+            self._cost_cache = {}
+            self._cost_cache_generation = self.cost_mod_generation
+
+        try:
+            return (self._cost_cache)[card]
+        except KeyError:
+            (coins, potions) = card.cost
+            for mod in self.cost_mod:
+                (coins, potions) = mod(coins, potions, card)
+            cost = (self._cost_cache)[card] = (max(coins, 0), max(potions, 0))
+            return cost
+
+    @step
     def buy_card(self, player, pile_id):
         """Let the player buy a card"""
 
@@ -210,13 +293,14 @@ class Game(object):
 
         if not len(pile):
             raise PileIsEmptyException("Player can't buy card from empty pile")
-        if self.get_cost(pile)[0] > player.money:
+        (coins, potions) = self.get_cost(pile)
+        if coins > player.money:
             raise NotEnoughMoneyException("Player can't buy this card, no money")
-        if self.get_cost(pile)[1] > player.potion:
+        if potions > player.potion:
             raise NotEnoughMoneyException("Player can't buy this card, no potion")
 
-        player.money -= self.get_cost(pile)[0]
-        player.potion -= self.get_cost(pile)[1]
+        player.money -= coins
+        player.potion -= potions
         player.buys -= 1
 
         msg = "%s bought %s" % (player.name, pile.name)
@@ -237,10 +321,11 @@ class Game(object):
 
     def take_card(self, player, card, message=None, to_hand=False, to_deck=False):
         self.yell(message or "%s took %s" % (player.name, card.name))
+        self._register_card(card)
         player.take_card(card, to_hand, to_deck)
         card.gain_step(self, player)
         self.update_player(player)
-        ChangePilesEvent().post(self.ev)
+        self.dirty_piles = True
         if player == self.active_player:
             (self.last_gained_cards)[player].append(card)
         self.raise_trigger(T_GAIN, card, player)
@@ -248,7 +333,7 @@ class Game(object):
 
     def raise_trigger(self, trigger, card, player):
         for p in self.players:
-            handler = [t for t in [(c, c.handle_trigger(trigger)) for c in p.hand] if t[1] != None]
+            handler = [t for t in [(c, c.handle_trigger(trigger)) for c in p.hand.reacting(trigger)] if t[1] != None]
             if handler:
                 self.pending_trigger[p].extend([TriggerInfo(c, player, card, callback) for c, callback in handler])
 
@@ -263,7 +348,9 @@ class Game(object):
     def discard_cards(self, cards, player=None):
         player = player or self.active_player
         for c in cards:
-            card = c if isinstance(c, Card) else player.hand.get_card(c)
+            card = c if isinstance(c, Card) else self.get_card(c, player)
+            if card is None:
+                raise CardNotInHandException("Can't discard %s" % c)
             self.discard_card(player, card)
 
     def discard_card(self, player, card):
@@ -306,9 +393,11 @@ class Game(object):
 
     @property
     def kingdompiles(self):
-        """Get all kingdom card piles"""
+        """Get all kingdom card piles, sorted by cost"""
 
-        return sorted(self._kingdompiles, key=lambda pile: pile.cost)
+        if self._kingdompiles_view is None:
+            self._kingdompiles_view = tuple(sorted(self._kingdompiles, key=lambda pile: pile.cost))
+        return self._kingdompiles_view
 
     @property
     def commonpiles(self):
@@ -320,31 +409,80 @@ class Game(object):
     def allpiles(self):
         """Get all piles (kingdom cards and common cards)"""
 
-        return list(chain(self.commonpiles, self.kingdompiles))
+        if self._allpiles_view is None:
+            self._allpiles_view = tuple(chain(self.commonpiles, self.kingdompiles))
+        return self._allpiles_view
+
+    def invalidate_piles(self):
+        """
+        Has to be called when a pile is added or removed, or the order of the
+        piles may have changed. Rebuilds the pile index and the ordered views."""
+
+        self._kingdompiles_view = None
+        self._allpiles_view = None
+        self._pile_index = {}
+        for pile in self.allpiles:
+            for key in (pile.card, pile.name, pile.id):
+                self._pile_index.setdefault(key, pile)
 
     def update_player(self, player=None):
-        """Sending player info around"""
+        """Mark the player (or all players) to be sent around by the next flush"""
 
-        def up(p):
+        for p in ([player] if player else self.players):
             if p == self.active_player:
-                ChangeBoardEvent(p).post(self.ev)
-                ChangePilesEvent().post(self.ev)
-            ChangeHandEvent(p).post(self.ev)
-            PlayerInfoEvent([p.create_info() for p in self.players]).post(self.ev)
+                self.dirty_boards.add(p)
+                self.dirty_piles = True
+            self.dirty_hands.add(p)
+        self.dirty_playerinfo = True
 
-        if player:
-            up(player)
-        else:
+    def flush(self):
+        """Sending all changes marked by update_player etc. around at once"""
+
+        if self.dirty_boards:
+            for p in self.players:
+                if p in self.dirty_boards:
+                    ChangeBoardEvent(p).post(self.ev)
+            self.dirty_boards = set()
+
+        if self.dirty_piles:
+            self.dirty_piles = False
+            ChangePilesEvent().post(self.ev)
+
+        if self.dirty_hands:
             for p in self.players:
-                up(p)
+                if p in self.dirty_hands:
+                    ChangeHandEvent(p).post(self.ev)
+            self.dirty_hands = set()
 
-    def setup(self, setup, players):
-        """Setup a a new game"""
+        if self.dirty_playerinfo:
+            self.dirty_playerinfo = False
+            PlayerInfoEvent([p.create_info() for p in self.players]).post(self.ev)
+
+    def post(self, event):
+        """
+        Posts a phase, subphase or end event after the changes marked so
+        far, so the clients get the hand, board, ... the event is about first"""
+
+        self.flush()
+        event.post(self.ev)
+
+    def setup(self, setup, players, seed=None):
+        """Setup a a new game. If no seed is given, a new one is chosen"""
 
         self.__init__(self.ev) # This seems like a bad, bad hack?
+        self.seed = new_seed() if seed is None else seed
+        self.random = random.Random(self.seed)
+        logging.info("game seed is %s", self.seed)
         self._players = players
-        self._kingdompiles = prepare_piles(get_setup(setup), len(self.players))
+        self._kingdompiles = prepare_piles(get_setup(setup, self.random), len(self.players))
         self._commonpiles = prepare_piles(commonpiles, len(self.players))
+        self.invalidate_piles()
+        self._player_index = dict((p.id, p) for p in self.players)
+        for pile in self.allpiles:
+            for card in pile:
+                self._register_card(card)
+            pile.watcher = self.pile_emptied
+            self.pile_emptied(pile, not len(pile))
         self.endcondition = game_end
         self.running = True
 
@@ -352,30 +490,26 @@ class Game(object):
             player.actions = 1
             player.buys = 1
 
-            [player.take_card(card) for card in standarddeck()]
+            for card in standarddeck(self.random):
+                self._register_card(card)
+                player.take_card(card)
 
             [player.draw_card() for _ in xrange(5)]
             self.update_player(player)
 
-            ChangePhaseEvent(player, SP_WAIT).post(self.ev)
+            self.post(ChangePhaseEvent(player, SP_WAIT))
 
         self._active_player = (self._players)[0]
         self.phase.next_phase()
+        self.flush()
 
     def get_pile(self, cardtype):
-        """Get the pile with the specific cardtype"""
-
-        a = lambda pile: pile.card == cardtype
-        b = lambda pile: pile.card.name == cardtype
-        c = lambda pile: pile.id == cardtype
-
-        for l in (a, b, c):
-            try:
-                return next(pile for pile in self.allpiles if l(pile))
-            except:
-                pass
+        """Get the pile with the specific card class, card name or pile id"""
 
-        return None
+        try:
+            return self._pile_index.get(cardtype)
+        except TypeError:  # e.g. a list send by a client
+            return None
 
     def draw_card(self, player=None, count=1):
         """Let the player draw a card"""
@@ -384,6 +518,7 @@ class Game(object):
             (player or self.active_player).draw_card()
         self.update_player(player or self.active_player)
 
+    @step
     def update(self):
         """The game's main-loop, called by the server's loop"""
 
@@ -408,8 +543,17 @@ class Game(object):
 
         self.phase.update()
 
+    def pile_emptied(self, pile, empty):
+        """Called by the supply piles when they become empty or get cards again"""
+
+        if empty:
+            self.empty_piles.add(pile)
+        else:
+            self.empty_piles.discard(pile)
+
     def check_endcondition(self):
-        return game_end(self)
+        self.end_reason = self.endcondition(self)
+        return self.end_reason
 
     def end_of_game(self):
         logging.info("game over")
@@ -417,7 +561,8 @@ class Game(object):
         self.running = False
         result = self.calculate_result()
 
-        GameEndEvent(result).post(self.ev)
+        self.flush()
+        self.post(GameEndEvent(result))
 
     def calculate_result(self):
         for p in self.players:
@@ -428,15 +573,16 @@ class Game(object):
     def _next_player(self):
         """Set the next player as active"""
 
-        print "- next player -----------------------"
+        logging.debug("- next player -----------------------")
 
+        self.turn += 1
         self.action_step_handler = []
         self.buy_step_handler = []
 
         self._active_player = self.next_player()
         #logging.debug("----- next player (%s)-------", self.active_player.name)
         self.yell("It's now %ss turn" % self.active_player.name)
-        PlayerInfoEvent([p.create_info() for p in self.players]).post(self.ev)
+        self.dirty_playerinfo = True
 
     def previous_player(self):
         """Return the previous player before the actual one"""
@@ -453,6 +599,7 @@ class Game(object):
         next_index = self.players.index(current) + 1
         return (self.players)[0] if next_index == len(self.players) else (self.players)[next_index]
 
+    @step
     def endphase(self, player):
         """End the current phase"""
 
@@ -487,7 +634,7 @@ class Game(object):
             if p is self.active_player:
                 self.enter_subphase(SubPhaseInfo(subphase, card, info, handler))
             else:
-                ChangeSubPhaseEvent(card.id, p, subphase, info).post(self.ev)
+                self.post(ChangeSubPhaseEvent(card.id, p, subphase, info))
 
         return players
 
@@ -542,7 +689,7 @@ class Game(object):
         def add_to_attack_cache_or_resolve():
             if expect_answer:
                 (self.attack_cache)[p] = attack_handler
-                ChangeSubPhaseEvent(card.id, p, attack_phase, info).post(self.ev)
+                self.post(ChangeSubPhaseEvent(card.id, p, attack_phase, info))
                 return True
 
             # if we don't expect an answer (e.g. the attack cards just says: take a curse)
@@ -552,7 +699,7 @@ class Game(object):
 
         cancel = True
         for p in attacked_players:
-            triggerable_cards ={ t[0]: t[1] for t in [(c, c.handle_trigger(T_ATTACK)) for c in p.hand] if t[1] != None}
+            triggerable_cards ={ t[0]: t[1] for t in [(c, c.handle_trigger(T_ATTACK)) for c in p.hand.reacting(T_ATTACK)] if t[1] != None}
 
             reaction_cards = list(set([c.name for c in triggerable_cards.keys()]))
 
@@ -571,14 +718,14 @@ class Game(object):
                                 result(self, player, add_to_attack_cache_or_resolve)
                             return wrapper
                         else:
-                            ChangeSubPhaseEvent(None, p, SP_WAIT).post(self.ev)
+                            self.post(ChangeSubPhaseEvent(None, p, SP_WAIT))
 
                     return True
 
                 reaction_cards.append("play no reaction")
                 q_info = AskPlayerInfo('Attacked by %s' % card.name,
                         "Play reaction card?", reaction_cards, card)
-                ChangeSubPhaseEvent(uuid4(), p, SP_ASKPLAYER, q_info).post(self.ev)
+                self.post(ChangeSubPhaseEvent(uuid4(), p, SP_ASKPLAYER, q_info))
                 (self.reaction_cache)[p] = handle_answer
             else:
                 if add_to_attack_cache_or_resolve():
@@ -624,8 +771,8 @@ class Game(object):
 
             self.subphaseinfo = subphaseinfo
 
-            ChangeSubPhaseEvent(subphaseinfo.card.id, self.active_player,
-                    self.subphaseinfo.subphase, self.subphaseinfo.info).post(self.ev)
+            self.post(ChangeSubPhaseEvent(subphaseinfo.card.id, self.active_player,
+                    self.subphaseinfo.subphase, self.subphaseinfo.info))
         else:
             self.subphase_cache.append(subphaseinfo)
 
@@ -636,8 +783,8 @@ class Game(object):
 
         self.subphaseinfo = self.subphase_cache.pop()
 
-        ChangeSubPhaseEvent(self.subphaseinfo.card, self.active_player,
-                self.subphaseinfo.subphase, info=self.subphaseinfo.info).post(self.ev)
+        self.post(ChangeSubPhaseEvent(self.subphaseinfo.card, self.active_player,
+                self.subphaseinfo.subphase, info=self.subphaseinfo.info))
 
         if cb:
             cb(self, self.active_player)
@@ -646,6 +793,7 @@ class Game(object):
             lc()
         self.late_calls = []
 
+    @step
     def answered(self, player, result, subid):
         """Handle the given answer"""
 
@@ -663,7 +811,7 @@ class Game(object):
 
                 if handler_result:
                     del cache[player]
-                    ChangeSubPhaseEvent(None, player, SP_WAIT).post(self.ev)
+                    self.post(ChangeSubPhaseEvent(None, player, SP_WAIT))
 
                     if isinstance(handler_result, LateCall):
                         self.late_calls.append(handler_result)
@@ -708,8 +856,49 @@ class Game(object):
             self.yell("%s has no cards left" % player.name)
         return card
 
+    def snapshot(self):
+        """Returns an independent copy of the game that drops all events, see snapshot.copy_game"""
+
+        return copy_game(self)
+
+    def clone(self, ev):
+        """Returns an independent copy of the game that posts its events to ev"""
+
+        return copy_game(self, ev)
+
     def get_player_by_id(self, player_id):
-        return (p for p in self.players if p.id == player_id).next()
+        return (self._player_index)[player_id]
+
+    def get_card(self, card_id, player=None):
+        """
+        Get the card with the given id. Cards created during the game (e.g. the
+        copies of Throne Room) are unknown until they got gained, so these are
+        looked up in the hand of the player"""
+
+        card = self._cards.get(card_id)
+        if card is None and player is not None:
+            try:
+                card = player.hand.get_card(card_id)
+            except StopIteration:
+                return None
+            self._register_card(card)
+        return card
+
+    def _register_card(self, card):
+        if not card.id in self._cards:
+            (self._cards)[card.id] = card
+            (self._card_numbers)[card.id] = len(self._numbered_cards)
+            self._numbered_cards.append(card)
+
+    def card_number(self, card_id):
+        """Get the number of the card with the given id, or None if the game doesn't know it"""
+
+        return self._card_numbers.get(card_id)
+
+    def card_by_number(self, number):
+        """Get the card with the given number, see card_number"""
+
+        return (self._numbered_cards)[number]
 
     def add_action_step_handler(self, card_class, callback):
         self.action_step_handler.append(StepHandler(card_class, callback))
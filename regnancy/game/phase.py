@@ -78,7 +78,7 @@ class ActionPhase(Phase):
     def enter(self):
 
         player = self.game.active_player
-        for card in (player.durations.cards)[:]:
+        for card in list(player.durations):
             player.durations.remove(card)
             player.hand.add(card)
             self.game.play_card(player, card.id, free=True, is_duration=True)
@@ -146,7 +146,7 @@ class CleanupPhase(Phase):
         for _ in xrange(5):
             player.draw_card()
 
-        self.game.cost_mod = []
+        self.game.clear_cost_mods()
         self.game.update_player(player)
         self.game._next_player()
         self.game.phase.next_phase()
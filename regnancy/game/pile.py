@@ -1,7 +1,7 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
-from random import shuffle
+import random
 from uuid import uuid4
 
 from framework.regnancyexception import PileIsEmptyException
@@ -10,56 +10,146 @@ from cards.card import ACTION, TREASURE, VICTORY
 
 class Pile(object):
 
-    """Represents a pile of cards."""
+    """
+    Represents a pile of cards, ordered from the bottom to the top card.
 
-    def __init__(self):
+    The cards are indexed by their id, so checking if a card is in the pile,
+    removing it and looking it up by its id don't have to scan the pile.
+    Removing a card leaves a hole in self.cards, which is skipped while
+    iterating and closed once there are more holes than cards.
+
+    A pile that is one of the zones of a player (hand, board, ...) gets the
+    zone map of that player, and keeps it up to date with the cards it
+    holds, see Player.zone_of.
+
+    The watcher of a pile, if any, gets called with the pile and True or
+    False whenever the pile becomes empty or stops being empty."""
+
+    def __init__(self, zones=None):
         self.cards = []
         self.id = uuid4()
+        self.zones = zones  # key: card id value: the pile the card is in
+        self.watcher = None
+        self.__positions = {}  # key: card id value: index in self.cards
+        self.__holes = 0
 
     def __getitem__(self, key):
+        self.__compact()
         return (self.cards)[key]
 
+    def __contains__(self, card):
+        pos = self.__positions.get(getattr(card, 'id', None))
+        return pos is not None and (self.cards)[pos] is card
+
+    def __compact(self):
+        """Closes the holes left by removed cards"""
+
+        if self.__holes:
+            self.cards = [c for c in self.cards if c is not None]
+            self.__reindex()
+
+    def __reindex(self):
+        self.__positions = dict((c.id, i) for (i, c) in enumerate(self.cards))
+        self.__holes = 0
+
+    def __trim(self):
+        """Drops the holes on top of the pile"""
+
+        while self.__holes and self.cards and (self.cards)[-1] is None:
+            self.cards.pop()
+            self.__holes -= 1
+
     def add(self, card):
         """Puts a card on top of the pile"""
 
-        if not card in self.cards:
+        if not card in self:
+            if self.zones is not None:
+                assert self.zones.get(card.id) is None, \
+                    "%s is already in another zone" % card
+                (self.zones)[card.id] = self
+            (self.__positions)[card.id] = len(self.cards)
             self.cards.append(card)
+            self._entered(card)
+            if self.watcher and len(self) == 1:
+                self.watcher(self, False)
+
+    def _entered(self, card):
+        """Called after a card was put into the pile"""
+
+        pass
+
+    def _left(self, card):
+        """Called after a card was taken out of the pile"""
+
+        pass
+
+    def __leave_zone(self, card):
+        if self.zones is not None and self.zones.get(card.id) is self:
+            del (self.zones)[card.id]
+        self._left(card)
+
+    def __emptied(self):
+        if self.watcher and not len(self):
+            self.watcher(self, True)
 
     def remove(self, card):
         """Removes a card from the pile"""
 
-        return self.cards.pop(self.cards.index(card))
+        if not card in self:
+            raise ValueError("%s is not in the pile" % card)
+        (self.cards)[self.__positions.pop(card.id)] = None
+        self.__leave_zone(card)
+        self.__holes += 1
+        self.__trim()
+        if self.__holes > len(self.cards) / 2:
+            self.__compact()
+        self.__emptied()
+        return card
 
     def take(self, save=False):
         """Returns the top card of the pile"""
 
+        self.__trim()
         try:
-            return self.cards.pop()
+            card = self.cards.pop()
         except:
             if save:
                 return None
             raise PileIsEmptyException("Can't take next card")
-
-    def shuffle_into(self, other_pile):
-        """Shuffles all cards in this pile into the other pile"""
-
-        other_pile.cards.extend(self.cards)
-        other_pile.shuffle()
+        del (self.__positions)[card.id]
+        self.__leave_zone(card)
+        self.__emptied()
+        return card
+
+    def shuffle_into(self, other_pile, rng=random):
+        """Shuffles all cards in this pile into the other pile, using the random number generator rng"""
+
+        for card in self:
+            self.__leave_zone(card)
+            other_pile.add(card)
+        other_pile.shuffle(rng)
+        was_empty = not len(self)
         self.cards = []
+        self.__reindex()
+        if not was_empty:
+            self.__emptied()
 
-    def shuffle(self):
-        """Shuffles the pile"""
+    def shuffle(self, rng=random):
+        """Shuffles the pile, using the random number generator rng"""
 
-        shuffle(self.cards)
+        self.__compact()
+        rng.shuffle(self.cards)
+        self.__reindex()
 
     @property
     def bottom_card(self):
+        self.__compact()
         return (self.cards)[0]
 
     def __len__(self):
         """Returns the number of cards in the pile"""
 
-        return len(self.cards)
+        return len(self.cards) - self.__holes
 
     def __iter__(self):
         """Returns the piles iteration-object"""
@@ -69,27 +159,29 @@ class Pile(object):
     def forward(self):
         """Returns the forward-generator"""
 
-        current_item = 0
-        while current_item < len(self.cards):
-            card = (self.cards)[current_item]
-            current_item += 1
-            yield card
+        for card in (self.cards)[:]:
+            if card is not None and card in self:
+                yield card
 
     def sort(self, **kwargs):
+        self.__compact()
         self.cards.sort(**kwargs)
+        self.__reindex()
 
     def reverse(self):
         """Returns the backward-generator"""
 
-        current_item = len(self.cards)
-        while current_item > 0:
-            current_item -= 1
-            yield (self.cards)[current_item]
+        for card in reversed(self.cards[:]):
+            if card is not None and card in self:
+                yield card
 
     def get_card(self, card_id):
         """Returns the cards with the given card id"""
 
-        return next(c for c in self if c.id == card_id)
+        try:
+            return (self.cards)[(self.__positions)[card_id]]
+        except KeyError:
+            raise StopIteration("No card with id %s in the pile" % card_id)
 
     def get_actions(self):
         """Returns all action cards from this pile"""
@@ -107,12 +199,40 @@ class Pile(object):
         return self.get_all_of_card_type(VICTORY)
 
     def get_all_of_card_type(self, card_type):
-        return [c for c in self if c.cardtype & card_type]
+        return [c for c in self.cards if c is not None and c.cardtype & card_type]
 
     def get_all_of_card_class(self, card_class):
         """ Returns all cards of a given class, e.g. Duchy or Copper"""
 
-        return [c for c in self if isinstance(c, card_class)]
+        return [c for c in self.cards if c is not None and isinstance(c, card_class)]
+
+
+class Hand(Pile):
+
+    """
+    Represents the hand of a player. Keeps track of the cards in it that
+    react to a trigger (see Card.triggers), so raising a trigger doesn't
+    have to ask every card in every hand."""
+
+    def __init__(self, zones=None):
+        Pile.__init__(self, zones)
+        self.reactions = {}  # key: trigger value: pile of the reacting cards
+
+    def _entered(self, card):
+        for trigger in card.triggers:
+            if not trigger in self.reactions:
+                (self.reactions)[trigger] = Pile()
+            (self.reactions)[trigger].add(card)
+
+    def _left(self, card):
+        for trigger in card.triggers:
+            (self.reactions)[trigger].remove(card)
+
+    def reacting(self, trigger):
+        """Returns the cards in the hand that react to the trigger"""
+
+        pile = self.reactions.get(trigger)
+        return list(pile) if pile else []
 
 
 class KingdomPile(Pile):
@@ -126,6 +246,6 @@ class KingdomPile(Pile):
         self.card = cardtype
         self.initialsize = count
         for _ in xrange(count):
-            self.cards.append(cardtype())
+            self.add(cardtype())
 
 
@@ -2,7 +2,7 @@
 # -*- coding: utf-8 -*-
 
 from framework.regnancyexception import *
-from pile import Pile
+from pile import Pile, Hand
 from playerinfo import PlayerInfo
 from cards.card import ACTION
 
@@ -20,22 +20,32 @@ class Player(object):
         self.score = 0
         self.potion = 0
         self.game = game
-        self.hand = Pile()
-        self.board = Pile()
+
+        # the zone each card of the player is in, key: card id value: pile.
+        # deck (all cards of the player) and durations (the duration cards
+        # on the board) span other zones and are not part of it
+        self.zones = {}
+        self.hand = Hand(self.zones)
+        self.board = Pile(self.zones)
         self.deck = Pile()
         self.durations = Pile()
-        self.drawpile = Pile()
-        self.discardpile = Pile()
-        self.island = Pile()
-        self.nativeVillage = Pile()
+        self.drawpile = Pile(self.zones)
+        self.discardpile = Pile(self.zones)
+        self.island = Pile(self.zones)
+        self.nativeVillage = Pile(self.zones)
         self.pirateShip = 0
 
+    def zone_of(self, card):
+        """Returns the zone (hand, board, draw pile, ...) the card is in, or None"""
+
+        return self.zones.get(card.id)
+
     def move_card_to_pile(self, card, target_pile):
-        """Moves a card from the draw pile, the discard pile, or the hand to another target pile"""
+        """Moves a card from the zone it is in to another target pile"""
 
-        for p in (self.drawpile, self.discardpile, self.hand):
-            if card in p:
-                p.remove(card)
+        zone = self.zone_of(card)
+        if zone is not None:
+            zone.remove(card)
         target_pile.add(card)
 
     def create_info(self):
@@ -64,10 +74,10 @@ class Player(object):
     def play_card(self, card_id):
         """Play the given card"""
 
-        card = [card for card in self.hand if card.id == card_id]
-        if not card:
+        try:
+            card = self.hand.get_card(card_id)
+        except StopIteration:
             raise CardNotInHandException("Can't play %s" % card_id)
-        card = card[0]
         self.hand.remove(card)
         self.board.add(card)
 
@@ -82,31 +92,18 @@ class Player(object):
     def put_on_drawpile(self, card):
         if card:
             self.deck.add(card)
-            self.drawpile.add(card)
+            self.move_card_to_pile(card, self.drawpile)
 
     def trash_card(self, card):
         """Remove a card from the deck and put it onto the games trashpile"""
 
-        try:
-            self.game.trash.add(self.deck.remove(card))
-        except ValueError:
-            pass
-        try:
-            self.game.trash.add(self.board.remove(card))
-        except ValueError:
-            pass
-        try:
-            self.game.trash.add(self.hand.remove(card))
-        except ValueError:
-            pass
-        try:
-            self.game.trash.add(self.discardpile.remove(card))
-        except ValueError:
-            pass
-        try:
-            self.game.trash.add(self.durations.remove(card))
-        except ValueError:
-            pass
+        trashed = False
+        for pile in (self.deck, self.zone_of(card), self.durations):
+            if pile is not None and card in pile:
+                pile.remove(card)
+                trashed = True
+        if trashed:
+            self.game.trash.add(card)
 
     def take_card(self, card, to_hand=False, to_deck=False):
         """Take a card and put in into the discard pile or hand or deck"""
@@ -128,7 +125,7 @@ class Player(object):
         try:
             card = self.drawpile.take()
         except PileIsEmptyException:
-            self.discardpile.shuffle_into(self.drawpile)
+            self.discardpile.shuffle_into(self.drawpile, self.game.random)
             try:
                 card = self.drawpile.take()
             except PileIsEmptyException:
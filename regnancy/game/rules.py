@@ -25,6 +25,10 @@ from cards.prosperity import Bank, CountingHouse
 from pile import KingdomPile
 from cards.intrigue import Minion
 
+# the reasons rules.game_end may give for the end of a game
+END_PROVINCES = "provinces"  # the Province pile is empty
+END_PILES = "piles"  # three (or more) supply piles are empty
+
 commonpiles = (Copper, Silver, Gold, Potion, Estate, Duchy, Province,
                Curse)
 
@@ -48,7 +52,13 @@ def prepare_piles(list_of_cards, num_players):
     return piles
 
 
-def standarddeck():
+def new_seed():
+    """Returns a new seed for the random number generator of a game"""
+
+    return random.SystemRandom().getrandbits(32)
+
+
+def standarddeck(rng=random):
     deck = []
 
     if global_options.debug_mode:
@@ -58,18 +68,18 @@ def standarddeck():
     else:
         [deck.append(Copper()) for _ in xrange(7)]
         [deck.append(Estate()) for _ in xrange(3)]
-    random.shuffle(deck)
+    rng.shuffle(deck)
     return deck
 
 
-def randomsetup():
+def randomsetup(rng=random):
 
     def card_filter(c):
         return not c in commonpiles and not c in [BagOfGold, Diadem,
                 Followers, Princess, TrustySteed]
 
     cards = [c for c in cardprovider.get_all_card_classes() if card_filter(c)]
-    random.shuffle(cards)
+    rng.shuffle(cards)
     if global_options.debug_mode:
         d =[]# [IllGottenGains, FoolsGold]
         d.extend(cards[:10-len(d)])
@@ -78,15 +88,24 @@ def randomsetup():
         return cards[:10]
 
 
-def get_setup(setup):
+def get_setup(setup, rng=random):
+    """setup is either 'random', the name of a saved deck or a list of
+    card classes or card names (e.g. when running a simulation)"""
+
     if setup == 'random':
-        return randomsetup()
-    else:
+        return randomsetup(rng)
+    if isinstance(setup, basestring):
         deck = deckprovider.load_deck(setup)
-        return [c for c in cardprovider.get_all_card_classes() if c.name in deck]
+    else:
+        deck = [getattr(c, 'name', c) for c in setup]
+    return [c for c in cardprovider.get_all_card_classes() if c.name in deck]
 
 
 def game_end(game):
-    p = len(game.get_pile(Province))
-    e = len([pile for pile in game.allpiles if not len(pile)])
-    return p == 0 or e >= 3
\ No newline at end of file
+    """Returns why the game is over, or None if it is not"""
+
+    if game.get_pile(Province) in game.empty_piles:
+        return END_PROVINCES
+    if len(game.empty_piles) >= 3:
+        return END_PILES
+    return None
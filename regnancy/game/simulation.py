@@ -0,0 +1,289 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Runs a game.Game without a server, an EventManager, sockets or pygame.
+
+The game is driven directly: every question the game asks a player is
+answered by a Strategy object living in the same process, and the
+simulation calls Game.update/answered/play_card/buy_card itself until
+the game is over. This is used to evaluate kingdoms and bot strategies
+offline, e.g.
+
+    result = simulate([Village, Smithy, ...], [BigMoneyStrategy(), Strategy()])
+"""
+
+import logging
+from collections import defaultdict
+
+from framework.event import ChangeSubPhaseEvent, GameEndEvent
+from framework.regnancyexception import SimulationException, \
+    PileIsEmptyException, NotEnoughMoneyException
+from game import Game
+from player import Player
+from gamestates import SP_PLAYERINPUT, SP_PICKCARD, SP_PICKCARDSFROMHAND, \
+    SP_ORDERCARDS, SP_ASKPLAYER, P_ACTION, P_BUY
+from cards.card import ACTION, TREASURE, VICTORY, CURSE
+from cards.common import Province, Gold, Silver, Copper
+
+# the subphases in which the game waits for an answer of a player
+INPUT_SUBPHASES = (SP_PICKCARD, SP_PICKCARDSFROMHAND, SP_ORDERCARDS,
+                   SP_ASKPLAYER)
+
+# a game that takes longer than this is stopped and scored as it is
+TURN_LIMIT = 200
+END_TURN_LIMIT = "turn limit"  # end reason of such a game, see rules.game_end
+
+# a player that needs more decisions than this for a single turn is
+# considered stuck (e.g. playing a card the game keeps refusing)
+STEP_LIMIT = 1000
+
+
+def discard_order(cards):
+    """Returns the cards ordered from the least to the most useful one"""
+
+    def key(card):
+        if not card.cardtype & ~(VICTORY | CURSE):
+            return (0, card.cost)
+        if isinstance(card, Copper):
+            return (1, card.cost)
+        return (2, card.cost)
+
+    return sorted(cards, key=key)
+
+
+class Strategy(object):
+
+    """
+    Makes all decisions for one player of a simulated game. The default
+    implementation plays every action and treasure it has, buys nothing and
+    answers every question with the first answer the game accepts.
+    Subclass it to implement a bot."""
+
+    name = "Strategy"
+
+    def play_action(self, game, player):
+        """Returns the action card to play next, or None to end the action phase"""
+
+        return next((c for c in player.hand if c.cardtype & ACTION), None)
+
+    def play_treasure(self, game, player):
+        """Returns the treasure card to play next, or None to start buying"""
+
+        return next((c for c in player.hand if c.cardtype & TREASURE), None)
+
+    def buy(self, game, player):
+        """Returns the pile to buy a card from, or None to end the buy phase"""
+
+        return None
+
+    def answers(self, game, player, subphase, info):
+        """
+        Yields possible answers to a question of the game, the preferred one
+        first. The simulation tries them in turn until the game accepts one."""
+
+        if subphase == SP_ASKPLAYER:
+            for answer in info.answers:
+                yield answer
+
+        elif subphase == SP_PICKCARDSFROMHAND:
+            cards = [c.id for c in discard_order(player.hand)]
+            for i in xrange(len(cards) + 1):
+                yield cards[:i]
+            for card_id in cards:
+                yield [card_id]
+
+        elif subphase == SP_PICKCARD:
+            piles = sorted((p for p in game.allpiles if len(p)),
+                           key=game.get_cost, reverse=True)
+            for pile in piles:
+                yield pile.id
+            yield None
+
+        elif subphase == SP_ORDERCARDS:
+            cards = [c.id for c in info.cards]
+            yield cards
+            yield []
+            for card_id in cards:
+                yield [card_id]
+
+
+class BigMoneyStrategy(Strategy):
+
+    """Buys only Provinces, Gold and Silver, like the bot of the aiclient"""
+
+    name = "Big Money"
+
+    def buy(self, game, player):
+        golds = len(player.deck.get_all_of_card_class(Gold))
+        silvers = len(player.deck.get_all_of_card_class(Silver))
+
+        wanted = [Gold]
+        if golds >= 2:
+            wanted.insert(0, Province)
+        if golds < 5 and silvers < 6:
+            wanted.append(Silver)
+
+        for card in wanted:
+            pile = game.get_pile(card)
+            if pile and len(pile) and can_afford(game, player, pile):
+                return pile
+
+
+def can_afford(game, player, pile):
+    (coins, potions) = game.get_cost(pile)
+    return player.buys > 0 and coins <= player.money and potions <= player.potion
+
+
+class HeadlessEventManager(object):
+
+    """
+    Takes the place of the EventManager in a simulated game. Only the events
+    the simulation needs to drive the game are dispatched, all other events
+    are dropped right away."""
+
+    def __init__(self, simulation):
+        self.handler = {ChangeSubPhaseEvent: simulation.handle_changesubphaseevent,
+                        GameEndEvent: simulation.handle_gameendevent}
+
+    def post(self, event):
+        handler = self.handler.get(event.__class__)
+        if handler:
+            handler(event)
+
+
+class Simulation(object):
+
+    """Plays a single game between the given strategies"""
+
+    def __init__(self, kingdom, strategies, names=None, turn_limit=TURN_LIMIT,
+                 seed=None):
+        assert kingdom, "kingdom is empty"
+        assert strategies, "no strategies"
+
+        self.kingdom = kingdom
+        self.turn_limit = turn_limit
+        self.seed = seed  # see Game.setup
+        self.ev = HeadlessEventManager(self)
+        self.game = Game(self.ev)
+
+        names = names or ["%s %i" % (s.name, i + 1) for (i, s) in enumerate(strategies)]
+        self.players = [Player(name, self.game, i + 1) for (i, name) in enumerate(names)]
+        self.strategies = dict(zip(self.players, strategies))
+
+        # questions the players have to answer, key: player value: ChangeSubPhaseEvent
+        self.prompts = {}
+        self.prompt_count = 0
+        self.result = None
+        self.end_reason = None
+
+        # the names of all cards a player bought, key: player value: list
+        self.bought = defaultdict(list)
+
+    def handle_changesubphaseevent(self, event):
+        self.prompt_count += 1
+        if event.subphase in INPUT_SUBPHASES:
+            (self.prompts)[event.player] = event
+        else:
+            self.prompts.pop(event.player, None)
+
+    def handle_gameendevent(self, event):
+        self.result = event.result
+
+    def run(self):
+        """Plays the game to its end and returns Game.calculate_result()"""
+
+        game = self.game
+        game.setup(self.kingdom, self.players, self.seed)
+        self.seed = game.seed
+
+        turn = game.turn
+        steps = 0
+        while game.running:
+            game.update()
+            if not game.running:
+                break
+
+            if game.turn != turn:
+                turn = game.turn
+                steps = 0
+                if turn > self.turn_limit:
+                    logging.info("turn limit of %i reached", self.turn_limit)
+                    game.running = False
+                    game.end_reason = END_TURN_LIMIT
+                    self.result = game.calculate_result()
+                    break
+
+            steps += 1
+            if steps > STEP_LIMIT:
+                raise SimulationException("game is stuck in turn %i (%s, %s)" %
+                                          (turn, game.phase.current_phase.name,
+                                           game.subphaseinfo.subphase))
+
+            if self.prompts:
+                self.answer(self.next_prompt())
+            elif game.subphaseinfo.subphase == SP_PLAYERINPUT:
+                self.take_turn(game.active_player)
+
+        self.end_reason = game.end_reason
+        return self.result
+
+    def next_prompt(self):
+        """Returns the next question to answer. The other players are asked
+        first, since the active player usually waits for them"""
+
+        for player in self.game.other_players:
+            if player in self.prompts:
+                return (self.prompts)[player]
+        return (self.prompts)[self.game.active_player]
+
+    def answer(self, prompt):
+        player = prompt.player
+        strategy = (self.strategies)[player]
+
+        for answer in strategy.answers(self.game, player, prompt.subphase, prompt.info):
+            count = self.prompt_count
+            self.game.answered(player, answer, prompt.card_id)
+            if count != self.prompt_count or not self.game.running:
+                return
+
+        raise SimulationException("%s found no valid answer to '%s'" %
+                                  (player.name, prompt.info))
+
+    def take_turn(self, player):
+        """Let the strategy of the active player play a card, buy a card or end the phase"""
+
+        game = self.game
+        strategy = (self.strategies)[player]
+
+        if game.phase == P_ACTION:
+            card = strategy.play_action(game, player)
+            if card:
+                game.play_card(player, card.id)
+                return
+
+        elif game.phase == P_BUY:
+            card = strategy.play_treasure(game, player)
+            if card:
+                game.play_card(player, card.id)
+                return
+
+            pile = strategy.buy(game, player)
+            if pile:
+                try:
+                    game.buy_card(player, pile.id)
+                    (self.bought)[player].append(pile.name)
+                    return
+                except (NotEnoughMoneyException, PileIsEmptyException):
+                    logging.debug("%s could not buy %s", player.name, pile.name)
+        else:
+            return
+
+        game.endphase(player)
+
+
+def simulate(kingdom, strategies, **kwargs):
+    """Plays a game with the given kingdom cards between the given
+    strategies and returns the result as [(player name, score), ...]"""
+
+    return Simulation(kingdom, strategies, **kwargs).run()
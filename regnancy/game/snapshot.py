@@ -0,0 +1,225 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Copies a running game.Game, e.g. for a bot that wants to look ahead.
+
+The copy shares everything that can't change during the game (card
+classes, strings, numbers, module level functions, and all cards without
+own state) and copies everything else: the players and their zones, the
+piles, the trash, the cost modifiers, the subphase stack, the pending
+triggers and so on.
+
+copy.deepcopy can't be used for this: the handlers stored by the game
+(resolve_handler, late_calls, subphase callbacks...) are closures over
+the game, its players and cards, and deepcopy would share them with the
+original game. The GameCopier rebuilds these closures so they refer to
+the copied objects instead. The cost modifiers are objects (see
+cards.card.CostModifier), which are copied like any other.
+"""
+
+import copy
+import types
+from collections import defaultdict
+from uuid import UUID
+
+from cards.card import Card, CardType
+
+# types that are never copied
+ATOMIC = (types.NoneType, int, long, float, bool, str, unicode, complex,
+          type, types.ClassType, CardType, types.BuiltinFunctionType,
+          types.ModuleType, types.CodeType, UUID, xrange)
+
+_CARD_SLOTS = frozenset(Card.__slots__)
+
+
+class DroppingEventManager(object):
+
+    """Takes the place of the EventManager of a copied game and drops all events"""
+
+    def post(self, event):
+        pass
+
+
+def _cell_filler():
+    """
+    Yields a new cell, then puts the value sent to the generator into it.
+    Python 2 has no other way to make a cell and fill it later"""
+
+    value = None
+    value = yield (lambda: value).func_closure[0]
+    yield
+
+
+def _card_state(card_class):
+    """Returns the names of the slots a card class adds to Card"""
+
+    slots = set()
+    for cls in card_class.__mro__:
+        slots.update(cls.__dict__.get('__slots__', ()))
+    return tuple(slots - _CARD_SLOTS)
+
+
+def _plain(cls):
+    """Tells if instances of the class can be copied by copying their __dict__"""
+
+    return ('__dict__' in dir(cls)
+            and cls.__reduce_ex__ == object.__reduce_ex__
+            and cls.__reduce__ == object.__reduce__
+            and not any(hasattr(cls, name) for name in
+                        ('__getstate__', '__setstate__', '__deepcopy__', '__slots__')))
+
+
+class GameCopier(object):
+
+    """Copies a game and everything it refers to, see copy_game"""
+
+    # classes whose instances are never copied, and the name of the method
+    # copying the instances of all other classes seen so far
+    shared = set(ATOMIC)
+    copiers = {list: 'copy_list',
+               tuple: 'copy_tuple',
+               dict: 'copy_dict',
+               defaultdict: 'copy_defaultdict',
+               set: 'copy_set',
+               types.FunctionType: 'copy_function',
+               types.MethodType: 'copy_method'}
+
+    def __init__(self):
+        self.memo = {}
+
+    def copy(self, obj):
+        cls = obj.__class__
+        if cls in self.shared:
+            return obj
+        try:
+            return (self.memo)[id(obj)]
+        except KeyError:
+            pass
+
+        try:
+            name = (self.copiers)[cls]
+        except KeyError:
+            name = self.classify(cls)
+            if name is None:
+                return obj
+        return getattr(self, name)(obj)
+
+    def classify(self, cls):
+        """Decides how to copy the instances of a class, returns None if they are shared"""
+
+        if isinstance(cls, CardType):
+            if not _card_state(cls):
+                self.shared.add(cls)
+                return None
+            name = 'copy_card'
+        elif _plain(cls):
+            name = 'copy_object'
+        else:
+            name = 'copy_other'
+        (self.copiers)[cls] = name
+        return name
+
+    def copy_list(self, obj):
+        new = (self.memo)[id(obj)] = []
+        shared = self.shared
+        new.extend(o if o.__class__ in shared else self.copy(o) for o in obj)
+        return new
+
+    def copy_tuple(self, obj):
+        new = tuple(self.copy(o) for o in obj)
+        if all(a is b for (a, b) in zip(obj, new)):
+            new = obj
+        (self.memo)[id(obj)] = new
+        return new
+
+    def copy_dict(self, obj, new=None):
+        if new is None:
+            new = {}
+        (self.memo)[id(obj)] = new
+        shared = self.shared
+        for (k, v) in obj.iteritems():
+            if not k.__class__ in shared:
+                k = self.copy(k)
+            if not v.__class__ in shared:
+                v = self.copy(v)
+            (new)[k] = v
+        return new
+
+    def copy_defaultdict(self, obj):
+        return self.copy_dict(obj, defaultdict(self.copy(obj.default_factory)))
+
+    def copy_set(self, obj):
+        new = (self.memo)[id(obj)] = set()
+        new.update(self.copy(o) for o in obj)
+        return new
+
+    def copy_cell(self, cell):
+        try:
+            return (self.memo)[id(cell)]
+        except KeyError:
+            pass
+        try:
+            value = cell.cell_contents
+        except ValueError:  # the variable is not assigned yet
+            (self.memo)[id(cell)] = cell
+            return cell
+        # the cell is remembered before its value gets copied, because a
+        # function may refer to itself through its closure
+        filler = _cell_filler()
+        new = (self.memo)[id(cell)] = filler.next()
+        filler.send(self.copy(value))
+        return new
+
+    def copy_function(self, f):
+        if not f.func_closure and not f.func_defaults:
+            (self.memo)[id(f)] = f
+            return f
+        closure = f.func_closure and tuple(self.copy_cell(c) for c in f.func_closure)
+        if id(f) in self.memo:  # copied while copying its own closure
+            return (self.memo)[id(f)]
+        new = types.FunctionType(f.func_code, f.func_globals, f.func_name,
+                                 None, closure)
+        (self.memo)[id(f)] = new
+        if f.func_defaults:
+            new.func_defaults = self.copy(f.func_defaults)
+        return new
+
+    def copy_method(self, m):
+        new = (self.memo)[id(m)] = types.MethodType(self.copy(m.im_func),
+                                                     self.copy(m.im_self),
+                                                     m.im_class)
+        return new
+
+    def copy_card(self, card):
+        new = (self.memo)[id(card)] = card.__class__.__new__(card.__class__)
+        for name in _CARD_SLOTS:
+            try:
+                setattr(new, name, getattr(card, name))
+            except AttributeError:
+                pass
+        for name in _card_state(card.__class__):
+            try:
+                setattr(new, name, self.copy(getattr(card, name)))
+            except AttributeError:
+                pass
+        return new
+
+    def copy_object(self, obj):
+        new = (self.memo)[id(obj)] = obj.__class__.__new__(obj.__class__)
+        self.copy_dict(obj.__dict__, new.__dict__)
+        return new
+
+    def copy_other(self, obj):
+        return copy.deepcopy(obj, self.memo)
+
+
+def copy_game(game, ev=None):
+    """
+    Returns a copy of the game that is driven by the given EventManager, or
+    drops all events if ev is None. Nothing done with the copy affects the
+    original game and vice versa."""
+
+    copier = GameCopier()
+    (copier.memo)[id(game.ev)] = ev or DroppingEventManager()
+    return copier.copy(game)
@@ -0,0 +1,201 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Keeps the clients up to date with the parts of the game they see by
+sending them only what changed since their last update.
+
+The server packs each part into a state of plain values (see game.wire
+and PARTS) and remembers the state it sent last to each client, which is
+the state the client has, since the messages arrive in order. update
+returns what takes a client from the state it has to the new one:
+nothing, the changes, or a snapshot of the whole part if the client has
+nothing yet or the changes can't describe the step (e.g. the cards of a
+pile got reordered, a player joined, the room set up another game).
+A Mirror applies these updates on the client, and unpacks only the
+entries that changed.
+
+    cards    (class number, id, coins, potions) for each card, see wire.pack_cards
+             changes: ([ids of removed cards], [cards changed or put on top])
+    deck     key: class number value: number of cards of the class
+             changes: the counts that changed, 0 if no such card is left
+    supply   (uuid high, uuid low, class number, size, coins, potions) for each pile
+             changes: [(index, size, coins, potions), ...]
+    players  the PlayerInfos as tuples, see wire.pack_playerinfo
+             changes: [(index, [(field index, value), ...]), ...]
+"""
+
+from itertools import chain
+
+from framework.locals import *
+from framework.regnancyexception import OutOfSyncException
+from pile import KingdomPile
+import wire
+
+# an update is (SNAPSHOT, state) or (CHANGES, changes)
+SNAPSHOT = 0
+CHANGES = 1
+
+
+def pack_cards(cards):
+    return tuple(tuple(wire.pack_cards([c])) for c in cards)
+
+
+def pack_deck(deck):
+    counts = {}
+    for card in deck:
+        number = (wire.CARD_NUMBERS)[card.__class__]
+        counts[number] = counts.get(number, 0) + 1
+    return counts
+
+
+def pack_players(infos):
+    return [wire.pack_playerinfo(i) for i in infos]
+
+
+def diff_cards(old, new):
+    old_cards = dict((c[1], c) for c in old)
+    new_ids = set(c[1] for c in new)
+    kept = [c[1] for c in old if c[1] in new_ids]
+    if [c[1] for c in new[:len(kept)]] != kept:
+        return None
+    removed = [c[1] for c in old if not c[1] in new_ids]
+    put = [c for c in new if old_cards.get(c[1]) != c]
+    if len(removed) + wire.CARD_SIZE * len(put) >= wire.CARD_SIZE * len(new):
+        return None  # e.g. the board of the next player, the snapshot is smaller
+    return (removed, list(chain(*put)))
+
+
+def diff_deck(old, new):
+    changes = dict((n, count) for (n, count) in new.iteritems() if old.get(n) != count)
+    changes.update((n, 0) for n in old if not n in new)
+    return changes
+
+
+def diff_supply(old, new):
+    if [p[:3] for p in old] != [p[:3] for p in new]:
+        return None
+    return [(i, ) + p[3:] for (i, p) in enumerate(new) if old[i] != p]
+
+
+def diff_players(old, new):
+    if [(p[-2], p[-1]) for p in old] != [(p[-2], p[-1]) for p in new]:
+        return None
+    return [(i, [(f, v) for (f, v) in enumerate(p) if old[i][f] != v])
+            for (i, p) in enumerate(new) if old[i] != p]
+
+
+# key: field of a message value: (pack, diff)
+PARTS = {HAND: (pack_cards, diff_cards),
+         BOARD: (pack_cards, diff_cards),
+         DECK: (pack_deck, diff_deck),
+         BOARDSETUP: (wire.pack_supply, diff_supply),
+         BOARDCOMMON: (wire.pack_supply, diff_supply),
+         PLAYERINFO: (pack_players, diff_players)}
+
+
+def pack(field, value):
+    """Packs a part of the game into its state"""
+
+    return PARTS[field][0](value)
+
+
+def update(field, old, new):
+    """Returns the update from the state old to new, or None if nothing changed"""
+
+    if old == new:
+        return None
+    if old is not None:
+        changes = PARTS[field][1](old, new)
+        if changes is not None:
+            return (CHANGES, changes)
+    if field in (HAND, BOARD):
+        return (SNAPSHOT, list(chain(*new)))
+    return (SNAPSHOT, new)
+
+
+class Mirror(object):
+
+    """The parts of the game as a client has them"""
+
+    def __init__(self):
+        self.parts = {}  # key: field value: the unpacked part
+        self.stale = set()  # the fields whose changes didn't fit, until their next snapshot
+        self.handler = {HAND: self.apply_cards,
+                        BOARD: self.apply_cards,
+                        DECK: self.apply_deck,
+                        BOARDSETUP: self.apply_supply,
+                        BOARDCOMMON: self.apply_supply,
+                        PLAYERINFO: self.apply_players}
+
+    def update(self, field, update):
+        """
+        Applies an update of the server and returns the part as it is now.
+        Raises an OutOfSyncException if the changes don't fit the part,
+        and returns None for its changes until its next snapshot then."""
+
+        (kind, data) = update
+        if kind == SNAPSHOT:
+            self.stale.discard(field)
+            part = (self.handler)[field](None, data)
+        elif field in self.stale:
+            return None
+        else:
+            try:
+                part = (self.handler)[field]((self.parts)[field], data)
+            except (KeyError, IndexError, OutOfSyncException):
+                self.stale.add(field)
+                self.parts.pop(field, None)
+                raise OutOfSyncException("the changes of %s don't fit" % field)
+        (self.parts)[field] = part
+        return part
+
+    def apply_cards(self, old, data):
+        if old is None:
+            return wire.unpack_cards(data)
+        (removed, put) = data
+        removed = set(removed)
+        cards = [c for c in old if not c.id in removed]
+        if len(cards) != len(old) - len(removed):
+            raise OutOfSyncException("removed cards that are not there")
+        positions = dict((c.id, i) for (i, c) in enumerate(cards))
+        for card in wire.unpack_cards(put):
+            if card.id in positions:
+                cards[positions[card.id]] = card
+            else:
+                cards.append(card)
+        return cards
+
+    def apply_deck(self, old, data):
+        deck = dict(old or {})
+        for (number, count) in data.iteritems():
+            cls = (wire.CARD_CLASSES)[number]
+            if count:
+                deck[cls] = count
+            else:
+                deck.pop(cls, None)
+        return deck
+
+    def apply_supply(self, old, data):
+        if old is None:
+            return [self.make_pile(wire.unpack_uuid(high, low), (wire.CARD_CLASSES)[number],
+                                   size, (coins, potions))
+                    for (high, low, number, size, coins, potions) in data]
+        piles = list(old)
+        for (i, size, coins, potions) in data:
+            piles[i] = self.make_pile(piles[i].id, piles[i].card, size, (coins, potions))
+        return piles
+
+    def make_pile(self, id, card, size, cost):
+        pile = KingdomPile(card, size)
+        pile.id = id
+        pile.calc_cost = cost
+        return pile
+
+    def apply_players(self, old, data):
+        if old is None:
+            return [wire.unpack_playerinfo(p) for p in data]
+        for (i, fields) in data:
+            for (f, value) in fields:
+                setattr(old[i], (wire.PLAYERINFO_FIELDS)[f], wire.unpack_value(value))
+        return list(old)
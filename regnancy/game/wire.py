@@ -0,0 +1,200 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Turns the game objects in the messages between server and client into
+tuples of ints and strings, which rencode sends as they are.
+
+Cards are sent as the number of their class (see CARD_CLASSES), their
+id and their cost, so a pile is a flat list of ints, and arrives as a
+list of its cards. The piles of the supply are sent as their id, the
+number of their card class, their size and their cost, and PlayerInfos
+as a tuple of their fields. game.sync builds the parts of the game the
+clients keep (hand, board, supply, ...) from these.
+Any other field of a message (see framework.locals) that holds game
+objects has a schema in FIELDS, a function that packs its value and one
+that unpacks it. pack_value packs the answers, results, InfoTokens, ...
+and tags every tuple it makes with the type it stands for.
+
+    server: client.Send(encode({ACTION: RESPONSE, ANSWER: cards}))
+    client: answer = decode(data)[ANSWER]
+"""
+
+from uuid import UUID
+
+from framework.locals import *
+from framework.regnancyexception import RegnancyException
+from cards.card import Card
+# all cards, so each process numbers the same classes
+from cards import alchemy, base, common, cornucopia, hinterlands, intrigue, \
+    promo, prosperity, seaside
+from askplayerinfo import AskPlayerInfo  # and the other InfoTokens
+from infotoken import InfoToken
+from pile import Pile
+from playerinfo import PlayerInfo
+
+# the tags of the tuples pack_value makes
+T_TUPLE = 0
+T_UNICODE = 1
+T_UUID = 2
+T_CARD = 3
+T_CARD_CLASS = 4
+T_PILE = 5
+T_PLAYERINFO = 6
+T_INFO = 7
+
+# a card is sent as its class, its id and its cost in coins and potions,
+# which are NO_COST if the server didn't set calc_cost
+CARD_SIZE = 4
+NO_COST = -1
+
+PLAYERINFO_FIELDS = ('player_name', 'hand_size', 'drawpile_size',
+                     'discardpile_size', 'actions', 'buys', 'money',
+                     'current', 'score', 'potion', 'id', 'player_id')
+
+_NATIVE = (type(None), bool, int, long, float, str)
+
+# UUIDs are sent as two signed 64 bit ints, which rencode packs into 9 bytes
+# each, and UUID(int=...) is a lot faster than UUID(bytes=...)
+_BITS = 1 << 64
+_SIGN = 1 << 63
+
+
+def _numbered(cls):
+    """Returns the class and all classes derived from it, sorted by their name"""
+
+    found = [cls]
+    for c in found:
+        found.extend(s for s in c.__subclasses__() if not s in found)
+    return sorted(found, key=lambda c: c.__name__)
+
+
+CARD_CLASSES = _numbered(Card)
+CARD_NUMBERS = dict((c, i) for (i, c) in enumerate(CARD_CLASSES))
+INFO_CLASSES = _numbered(InfoToken)
+INFO_NUMBERS = dict((c, i) for (i, c) in enumerate(INFO_CLASSES))
+
+
+def pack_uuid(value):
+    (high, low) = divmod(value.int, _BITS)
+    return (high - _BITS if high >= _SIGN else high, low - _BITS if low >= _SIGN else low)
+
+
+def unpack_uuid(high, low):
+    return UUID(int=(high % _BITS) * _BITS + low % _BITS)
+
+
+def pack_cards(cards):
+    data = []
+    for card in cards:
+        data.extend((CARD_NUMBERS[card.__class__], card.id))
+        data.extend(getattr(card, 'calc_cost', None) or (NO_COST, NO_COST))
+    return data
+
+
+def unpack_cards(data):
+    cards = []
+    for i in xrange(0, len(data), CARD_SIZE):
+        (number, card_id, coins, potions) = data[i:i + CARD_SIZE]
+        cls = CARD_CLASSES[number]
+        card = cls.__new__(cls)
+        card.id = card_id
+        card.virtual = False
+        if coins != NO_COST:
+            card.calc_cost = (coins, potions)
+        cards.append(card)
+    return cards
+
+
+def pack_supply(piles):
+    """Packs the piles of the supply, given as (pile id, card class, size, cost)"""
+
+    return [pack_uuid(pile_id) + (CARD_NUMBERS[card], size) + tuple(cost)
+            for (pile_id, card, size, cost) in piles]
+
+
+def pack_playerinfo(info):
+    return tuple(pack_value(getattr(info, f, None)) for f in PLAYERINFO_FIELDS)
+
+
+def unpack_playerinfo(data):
+    info = PlayerInfo(*[unpack_value(v) for v in data[:-1]])
+    if data[-1] is not None:
+        info.player_id = unpack_value(data[-1])
+    return info
+
+
+def pack_value(value):
+    """Packs anything made of the types rencode knows and the game objects above"""
+
+    kind = type(value)
+    if kind in _NATIVE:
+        return value
+    if kind is list:
+        return [pack_value(v) for v in value]
+    if kind is tuple:
+        return (T_TUPLE, ) + tuple(pack_value(v) for v in value)
+    if kind is dict:
+        return dict((pack_value(k), pack_value(v)) for (k, v) in value.iteritems())
+    if kind is unicode:
+        return (T_UNICODE, value.encode('utf-8'))
+    if kind is UUID:
+        return (T_UUID, ) + pack_uuid(value)
+    if value in CARD_NUMBERS:
+        return (T_CARD_CLASS, CARD_NUMBERS[value])
+    if isinstance(value, Card):
+        return (T_CARD, ) + tuple(pack_cards([value]))
+    if isinstance(value, Pile):
+        return (T_PILE, pack_cards(value))
+    if isinstance(value, PlayerInfo):
+        return (T_PLAYERINFO, ) + pack_playerinfo(value)
+    if isinstance(value, InfoToken):
+        return (T_INFO, INFO_NUMBERS[value.__class__], pack_value(value.__dict__))
+    raise RegnancyException("can't send %r" % value)
+
+
+def _unpack_info(data):
+    cls = INFO_CLASSES[data[1]]
+    info = cls.__new__(cls)
+    info.__dict__.update(unpack_value(data[2]))
+    return info
+
+
+_UNPACK_TAGGED = {T_TUPLE: lambda d: tuple(unpack_value(v) for v in d[1:]),
+                  T_UNICODE: lambda d: d[1].decode('utf-8'),
+                  T_UUID: lambda d: unpack_uuid(d[1], d[2]),
+                  T_CARD: lambda d: unpack_cards(d[1:])[0],
+                  T_CARD_CLASS: lambda d: CARD_CLASSES[d[1]],
+                  T_PILE: lambda d: unpack_cards(d[1]),
+                  T_PLAYERINFO: lambda d: unpack_playerinfo(d[1:]),
+                  T_INFO: _unpack_info}
+
+
+def unpack_value(data):
+    kind = type(data)
+    if kind is tuple:
+        return _UNPACK_TAGGED[data[0]](data)
+    if kind is list:
+        return [unpack_value(v) for v in data]
+    if kind is dict:
+        return dict((unpack_value(k), unpack_value(v)) for (k, v) in data.iteritems())
+    return data
+
+
+# key: field of a message value: (pack, unpack)
+FIELDS = dict((field, (pack_value, unpack_value))
+              for field in (SUBID, INFO, RESULT, BUYFROMPILE, PLAYCARD, ANSWER))
+
+
+def encode(message):
+    """Returns the message with the values of its fields packed, see FIELDS"""
+
+    return dict((k, FIELDS[k][0](v) if k in FIELDS else v)
+                for (k, v) in message.iteritems())
+
+
+def decode(message):
+    """Returns the message with the values of its fields unpacked"""
+
+    return dict((k, FIELDS[k][1](v) if k in FIELDS else v)
+                for (k, v) in message.iteritems())
@@ -3,43 +3,48 @@
 
 from framework.PodSixNet.Server import Server
 from framework.locals import *
-from game import game, global_options
+from game import global_options
+from game.compression import COMPRESSION
 from regnancychannel import RegnancyChannel
+from room import Room
 from time import sleep
 from weakref import WeakKeyDictionary
 import framework.networking as nwp
-from framework.async import PP_QUIT, TimeOutToken, DummyTimeOutPipe, TimeOutPipe,\
-    get_timeout_pipe
-from game.infotoken import InfoToken
+from framework.async import PP_QUIT, get_timeout_pipe
 from framework.misc import get_id
-from threading import Lock
 import logging
-from framework.event import EventManager, CPUSpinnerController, QuitEvent
+from framework.event import EventManager, SelectController, QuitEvent
+
+# seconds between two checks of the pipe to the process that started the server
+PIPE_CHECK_INTERVAL = 0.5
+
+# the name of the room every client joins first
+DEFAULT_ROOM = "default"
 
 class RegnancyServer(Server):
 
+    """
+    Accepts the clients and runs the network loop for all rooms (see
+    room.Room). Every client is in one room at a time, and the messages
+    of a client are handled by the game of its room."""
+
     def __init__(self, *args, **kwargs):
         self.running = True
         self.clients = WeakKeyDictionary()
-        self.masterplayer = None
 
         self.localaddr = (nwp.get_lan_ip(), global_options.port)
         Server.__init__(self, RegnancyChannel, localaddr=self.localaddr)
         self.addr = self.socket.getsockname()
         self.ev = EventManager()
         self.ev.register_listener(self)
-        self.__game = game.Game(self.ev)
-        self.ev.register_listener(self.__game)
-        self.__lock = Lock()
-        
-    @property
-    def game(self):
-        with self.__lock:
-            return self.__game
+
+        self.rooms = {}  # key: room id value: room
+        self.busy_rooms = set()  # rooms that got input since the last tick
+        self.default_room = self.create_room(DEFAULT_ROOM)  # the id of the room
 
     def NextId(self):
         return get_id()
-        
+
     def Connected(self, channel, addr):
         self.add_player(channel)
 
@@ -47,155 +52,116 @@ class RegnancyServer(Server):
         (self.clients)[client] = True
         client.Send({ACTION: INITIAL, MESSAGE: "Welcome to Regnancy-Server at %s:%i" %
                     ((self.localaddr)[0], (self.localaddr)[1]), ID: client.id})
-
-        if len(self.clients) == 1:
-            self.masterplayer = client
-            client.Send({ACTION: SETMASTER, VALUE: True})
-        self.send_playerlist()
+        (self.rooms)[self.default_room].add_player(client)
 
     def delete_player(self, client):
         logging.warning("Deleting Player %s", str(client.addr))
-        self.send_to_all({ACTION: MESSAGE, MESSAGE: "player %s (%s) left the server" %
-                         (client.id, client.player.name)})
         try:
             del (self.clients)[client]
         except:
             pass
-        self.send_playerlist()
-        if self.game.running:
-            raise Exception("Player died while playing")
-
-    def get_client(self, player):
-        assert player, "player is None"
-        return next(c for c in self.clients if c.player.id == player.id)
-
-    def get_playerinfos(self):
-        infos = []
-        for c in self.clients:
-            info = c.player.create_info()
-            info.player_id = c.id
-            infos.append(info)
-        return infos
-
-    def send_playerlist(self):
-        infos = self.get_playerinfos()
-        if self.game.running:
-            if not len([p for p in infos if p.current]) == 1:  # or len(infos) < 2:
-                for i in infos:
-                    print i
-                    raise Exception("no active player???")
-
-        self.send_to_all({ACTION: UPDATE, PLAYERINFO: nwp.pack(infos)})
-
-    def send_to_all(self, data):
-        assert data, "data is None"
-
-        [p.Send(data) for p in self.clients]
-        self.Pump()  #ensure data is send
-
-    def handle_changephaseevent(self, event):
-        assert event.player, "player is None"
-        assert event.phase, "phase is None"
-        self.send_to_all({ACTION: UPDATE, 
-                          PHASE: event.phase, 
-                          CLIENTID: self.get_client(event.player).id})
-
-    def handle_changesubphaseevent(self, event):
-        assert event.player, "player is None"
-        assert event.subphase, "subphase is None"
-
-        if event.info:
-            assert isinstance(event.info, InfoToken)
-        
-        self.send_to_all({ACTION: UPDATE, 
-                          SUBID: nwp.pack(event.card_id),
-                          SUBPHASE: event.subphase, 
-                          INFO: nwp.pack(event.info),
-                          CLIENTID: self.get_client(event.player).id})
-
-    def handle_changehandevent(self, event):
-        assert event.player, "player is None"
-        self.__send_hand(event.player)
-
-    def __send_hand(self, player):
-        for c in player.hand: #TODO: Should be done in game
-            c.calc_cost = self.game.get_cost(c)
-            
-        self.get_client(player).Send({ACTION: UPDATE, 
-                                      HAND: nwp.pack(player.hand),
-                                      DECK: nwp.pack(player.deck)})
-
-    def handle_changeboardevent(self, event):
-        assert event.player, "player is None"
-        for c in event.player.board: #TODO: Should be done in game
-            c.calc_cost = self.game.get_cost(c)
-
-        self.send_to_all({ACTION: UPDATE, 
-                          BOARD: nwp.pack(event.player.board)})
-
-    def handle_messageevent(self, event):
-        assert event.message, "message is None"
-        #logging.debug(event.message)
-        m = {ACTION: MESSAGE, MESSAGE: event.message}
-        if event.reciever:
-            self.get_client(event.reciever).Send(m)
+        if client.room:
+            self.leave_room(client)
+
+    def create_room(self, name):
+        """Creates a room and returns its id"""
+
+        room = Room(self, get_id(), name)
+        (self.rooms)[room.id] = room
+        return room.id
+
+    def join_room(self, client, room_id):
+        """Moves the client to another room, if it is not playing"""
+
+        room = self.rooms.get(room_id)
+        if room is None:
+            client.Send({ACTION: MESSAGE, MESSAGE: "There is no such room"})
+        elif room.game.running:
+            client.Send({ACTION: MESSAGE, MESSAGE: "Game already running"})
+        elif client.room and client.room.game.running:
+            client.Send({ACTION: MESSAGE, MESSAGE: "You are playing in another room"})
+        elif not room is client.room:
+            if client.room:
+                self.leave_room(client)
+            room.add_player(client)
+
+    def leave_room(self, client):
+        room = client.room
+        room.call('delete_player', client)
+        if not room.clients and room.id != self.default_room:
+            self.rooms.pop(room.id, None)
+            self.busy_rooms.discard(room)
+            room.actionlog.close()
+
+    def send_roomlist(self, client):
+        client.Send({ACTION: ROOMS,
+                     ROOMS: [room.create_info() for room in self.rooms.itervalues()]})
+
+    def handle_request(self, client, data):
+        if data[VALUE] == ROOMS:
+            self.send_roomlist(client)
+        elif data[VALUE] == CREATEROOM:
+            self.join_room(client, self.create_room(data[INFO]))
+        elif data[VALUE] == JOINROOM:
+            self.join_room(client, data[ROOM])
         else:
-            self.send_to_all(m)
-
-    def handle_playerinfoevent(self, event):
-        self.send_to_all({ACTION: UPDATE, PLAYERINFO: nwp.pack(event.playerinfos)})
-
-    def handle_gameendevent(self, event):
-        self.send_to_all({ACTION: END, RESULT: nwp.pack(event.result)})
-        self.running = False
-        
-    def handle_changepilesevent(self, event):
-        self.__send_piles()
+            self.route(client, data, 'handle_request')
 
-    def __send_piles(self):
-        self.send_to_all({ACTION: UPDATE, BOARDSETUP: nwp.pack([(pile.id,
-                         pile.card, len(pile), self.game.get_cost(pile))
-                         for pile in self.game.kingdompiles])})
+    def handle_response(self, client, data):
+        self.route(client, data, 'handle_response')
 
-        self.send_to_all({ACTION: UPDATE, BOARDCOMMON: nwp.pack([(pile.id,
-                         pile.card, len(pile), self.game.get_cost(pile))
-                         for pile in self.game.commonpiles])})
+    def change_name(self, client, data):
+        self.route(client, data, 'change_name')
 
-    def start_game(self, data):
-        self.game_running = True
+    def route(self, client, data, handler):
+        """Lets the room the data is meant for handle it, see get_room"""
 
-        deck_name = data[INFO]
-        self.game.setup(deck_name, [c.player for c in self.clients])
+        room = self.get_room(client, data)
+        if room:
+            room.call(handler, client, data)
 
-        self.send_playerlist()
-        self.__send_piles()
+    def get_room(self, client, data):
+        """
+        Returns the room a message of the client is meant for, which is the
+        room given in the message or else the room of the client. Returns
+        None if the client is not in that room."""
 
-        for client in self.clients:
-            self.__send_hand(client.player)
-
-        self.send_to_all({ACTION: START, MESSAGE: "game started"})
+        room = self.rooms.get(data.get(ROOM)) if ROOM in data else client.room
+        if room is None or not room is client.room:
+            return None
+        self.busy_rooms.add(room)
+        return room
 
     def handle_quitevent(self, event):
+        for line in COMPRESSION.report():
+            logging.info("sent %s", line)
+        for room in self.rooms.itervalues():
+            room.actionlog.close()
         sleep(0.0001)
         self.close()
         self.pipe.send([PP_QUIT])
 
-    def handle_tickevent(self, event):
-        if not self.pipe.check():
+    def check_pipe(self):
+        if self.pipe.poll_alive():
+            self.controller.call_later(PIPE_CHECK_INTERVAL, self.check_pipe)
+            # also gives every game a chance to go on, just in case
+            self.busy_rooms.update(r for r in self.rooms.itervalues() if r.game.running)
+        else:
             self.running = False
             QuitEvent().post(self.ev)
-            
-        if self.game.running:
-            self.game.update()
-        self.Pump()
-        sleep(0.01)
-    
+
+    def handle_tickevent(self, event):
+        (busy, self.busy_rooms) = (self.busy_rooms, set())
+        for room in busy:
+            room.call('update_game')
+        self.flush()
+
     def notify(self, event):
         pass
-        
+
     def Launch(self, pipe=None):
         self.pipe = get_timeout_pipe(pipe)
-        spinner = CPUSpinnerController()
-        self.ev.register_listener(spinner)
-        spinner.run(self.ev)
-
+        self.controller = SelectController(self._map)
+        self.ev.register_listener(self.controller)
+        self.controller.call_later(PIPE_CHECK_INTERVAL, self.check_pipe)
+        self.controller.run(self.ev)
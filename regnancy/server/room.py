@@ -0,0 +1,300 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from framework.locals import *
+from framework.regnancyexception import NotEnoughMoneyException, \
+    PileIsEmptyException
+from game import game, sync, wire
+from game.actionlog import ActionLog
+from game.player import Player
+from game.infotoken import InfoToken
+from time import strftime
+from weakref import WeakKeyDictionary
+import logging
+import os
+from framework.configprovider import ConfigProvider
+from framework.event import EventManager
+
+# the most updates of the game in a row, see update_game
+MAX_UPDATES = 1000
+
+
+class Room(object):
+
+    """
+    A table of the server. Each room has its own game, the EventManager
+    the game posts its events to, and the clients playing in it. The
+    server shares its socket and its loop with all rooms.
+
+    A client is anything with an id, a name, a player, a room and a method
+    Send, e.g. a RegnancyChannel, or a shard.RemoteClient in a worker
+    process. What the room sends during an update is queued, and the
+    server sends it to each client at once when the update is done."""
+
+    def __init__(self, server, id, name):
+        self.server = server
+        self.id = id
+        self.name = name
+        self.clients = WeakKeyDictionary()
+        self.synced = WeakKeyDictionary()  # key: client value: {field: state it got last}, see send_update
+        self.masterplayer = None
+
+        self.ev = EventManager()
+        self.ev.register_listener(self)
+        self.game = game.Game(self.ev)
+        self.ev.register_listener(self.game)
+        self.actionlog = ActionLog(self.game)
+
+    def create_info(self):
+        """Returns what the clients get to know about the room: id, name, number of players and if it is playing"""
+
+        return (self.id, self.name, len(self.clients), self.game.running)
+
+    def add_player(self, client):
+        client.player = Player(client.name, self.game, int(client.id))
+        client.room = self
+        (self.clients)[client] = True
+        (self.synced)[client] = {}
+        client.Send({ACTION: ROOM, ROOM: self.id, INFO: self.name})
+
+        if len(self.clients) == 1:
+            self.masterplayer = client
+            client.Send({ACTION: SETMASTER, VALUE: True})
+        self.send_playerlist()
+
+    def delete_player(self, client):
+        try:
+            del (self.clients)[client]
+        except:
+            pass
+        client.room = None
+        self.send_to_all({ACTION: MESSAGE, MESSAGE: "player %s (%s) left the room" %
+                         (client.id, client.player.name)})
+        if self.game.running:
+            self.end_game("The game was ended, as %s left" % client.player.name)
+        self.send_playerlist()
+
+    def change_name(self, client, data):
+        client.name = client.player.name = data[VALUE]
+        self.send_playerlist()
+
+    def handle_request(self, client, data):
+        if data[VALUE] == GAMESTART:
+            if self.game.running:
+                client.Send({ACTION: MESSAGE, MESSAGE: "Game already running"})
+                return
+            if len(self.clients) >= 2 or 1: # or game.global_options.debug_mode:
+                self.start_game(data)
+            else:
+                client.Send({ACTION: MESSAGE, MESSAGE: "Waiting for a second player"})
+        elif data[VALUE] == ENDPHASE:
+            logging.debug("%s wants to end phase", client.player.name)
+            if client.player == self.game.active_player and (not data[INFO] or data[INFO] == self.game.phase):
+                self.actionlog.endphase(client.player)
+                self.game.endphase(client.player)
+        elif data[VALUE] == RESYNC:
+            self.resync(client)
+
+    def handle_response(self, client, data):
+        data = wire.decode(data)
+        if BUYFROMPILE in data:
+            pile_id = data[BUYFROMPILE]
+            self.actionlog.buy(client.player, pile_id)
+            try:
+                self.game.buy_card(client.player, pile_id)
+            except (NotEnoughMoneyException, PileIsEmptyException):
+                pass
+
+        if PLAYCARD in data:
+            card_id = data[PLAYCARD]
+            self.actionlog.play(client.player, card_id)
+            self.game.play_card(client.player, card_id)
+
+        if ANSWER in data:
+            result = data[ANSWER]
+            self.actionlog.answer(client.player, result)
+            self.game.answered(client.player, result, data[SUBID])
+
+    def get_client(self, player):
+        assert player, "player is None"
+        return next(c for c in self.clients if c.player.id == player.id)
+
+    def get_playerinfos(self):
+        infos = []
+        for c in self.clients:
+            info = c.player.create_info()
+            info.player_id = c.id
+            infos.append(info)
+        return infos
+
+    def send_playerlist(self):
+        infos = self.get_playerinfos()
+        if self.game.running and len([p for p in infos if p.current]) != 1:
+            logging.error("room %s has no single active player: %s", self.id,
+                          [(p.player_name, p.current) for p in infos])
+            self.end_game()
+
+        self.send_update(self.clients, {PLAYERINFO: infos})
+
+    def send_to_all(self, data):
+        assert data, "data is None"
+        data = wire.encode(data)
+        for p in self.clients:
+            p.Send(data)
+
+    def send_update(self, clients, parts):
+        """
+        Sends the parts of the game (key: field value: part) to the clients,
+        each as the update from the state the client got last (see
+        game.sync), and nothing if none of them changed. Clients that got
+        the same states last get the same message."""
+
+        states = dict((field, sync.pack(field, part)) for (field, part) in parts.iteritems())
+        # key: ids of the states clients got last value: (message, these states,
+        # which are kept so no other state can get one of these ids meanwhile)
+        messages = {}
+        for client in clients:
+            synced = (self.synced)[client]
+            key = tuple(id(synced.get(field)) for field in states)
+            if not key in messages:
+                message = {ACTION: UPDATE}
+                for (field, state) in states.iteritems():
+                    update = sync.update(field, synced.get(field), state)
+                    if update is not None:
+                        message[field] = update
+                messages[key] = (message, [synced.get(field) for field in states])
+            synced.update(states)
+            message = messages[key][0]
+            if len(message) > 1:
+                client.Send(message)
+
+    def resync(self, client):
+        """Sends the client all it sees of the game again"""
+
+        (self.synced)[client] = {}
+        self.send_playerlist()
+        if self.game.running:
+            self.__send_piles()
+            self.__send_hand(client.player)
+            self.__send_board(self.game.active_player)
+
+    def handle_changephaseevent(self, event):
+        assert event.player, "player is None"
+        assert event.phase, "phase is None"
+        self.send_to_all({ACTION: UPDATE,
+                          PHASE: event.phase,
+                          CLIENTID: self.get_client(event.player).id})
+
+    def handle_changesubphaseevent(self, event):
+        assert event.player, "player is None"
+        assert event.subphase, "subphase is None"
+
+        if event.info:
+            assert isinstance(event.info, InfoToken)
+
+        self.send_to_all({ACTION: UPDATE,
+                          SUBID: event.card_id,
+                          SUBPHASE: event.subphase,
+                          INFO: event.info,
+                          CLIENTID: self.get_client(event.player).id})
+
+    def handle_changehandevent(self, event):
+        assert event.player, "player is None"
+        self.__send_hand(event.player)
+
+    def __send_hand(self, player):
+        for c in player.hand: #TODO: Should be done in game
+            c.calc_cost = self.game.get_cost(c)
+
+        self.send_update([self.get_client(player)], {HAND: player.hand, DECK: player.deck})
+
+    def handle_changeboardevent(self, event):
+        assert event.player, "player is None"
+        self.__send_board(event.player)
+
+    def __send_board(self, player):
+        for c in player.board: #TODO: Should be done in game
+            c.calc_cost = self.game.get_cost(c)
+
+        self.send_update(self.clients, {BOARD: player.board})
+
+    def handle_messageevent(self, event):
+        assert event.message, "message is None"
+        #logging.debug(event.message)
+        m = {ACTION: MESSAGE, MESSAGE: event.message}
+        if event.reciever:
+            self.get_client(event.reciever).Send(m)
+        else:
+            self.send_to_all(m)
+
+    def handle_playerinfoevent(self, event):
+        self.send_update(self.clients, {PLAYERINFO: event.playerinfos})
+
+    def handle_gameendevent(self, event):
+        self.send_to_all({ACTION: END, RESULT: event.result})
+
+    def handle_changepilesevent(self, event):
+        self.__send_piles()
+
+    def __send_piles(self):
+        self.send_update(self.clients, {BOARDSETUP: [(pile.id,
+                         pile.card, len(pile), self.game.get_cost(pile))
+                         for pile in self.game.kingdompiles],
+                         BOARDCOMMON: [(pile.id,
+                         pile.card, len(pile), self.game.get_cost(pile))
+                         for pile in self.game.commonpiles]})
+
+    def start_game(self, data):
+        deck_name = data[INFO]
+        self.actionlog.close()
+        self.game.setup(deck_name, [c.player for c in self.clients])
+        self.actionlog = ActionLog(self.game, self.__open_actionlog())
+        self.actionlog.start(deck_name)
+
+        self.send_playerlist()
+        self.__send_piles()
+
+        for client in self.clients:
+            self.__send_hand(client.player)
+
+        self.send_to_all({ACTION: START, MESSAGE: "game started"})
+
+    def __open_actionlog(self):
+        """Opens the file the input of the players gets recorded to"""
+
+        config = ConfigProvider()
+        config.get_files('actionlogs')
+        name = '%s-%s-%s.rlog' % (strftime('%Y%m%d-%H%M%S'), self.id, self.game.seed)
+        return open(os.path.join(config.config_dir, 'actionlogs', name), 'ab')
+
+    def call(self, handler, *args):
+        """
+        Calls the method handler of the room. If it raises, only the game of
+        this room ends, and the server goes on with its other rooms."""
+
+        try:
+            getattr(self, handler)(*args)
+        except Exception:
+            logging.exception("room %s failed in %s", self.id, handler)
+            self.end_game()
+
+    def end_game(self, message="The game failed and was ended"):
+        """Ends the game early, e.g. after it failed, the clients can start another one"""
+
+        if not self.game.running:
+            self.send_to_all({ACTION: MESSAGE, MESSAGE: "The server failed to handle that"})
+            return
+        self.game.running = False
+        self.actionlog.close()
+        self.send_to_all({ACTION: MESSAGE, MESSAGE: message})
+        self.send_to_all({ACTION: END, RESULT: []})
+
+    def update_game(self):
+        """Updates the game until it waits for the players"""
+
+        for _ in xrange(MAX_UPDATES):
+            if not (self.game.running and self.actionlog.update()):
+                break
+
+    def notify(self, event):
+        pass
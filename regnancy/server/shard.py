@@ -0,0 +1,413 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Runs the rooms of a server in several worker processes.
+
+The ShardedServer is the front end: it accepts all clients, keeps track
+of the room each client is in, and sends the messages of a client to the
+worker that hosts its room. Each worker (see RoomWorker) runs the usual
+rooms (see room.Room) for RemoteClients, which send everything back to
+the front end in one message per round.
+
+A new room goes to the worker with the least load, that is the share of
+its time it spent on updating its games plus a little for each room it
+hosts. If a worker dies, the clients of its rooms are told so and go to
+the default room, and no room goes to that worker any more.
+
+The front end and the workers talk over the pipes of
+framework.async.ProcessProxy:
+
+    front end -> worker
+        (W_CREATE, room id, name)
+        (W_JOIN, client id, name, room id)
+        (W_LEAVE, client id)
+        (W_DROP, room id)  once the front end knows that nobody is in it
+        (W_DATA, client id, handler, data)  handler: a method of Room
+        [PP_QUIT]
+
+    worker -> front end
+        (W_ROUND, [(client id, data), ...], [room info, ...], rooms, busy)
+"""
+
+from framework.async import ProcessProxy, PP_QUIT, get_timeout_pipe
+from framework.event import SelectController
+from framework.locals import *
+from framework.misc import get_id
+from regnancyserver import RegnancyServer, PIPE_CHECK_INTERVAL, DEFAULT_ROOM
+from room import Room
+from time import time
+from weakref import WeakValueDictionary
+import logging
+import platform
+
+W_CREATE = 'create'
+W_JOIN = 'join'
+W_LEAVE = 'leave'
+W_DROP = 'drop'
+W_DATA = 'data'
+W_ROUND = 'round'
+
+# seconds a worker waits for input before it lets its games go on anyway
+WORKER_HEARTBEAT = 0.5
+
+# how much a room adds to the load of a worker, compared to a worker that
+# is busy all the time
+ROOM_LOAD = 0.01
+
+# weight of the newest measurement in the busy share of a worker
+BUSY_SMOOTHING = 0.2
+
+# seconds between two looks at the pipes of the workers where they can't
+# be waited for (on Windows, where the workers are threads)
+PIPE_POLL_INTERVAL = 0.01
+
+
+class RemoteClient(object):
+
+    """Takes the place of a RegnancyChannel in a worker"""
+
+    def __init__(self, worker, id, name):
+        self.worker = worker
+        self.id = id
+        self.name = name
+        self.player = None
+        self.room = None
+
+    def Send(self, data):
+        self.worker.outbox.append((self.id, data))
+
+
+class RoomWorker(object):
+
+    """Hosts rooms in a worker process, see run_worker"""
+
+    def __init__(self, pipe):
+        self.pipe = pipe
+        self.rooms = {}  # key: room id value: room
+        self.clients = {}  # key: client id value: RemoteClient
+        self.outbox = []
+        self.changed_rooms = set()
+        self.running = True
+        self.handler = {W_CREATE: self.create_room,
+                        W_JOIN: self.join,
+                        W_LEAVE: self.leave,
+                        W_DROP: self.drop_room,
+                        W_DATA: self.handle_data}
+
+    def create_room(self, room_id, name):
+        (self.rooms)[room_id] = Room(self, room_id, name)
+
+    def join(self, client_id, name, room_id):
+        client = (self.clients)[client_id] = RemoteClient(self, client_id, name)
+        room = (self.rooms)[room_id]
+        room.add_player(client)
+        self.changed_rooms.add(room)
+
+    def leave(self, client_id):
+        client = self.clients.pop(client_id, None)
+        if client is None or client.room is None:
+            return
+        room = client.room
+        self.changed_rooms.add(room)
+        room.call('delete_player', client)
+
+    def drop_room(self, room_id):
+        room = self.rooms.get(room_id)
+        if room and not room.clients:
+            del (self.rooms)[room_id]
+            room.actionlog.close()
+
+    def handle_data(self, client_id, handler, data):
+        client = self.clients.get(client_id)
+        if client and client.room:
+            self.changed_rooms.add(client.room)
+            client.room.call(handler, client, data)
+
+    def receive(self, message):
+        if message == [PP_QUIT]:
+            self.running = False
+        else:
+            (self.handler)[message[0]](*message[1:])
+
+    def run(self):
+        busy = 0.0
+        while self.running:
+            waiting = time()
+            if self.pipe.poll(WORKER_HEARTBEAT):
+                while self.running and self.pipe.poll():
+                    try:
+                        self.receive(self.pipe.recv())
+                    except EOFError:
+                        self.running = False
+                    except Exception:
+                        logging.exception("worker failed to handle a message")
+                rooms = self.changed_rooms
+            else:
+                rooms = [r for r in self.rooms.itervalues() if r.game.running]
+            start = time()
+            for room in list(rooms):
+                room.call('update_game')
+                self.changed_rooms.add(room)
+            busy = (time() - start) / max(time() - waiting, 1e-6)
+            self.send_round(busy)
+        for room in self.rooms.itervalues():
+            room.actionlog.close()
+
+    def send_round(self, busy):
+        if not (self.outbox or self.changed_rooms):
+            return
+        infos = [room.create_info() for room in self.changed_rooms]
+        self.pipe.send((W_ROUND, self.outbox, infos, len(self.rooms), busy))
+        self.outbox = []
+        self.changed_rooms = set()
+
+
+def run_worker(pipe):
+    RoomWorker(pipe).run()
+
+
+class Worker(object):
+
+    """The front end's handle to a worker process"""
+
+    def __init__(self, index):
+        self.index = index
+        self.process = ProcessProxy(run_worker)
+        self.process.start()
+        self.pipe = self.process.pipe
+        self.rooms = 0
+        self.busy = 0.0
+
+    @property
+    def load(self):
+        return self.busy + ROOM_LOAD * self.rooms
+
+    def send(self, *message):
+        self.pipe.send(message)
+
+    def fileno(self):
+        return self.pipe.fileno()
+
+
+class _WorkerDispatcher(object):
+
+    """Lets the asyncore loop of the front end wait for messages of a worker"""
+
+    accepting = False
+
+    def __init__(self, server, worker):
+        self.server = server
+        self.worker = worker
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return False
+
+    def handle_read_event(self):
+        self.server.receive(self.worker)
+
+    def handle_expt_event(self):
+        pass
+
+    def handle_close(self):
+        self.server.worker_died(self.worker)
+
+    def handle_error(self):
+        logging.exception("front end failed to handle worker %s", self.worker.index)
+
+
+class ShardedServer(RegnancyServer):
+
+    """
+    A RegnancyServer whose rooms run in several worker processes. It
+    knows which room each client is in and where each room runs, but no
+    games."""
+
+    def __init__(self, workers=2, *args, **kwargs):
+        self.workers = [Worker(i) for i in xrange(workers)]  # the ones alive
+        self.started_workers = workers
+        self.room_workers = {}  # key: room id value: worker
+        self.room_infos = {}  # key: room id value: room info, see Room.create_info
+        self.client_index = WeakValueDictionary()  # key: client id value: client
+        RegnancyServer.__init__(self, *args, **kwargs)
+        for worker in self.workers:
+            self.watch(worker)
+
+    def watch(self, worker):
+        """Lets the loop wait for the messages of the worker, where it can"""
+
+        if platform.system() != "Windows":
+            (self._map)[worker.fileno()] = _WorkerDispatcher(self, worker)
+
+    def start_worker(self):
+        worker = Worker(self.started_workers)
+        self.started_workers += 1
+        self.workers.append(worker)
+        self.watch(worker)
+
+    def tell(self, worker, *message):
+        """Sends the message to the worker. Returns False if the worker is dead"""
+
+        if not worker in self.workers:
+            return False
+        try:
+            worker.send(*message)
+        except (IOError, EOFError):
+            self.worker_died(worker)
+            return False
+        return True
+
+    def add_player(self, client):
+        (self.client_index)[client.id] = client
+        client.room_id = None
+        (self.clients)[client] = True
+        client.Send({ACTION: INITIAL, MESSAGE: "Welcome to Regnancy-Server at %s:%i" %
+                    ((self.localaddr)[0], (self.localaddr)[1]), ID: client.id})
+        self.enter_room(client, self.default_room)
+
+    def create_room(self, name):
+        room_id = get_id()
+        worker = min(self.workers, key=lambda w: w.load)
+        while not self.tell(worker, W_CREATE, room_id, name):
+            worker = min(self.workers, key=lambda w: w.load)
+        worker.rooms += 1
+        (self.room_workers)[room_id] = worker
+        (self.room_infos)[room_id] = (room_id, name, 0, False)
+        return room_id
+
+    def enter_room(self, client, room_id):
+        client.room_id = room_id
+        self.tell((self.room_workers)[room_id], W_JOIN, client.id, client.name, room_id)
+
+    def join_room(self, client, room_id):
+        info = self.room_infos.get(room_id)
+        current = self.room_infos.get(client.room_id)
+        if info is None:
+            client.Send({ACTION: MESSAGE, MESSAGE: "There is no such room"})
+        elif info[3]:
+            client.Send({ACTION: MESSAGE, MESSAGE: "Game already running"})
+        elif current and current[3]:
+            client.Send({ACTION: MESSAGE, MESSAGE: "You are playing in another room"})
+        elif room_id != client.room_id:
+            if client.room_id is not None:
+                self.leave_room(client)
+            self.enter_room(client, room_id)
+
+    def leave_room(self, client):
+        room_id = client.room_id
+        client.room_id = None
+        worker = self.room_workers.get(room_id)
+        if worker:
+            self.tell(worker, W_LEAVE, client.id)
+            self.drop_room(room_id)
+
+    def delete_player(self, client):
+        logging.warning("Deleting Player %s", str(client.addr))
+        try:
+            del (self.clients)[client]
+        except:
+            pass
+        if client.room_id is not None:
+            self.leave_room(client)
+
+    def send_roomlist(self, client):
+        client.Send({ACTION: ROOMS, ROOMS: self.room_infos.values()})
+
+    def route(self, client, data, handler):
+        room_id = data.get(ROOM, client.room_id)
+        worker = self.room_workers.get(room_id)
+        if worker and room_id == client.room_id:
+            if handler == 'change_name':
+                client.name = data[VALUE]
+            self.tell(worker, W_DATA, client.id, handler, data)
+
+    def receive(self, worker):
+        """Handles everything the worker has sent"""
+
+        while worker in self.workers:
+            try:
+                if not worker.pipe.poll():
+                    return
+                (_, outbox, infos, rooms, busy) = worker.pipe.recv()
+            except (IOError, EOFError):
+                self.worker_died(worker)
+                return
+            for (client_id, data) in outbox:
+                client = self.client_index.get(client_id)
+                if client:
+                    client.Send(data)
+            for info in infos:
+                if info[0] in self.room_infos:
+                    (self.room_infos)[info[0]] = info
+                    self.drop_room(info[0])
+            worker.rooms = rooms
+            worker.busy += BUSY_SMOOTHING * (busy - worker.busy)
+
+    def drop_room(self, room_id):
+        """Drops the room if it is empty, as RegnancyServer.leave_room does"""
+
+        if room_id == self.default_room or any(c.room_id == room_id for c in self.clients):
+            return
+        self.tell((self.room_workers)[room_id], W_DROP, room_id)
+        self.forget_room(room_id)
+
+    def forget_room(self, room_id):
+        self.room_infos.pop(room_id, None)
+        self.room_workers.pop(room_id, None)
+
+    def worker_died(self, worker):
+        """
+        Forgets the worker and its rooms, and sends the clients of these
+        rooms to the default room. Starts another worker if it was the last"""
+
+        if not worker in self.workers:
+            return
+        logging.error("worker %s died", worker.index)
+        self.workers.remove(worker)
+        self._map.pop(worker.fileno(), None)
+        worker.pipe.close()
+        worker.process.process.join(0)
+        rooms = dict((r, (self.room_infos)[r]) for (r, w) in self.room_workers.items() if w is worker)
+        for room_id in rooms:
+            self.forget_room(room_id)
+        if not self.workers:
+            self.start_worker()
+        if self.default_room in rooms:
+            self.default_room = self.create_room(DEFAULT_ROOM)
+
+        for client in self.clients.keys():
+            info = rooms.get(client.room_id)
+            if info is None:
+                continue
+            if info[3]:
+                client.Send({ACTION: MESSAGE, MESSAGE: "The game failed and was ended"})
+                client.Send({ACTION: END, RESULT: []})
+            else:
+                client.Send({ACTION: MESSAGE, MESSAGE: "The room %s was closed" % info[1]})
+            client.room_id = None
+            self.enter_room(client, self.default_room)
+
+    def poll_workers(self):
+        for worker in list(self.workers):
+            self.receive(worker)
+        self.controller.call_later(PIPE_POLL_INTERVAL, self.poll_workers)
+
+    def handle_tickevent(self, event):
+        self.flush()
+
+    def handle_quitevent(self, event):
+        for worker in self.workers:
+            worker.process.join()
+        RegnancyServer.handle_quitevent(self, event)
+
+    def Launch(self, pipe=None):
+        self.pipe = get_timeout_pipe(pipe)
+        self.controller = SelectController(self._map)
+        self.ev.register_listener(self.controller)
+        self.controller.call_later(PIPE_CHECK_INTERVAL, self.check_pipe)
+        if platform.system() == "Windows":
+            self.controller.call_later(PIPE_POLL_INTERVAL, self.poll_workers)
+        self.controller.run(self.ev)
@@ -0,0 +1,39 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import argparse
+import logging
+import random
+from game import rules
+from game.simulation import Strategy, BigMoneyStrategy
+from game.batchsimulation import BatchSimulation, BatchStatistics
+
+strategies = {'bigmoney': BigMoneyStrategy,
+              'default': Strategy}
+
+parser = argparse.ArgumentParser(description='Simulate Regnancy games between bots.')
+parser.add_argument('strategies', nargs='+', choices=sorted(strategies), help='the strategy of each player')
+parser.add_argument('-n', '--games', action='store', type=int, default=100, help='number of games to play')
+parser.add_argument('-k', '--kingdom', action='store', default='random',
+                    help="name of a saved deck, or 'random' for a new random kingdom each game")
+parser.add_argument('-w', '--workers', action='store', type=int, help='number of worker processes (default: all cores)')
+parser.add_argument('-t', '--turns', action='store', type=int, help='stop games after this many turns')
+parser.add_argument('-s', '--seed', action='store', type=int, help='seed to play the same games again')
+
+args = vars(parser.parse_args())
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+
+    rng = random.Random(args['seed'])
+
+    def jobs():
+        for _ in xrange(args['games']):
+            kingdom = [c.name for c in rules.get_setup(args['kingdom'], rng)]
+            yield (kingdom, [strategies[s]() for s in args['strategies']])
+
+    kwargs = {'turn_limit': args['turns']} if args['turns'] else {}
+    stats = BatchStatistics()
+    for record in BatchSimulation(args['workers']).run(jobs(), args['seed'], **kwargs):
+        stats.add(record)
+    print stats
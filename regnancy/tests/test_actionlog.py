@@ -0,0 +1,75 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from game import rules
+from game.actionlog import ActionLog, A_ANSWER, read_actions, read_answer
+from game.game import Game
+from game.player import Player
+from game.snapshot import DroppingEventManager
+
+
+class Stream(object):
+
+    def __init__(self):
+        self.data = ''
+        self.flushes = 0
+        self.closed = False
+
+    def write(self, data):
+        self.data += data
+
+    def flush(self):
+        self.flushes += 1
+
+    def close(self):
+        self.closed = True
+
+
+class ActionLogTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.game = Game(DroppingEventManager())
+        self.players = [Player(name, self.game, i + 1) for (i, name) in enumerate(('a', 'b'))]
+        self.game.setup(rules.randomsetup(), self.players, 7)
+
+    def roundtrip(self, answer):
+        log = ActionLog(self.game)
+        log.answer((self.players)[0], answer)
+        ((action, player, payload),) = read_actions(log.getvalue())
+        self.assertEqual((action, player), (A_ANSWER, 0))
+        return read_answer(self.game, payload)
+
+    def test_answers(self):
+        hand = [c.id for c in (self.players)[0].hand]
+        pile = (self.game.allpiles)[3].id
+        for answer in (None, 'Yes', pile, True, False, 0, 3, -2, 10 ** 12, hand, [], (1, 'x')):
+            self.assertEqual(self.roundtrip(answer), answer)
+
+    def test_number_like_a_card_id(self):
+        # an int or bool answer stays one, even if a card has that id
+        card_id = (self.players)[0].hand[0].id
+        self.assertIsNot(self.game.card_number(card_id), None)
+        answer = self.roundtrip(card_id)
+        self.assertEqual((answer, type(answer)), (card_id, int))
+        self.assertIs(self.roundtrip(True), True)
+
+    def test_flushed_when_a_turn_begins(self):
+        stream = Stream()
+        log = ActionLog(self.game, stream)
+        log.start('random')
+        turn = self.game.turn
+        while self.game.turn == turn:
+            self.assertEqual(stream.flushes, 0)
+            log.endphase(self.game.active_player)
+            self.game.endphase(self.game.active_player)
+            log.update()
+        self.assertEqual(stream.flushes, 1)
+        self.game.running = False
+        log.update()
+        self.assertTrue(stream.closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import logging
+import socket
+import unittest
+import zlib
+
+from framework.locals import *
+from framework.PodSixNet.Channel import Channel, COMPRESSED, FRAME, MAX_FRAME
+from framework.PodSixNet.compress import Compression, MAX_DICTIONARY, SYNC_TAIL
+from framework.PodSixNet.rencode import dumps
+from game import compression
+from game.compression import COMPRESSION, THRESHOLD
+from game.gamestates import P_ACTION, P_BUY
+
+
+def bomb(compression, size):
+    """A message the preset dictionary inflates to size bytes of zeros"""
+
+    compressor = compression._compressor.copy()
+    data = ''.join(compressor.compress('\0' * (1 << 20)) for _ in xrange(size >> 20))
+    return (data + compressor.flush(zlib.Z_SYNC_FLUSH))[:-len(SYNC_TAIL)]
+
+
+class CompressionTestCase(unittest.TestCase):
+
+    def test_dictionary(self):
+        dictionary = compression.dictionary()
+        self.assertTrue(len(dictionary) <= MAX_DICTIONARY)
+        self.assertEqual(dictionary, compression.dictionary())
+
+    def test_round_trip(self):
+        for message in ({ACTION: MESSAGE, MESSAGE: "Player 1 bought Gold", 'PID': 12},
+                        {ACTION: MESSAGE, MESSAGE: 'x\xe9' * 5000},
+                        {ACTION: UPDATE, PHASE: P_BUY, CLIENTID: '3', 'PID': 99}):
+            data = dumps(message)
+            (sent, compressed) = COMPRESSION.compress(message[ACTION], data)
+            self.assertTrue(compressed)
+            self.assertTrue(len(sent) < len(data))
+            self.assertEqual(COMPRESSION.decompress(sent), data)
+
+    def test_dictionary_pays_off(self):
+        data = dumps({ACTION: UPDATE, PHASE: P_ACTION, CLIENTID: '2', 'PID': 7})
+        without = Compression('', threshold=0)
+        self.assertTrue(len(COMPRESSION.compress(UPDATE, data)[0]) < len(without.compress(UPDATE, data)[0]))
+
+    def test_thresholds(self):
+        small = dumps({ACTION: MESSAGE, MESSAGE: 'hi'})
+        self.assertTrue(len(small) < THRESHOLD)
+        self.assertEqual(COMPRESSION.compress(MESSAGE, small), (small, False))
+        large = dumps({ACTION: RESPONSE, ANSWER: 'x' * 1000})
+        self.assertEqual(COMPRESSION.compress(RESPONSE, large), (large, False))
+        never = Compression(compression.dictionary())
+        self.assertEqual(never.compress(MESSAGE, large), (large, False))
+
+    def test_max_size(self):
+        limited = Compression('', threshold=0, max_size=1000)
+        (sent, compressed) = limited.compress(None, '\0' * 1000)
+        self.assertTrue(compressed)
+        self.assertEqual(limited.decompress(sent), '\0' * 1000)
+        (sent, _) = limited.compress(None, '\0' * 1001)
+        self.assertEqual(limited.decompress(sent), None)
+
+    def test_bomb(self):
+        data = bomb(COMPRESSION, 64 << 20)
+        self.assertTrue(len(data) < 100000)
+        self.assertEqual(COMPRESSION.decompress(data), None)
+
+
+class Receiver(Channel):
+
+    compression = COMPRESSION
+
+    def __init__(self, conn):
+        Channel.__init__(self, conn, ('test', 0), map={})
+        self.received = []
+
+    def Network(self, data):
+        self.received.append(data)
+
+
+class ChannelTestCase(unittest.TestCase):
+
+    def setUp(self):
+        (self.near, far) = socket.socketpair()
+        self.channel = Receiver(far)
+        logging.disable(logging.WARNING)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+        self.channel.close()
+        self.near.close()
+
+    def receive(self, data, compressed=False):
+        frame = FRAME.pack(len(data) | (COMPRESSED if compressed else 0)) + data
+        return self.channel.handle_incoming(memoryview(frame))
+
+    def test_receive(self):
+        data = dumps({ACTION: MESSAGE, MESSAGE: 'x' * 500})
+        self.receive(data)
+        self.receive(COMPRESSION.compress(MESSAGE, data)[0], True)
+        self.assertEqual(len(self.channel.received), 2)
+        self.assertEqual(self.channel.received[0], self.channel.received[1])
+        self.assertTrue(self.channel.connected)
+
+    def test_not_accepted(self):
+        self.channel.accept_compressed = False
+        data = dumps({ACTION: MESSAGE, MESSAGE: 'x' * 500})
+        self.receive(COMPRESSION.compress(MESSAGE, data)[0], True)
+        self.assertEqual(self.channel.received, [])
+        self.assertFalse(self.channel.connected)
+
+    def test_bomb(self):
+        self.receive(bomb(COMPRESSION, 8 << 20), True)
+        self.assertEqual(self.channel.received, [])
+        self.assertFalse(self.channel.connected)
+
+    def test_frame_too_large(self):
+        handled = self.channel.handle_incoming(memoryview(FRAME.pack(MAX_FRAME + 1) + 'x' * 10))
+        self.assertEqual(handled, FRAME.size + 10)
+        self.assertFalse(self.channel.connected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from framework.PodSixNet import loopback
+
+
+class LoopbackTestCase(unittest.TestCase):
+
+    def test_stream(self):
+        (connected, _, rate, wrong) = loopback.run('stream', 50, 0.5, 100)
+        self.assertEqual(connected, 50)
+        self.assertTrue(rate > 0)
+        self.assertEqual(wrong, 0)
+
+    def test_stream_large_messages(self):
+        # larger than Stream.read_size, so they arrive in pieces
+        (connected, _, rate, wrong) = loopback.run('stream', 5, 0.5, 200000)
+        self.assertEqual(connected, 5)
+        self.assertTrue(rate > 0)
+        self.assertEqual(wrong, 0)
+
+    def test_asynchat(self):
+        (connected, _, rate, wrong) = loopback.run('asynchat', 5, 0.5, 100)
+        self.assertEqual(connected, 5)
+        self.assertTrue(rate > 0)
+        self.assertEqual(wrong, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
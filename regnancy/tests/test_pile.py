@@ -0,0 +1,220 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import random
+import unittest
+
+from framework.regnancyexception import PileIsEmptyException
+from game import rules
+from game.cards.base import Moat
+from game.cards.common import Copper, Estate, Silver
+from game.game import Game
+from game.gametrigger import T_ATTACK
+from game.pile import Hand, KingdomPile, Pile
+from game.player import Player
+from game.snapshot import DroppingEventManager
+
+
+class PileTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.cards = [Copper() for _ in xrange(10)]
+        self.pile = Pile()
+        for card in self.cards:
+            self.pile.add(card)
+
+    def assertPile(self, cards):
+        pile = self.pile
+        self.assertEqual(len(pile), len(cards))
+        self.assertEqual(list(pile), cards)
+        self.assertEqual(list(pile.reverse()), cards[::-1])
+        for card in self.cards:
+            self.assertEqual(card in pile, card in cards)
+        for card in cards:
+            self.assertIs(pile.get_card(card.id), card)
+
+    def test_add(self):
+        self.assertPile(self.cards)
+        self.pile.add(self.cards[0])
+        self.assertPile(self.cards)
+
+    def test_remove_leaves_holes(self):
+        cards = self.cards[:]
+        for i in (3, 5, 1):
+            self.pile.remove(self.cards[i])
+            cards.remove(self.cards[i])
+            self.assertPile(cards)
+            self.assertRaises(StopIteration, self.pile.get_card, self.cards[i].id)
+        self.assertRaises(ValueError, self.pile.remove, self.cards[3])
+        self.assertIs(self.pile[0], cards[0])
+        self.assertIs(self.pile[2], cards[2])
+        self.assertIs(self.pile.bottom_card, cards[0])
+
+    def test_take_skips_holes_on_top(self):
+        self.pile.remove(self.cards[9])
+        self.pile.remove(self.cards[8])
+        self.assertIs(self.pile.take(), self.cards[7])
+        self.assertPile(self.cards[:7])
+
+    def test_holes_get_closed(self):
+        # there are never more holes than cards
+        cards = self.cards[:]
+        for card in self.cards[1:8]:
+            self.pile.remove(card)
+            cards.remove(card)
+            self.assertTrue(len(self.pile.cards) - len(self.pile) <= len(self.pile))
+        self.assertPile(cards)
+
+    def test_add_after_remove(self):
+        self.pile.remove(self.cards[4])
+        self.pile.add(self.cards[4])
+        self.assertPile(self.cards[:4] + self.cards[5:] + [self.cards[4]])
+
+    def test_empty(self):
+        for card in self.cards:
+            self.pile.remove(card)
+        self.assertPile([])
+        self.assertEqual(self.pile.take(save=True), None)
+        self.assertRaises(PileIsEmptyException, self.pile.take)
+
+    def test_shuffle_sort(self):
+        self.pile.remove(self.cards[2])
+        self.pile.shuffle(random.Random(1))
+        shuffled = list(self.pile)
+        self.assertEqual(sorted(shuffled, key=id), sorted(self.cards[:2] + self.cards[3:], key=id))
+        self.assertPile(shuffled)
+        self.pile.sort(key=lambda c: c.id)
+        self.assertPile(sorted(shuffled, key=lambda c: c.id))
+
+    def test_shuffle_into(self):
+        other = Pile()
+        self.pile.remove(self.cards[0])
+        self.pile.shuffle_into(other, random.Random(2))
+        self.assertPile([])
+        self.assertEqual(sorted(other, key=id), sorted(self.cards[1:], key=id))
+
+    def test_watcher(self):
+        calls = []
+        pile = Pile()
+        pile.watcher = lambda p, empty: calls.append(empty)
+        pile.add(self.cards[0])
+        pile.add(self.cards[1])
+        pile.remove(self.cards[0])
+        pile.take()
+        pile.add(self.cards[2])
+        pile.shuffle_into(Pile())
+        self.assertEqual(calls, [False, True, False, True])
+
+    def test_card_types(self):
+        pile = Pile()
+        cards = [Copper(), Estate(), Silver(), Moat()]
+        for card in cards:
+            pile.add(card)
+        pile.remove(cards[0])
+        self.assertEqual(pile.get_treasures(), [cards[2]])
+        self.assertEqual(pile.get_victories(), [cards[1]])
+        self.assertEqual(pile.get_actions(), [cards[3]])
+        self.assertEqual(pile.get_all_of_card_class(Copper), [])
+
+
+class HandTestCase(unittest.TestCase):
+
+    def test_reacting(self):
+        hand = Hand()
+        (moat, copper, other) = (Moat(), Copper(), Moat())
+        for card in (moat, copper, other):
+            hand.add(card)
+        self.assertEqual(hand.reacting(T_ATTACK), [moat, other])
+        hand.remove(moat)
+        self.assertEqual(hand.reacting(T_ATTACK), [other])
+        hand.take()
+        self.assertEqual(hand.reacting(T_ATTACK), [])
+        self.assertEqual(hand.reacting('nothing'), [])
+
+
+class ZoneTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.game = Game(DroppingEventManager())
+        self.players = [Player(name, self.game, i + 1) for (i, name) in enumerate(('a', 'b'))]
+        self.game.setup(rules.randomsetup(), self.players, 5)
+        self.player = self.game.active_player
+
+    def assertZones(self, player):
+        zones = {}
+        for zone in (player.hand, player.board, player.drawpile, player.discardpile,
+                     player.island, player.nativeVillage):
+            for card in zone:
+                self.assertIs(player.zone_of(card), zone)
+                zones[card.id] = zone
+        self.assertEqual(player.zones, zones)
+
+    def test_zones(self):
+        player = self.player
+        self.assertZones(player)
+        card = player.hand[0]
+        player.discard_card(card)
+        self.assertIs(player.zone_of(card), player.discardpile)
+        player.move_card_to_pile(card, player.board)
+        self.assertIs(player.zone_of(card), player.board)
+        player.trash_card(card)
+        self.assertIs(player.zone_of(card), None)
+        self.assertFalse(card in player.deck)
+        self.assertTrue(card in self.game.trash)
+        for _ in xrange(12):
+            player.draw_card()
+        self.assertZones(player)
+        new = Silver()
+        player.take_card(new)
+        self.assertIs(player.zone_of(new), player.discardpile)
+        self.assertZones(player)
+
+    def test_other_zone(self):
+        card = self.player.hand[0]
+        self.assertRaises(AssertionError, self.player.board.add, card)
+
+
+class SupplyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.game = Game(DroppingEventManager())
+        players = [Player(name, self.game, i + 1) for (i, name) in enumerate(('a', 'b'))]
+        self.game.setup(rules.randomsetup(), players, 9)
+
+    def test_views(self):
+        game = self.game
+        kingdom = game.kingdompiles
+        self.assertEqual([p.cost for p in kingdom], sorted(p.cost for p in kingdom))
+        self.assertIs(game.kingdompiles, kingdom)
+        self.assertEqual(game.allpiles, tuple(game.commonpiles) + kingdom)
+        self.assertIs(game.allpiles, game.allpiles)
+
+    def test_get_pile(self):
+        game = self.game
+        for pile in game.allpiles:
+            for key in (pile.card, pile.name, pile.id):
+                self.assertIs(game.get_pile(key), pile)
+        self.assertIs(game.get_pile('no such card'), None)
+        self.assertIs(game.get_pile([1, 2]), None)
+
+    def test_new_pile(self):
+        game = self.game
+        pile = KingdomPile(Moat, 3)
+        pile.cost = (-1, 0)
+        game._kingdompiles.append(pile)
+        game.invalidate_piles()
+        self.assertIs(game.kingdompiles[0], pile)
+        self.assertIs(game.get_pile(Moat), pile)
+
+    def test_empty_piles(self):
+        game = self.game
+        pile = game.kingdompiles[0]
+        self.assertFalse(pile in game.empty_piles)
+        cards = [pile.take() for _ in xrange(len(pile))]
+        self.assertTrue(pile in game.empty_piles)
+        pile.add(cards[0])
+        self.assertFalse(pile in game.empty_piles)
+
+
+if __name__ == '__main__':
+    unittest.main()
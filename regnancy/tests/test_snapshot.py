@@ -0,0 +1,66 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from game import rules
+from game.cards.card import CostModifier
+from game.cards.intrigue import Bridge
+from game.cards.prosperity import Quarry
+from game.game import Game
+from game.player import Player
+from game.snapshot import DroppingEventManager, GameCopier
+
+
+class SnapshotTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.game = Game(DroppingEventManager())
+        players = [Player(name, self.game, i + 1) for (i, name) in enumerate(('a', 'b'))]
+        self.game.setup(rules.randomsetup(), players, 3)
+
+    def test_independent(self):
+        copy = self.game.snapshot()
+        player = copy.active_player
+        self.assertIsNot(player, self.game.active_player)
+        hand = [c.name for c in self.game.active_player.hand]
+        copy.discard_cards([c.id for c in player.hand], player)
+        self.assertEqual([c.name for c in self.game.active_player.hand], hand)
+        self.assertEqual(len(player.hand), 0)
+
+    def test_cost_modifiers(self):
+        player = self.game.active_player
+        quarry = Quarry()
+        player.board.add(quarry)
+        self.game.add_cost_mod(CostModifier(Bridge(), player))
+        self.game.add_cost_mod(CostModifier(quarry, player))
+        self.assertEqual(self.game.get_cost(Bridge()), (1, 0))
+        copy = self.game.snapshot()
+        (_, quarry_mod) = copy.cost_mod
+        self.assertIsNot(quarry_mod, (self.game.cost_mod)[1])
+        self.assertIs(quarry_mod.player, copy.active_player)
+        self.assertIn(quarry_mod.card, copy.active_player.board)
+        self.assertEqual(copy.get_cost(Bridge()), (1, 0))
+        copy.add_cost_mod(CostModifier(Bridge(), copy.active_player))
+        self.assertEqual(copy.get_cost(Bridge()), (0, 0))
+        self.assertEqual(self.game.get_cost(Bridge()), (1, 0))
+
+    def test_closure_refers_to_itself(self):
+        seen = []
+
+        def loop(n):
+            seen.append(n)
+            if n:
+                loop(n - 1)
+
+        copy = GameCopier().copy(loop)
+        self.assertIsNot(copy, loop)
+        copy(2)
+        self.assertEqual(seen, [])
+        cells = dict(zip(copy.func_code.co_freevars, copy.func_closure))
+        self.assertIs(cells['loop'].cell_contents, copy)
+        self.assertEqual(cells['seen'].cell_contents, [2, 1, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import random
+import unittest
+from uuid import uuid4
+
+from framework.event import ChangeBoardEvent, ChangeHandEvent, ChangePilesEvent, \
+    PlayerInfoEvent
+from framework.locals import *
+from framework.PodSixNet.rencode import dumps, loads
+from framework.regnancyexception import OutOfSyncException
+from game import rules, sync, wire
+from game.cards.base import Moat
+from game.cards.common import Copper, Estate, Gold, Silver
+from game.playerinfo import PlayerInfo
+from game.simulation import BigMoneyStrategy, Simulation
+
+
+def describe(field, part):
+    """The part as plain values, to compare parts the Mirror unpacked"""
+
+    if field in (HAND, BOARD):
+        return [(c.__class__, c.id, getattr(c, 'calc_cost', None)) for c in part]
+    if field == DECK:
+        return part
+    if field in (BOARDSETUP, BOARDCOMMON):
+        return [(p.id, p.card, len(p), tuple(p.calc_cost)) for p in part]
+    return [[getattr(i, f, None) for f in wire.PLAYERINFO_FIELDS] for i in part]
+
+
+class Client(object):
+
+    """A client as the room keeps it, with the Mirror at its other end"""
+
+    def __init__(self):
+        self.synced = {}
+        self.mirror = sync.Mirror()
+
+
+class SyncTestCase(unittest.TestCase):
+
+    def send(self, client, field, part):
+        """
+        Sends the part to the client like the room does, and checks that its
+        Mirror has what a full rebuild from a snapshot gives. Returns the update."""
+
+        state = sync.pack(field, part)
+        update = sync.update(field, client.synced.get(field), state)
+        client.synced[field] = state
+        if update is not None:
+            client.mirror.update(field, loads(dumps(update)))
+        rebuilt = sync.Mirror().update(field, loads(dumps(sync.update(field, None, state))))
+        self.assertEqual(describe(field, client.mirror.parts[field]), describe(field, rebuilt))
+        return update
+
+    def cards(self, *classes):
+        cards = [cls() for cls in classes]
+        for card in cards:
+            card.calc_cost = card.cost
+        return cards
+
+    def test_cards(self):
+        client = Client()
+        cards = self.cards(Copper, Estate, Silver, Moat, Gold)
+        self.assertEqual(self.send(client, HAND, cards)[0], sync.SNAPSHOT)
+        self.assertEqual(self.send(client, HAND, cards), None)
+        # removed, played on top and one that changed its cost
+        hand = cards[:1] + cards[2:4] + self.cards(Gold, Gold)
+        hand[1].calc_cost = (1, 0)
+        self.assertEqual(self.send(client, HAND, hand)[0], sync.CHANGES)
+        # reordered
+        self.assertEqual(self.send(client, HAND, hand[::-1])[0], sync.SNAPSHOT)
+        self.assertEqual(self.send(client, HAND, []), (sync.SNAPSHOT, []))
+        self.send(client, HAND, cards)
+
+    def test_deck(self):
+        client = Client()
+        deck = self.cards(Copper, Copper, Estate, Moat)
+        self.assertEqual(self.send(client, DECK, deck)[0], sync.SNAPSHOT)
+        deck = deck[1:] + self.cards(Silver)
+        self.assertEqual(self.send(client, DECK, deck)[0], sync.CHANGES)
+        deck = [c for c in deck if not isinstance(c, Moat)]
+        self.assertEqual(self.send(client, DECK, deck)[0], sync.CHANGES)
+        self.assertFalse(Moat in client.mirror.parts[DECK])
+
+    def test_supply(self):
+        client = Client()
+        piles = [(uuid4(), cls, 10, (cls.cost[0], 0)) for cls in (Copper, Silver, Moat)]
+        self.assertEqual(self.send(client, BOARDSETUP, piles)[0], sync.SNAPSHOT)
+        piles[1] = piles[1][:2] + (9, (2, 0))
+        piles[2] = piles[2][:3] + ((0, 0), )
+        self.assertEqual(self.send(client, BOARDSETUP, piles), (sync.CHANGES, [(1, 9, 2, 0), (2, 10, 0, 0)]))
+        piles = piles[1:]
+        self.assertEqual(self.send(client, BOARDSETUP, piles)[0], sync.SNAPSHOT)
+
+    def test_players(self):
+        client = Client()
+        infos = [PlayerInfo(name, 5, 5, 0, 1, 1, 0, i == 0, 3, 0, uuid4())
+                 for (i, name) in enumerate((u'a', u'\xe9'))]
+        for info in infos:
+            info.player_id = uuid4()
+        self.assertEqual(self.send(client, PLAYERINFO, infos)[0], sync.SNAPSHOT)
+        infos[0].current = False
+        infos[1].current = True
+        infos[1].money = 4
+        self.assertEqual(self.send(client, PLAYERINFO, infos)[0], sync.CHANGES)
+        infos.append(PlayerInfo(u'c', 5, 5, 0, 1, 1, 0, False, 3, 0, uuid4()))
+        self.assertEqual(self.send(client, PLAYERINFO, infos)[0], sync.SNAPSHOT)
+
+    def test_out_of_sync(self):
+        mirror = sync.Mirror()
+        cards = self.cards(Copper, Estate)
+        self.assertRaises(OutOfSyncException, mirror.update, HAND,
+                          sync.update(HAND, sync.pack(HAND, cards), sync.pack(HAND, cards[1:])))
+        mirror.update(HAND, sync.update(HAND, None, sync.pack(HAND, cards[1:])))
+        self.assertRaises(OutOfSyncException, mirror.update, HAND, (sync.CHANGES, ([cards[0].id], [])))
+        # the changes are ignored until the next snapshot
+        self.assertEqual(mirror.update(HAND, (sync.CHANGES, ([], []))), None)
+        self.assertFalse(HAND in mirror.parts)
+        state = sync.pack(HAND, cards)
+        self.assertEqual(describe(HAND, mirror.update(HAND, sync.update(HAND, None, state))),
+                         describe(HAND, cards))
+
+    def test_games(self):
+        for seed in xrange(2):
+            random.seed(seed)
+            simulation = SyncSimulation(self, rules.randomsetup(),
+                                        [BigMoneyStrategy(), BigMoneyStrategy(), BigMoneyStrategy()],
+                                        seed=seed)
+            simulation.run()
+            self.assertTrue(simulation.updates[sync.CHANGES] > simulation.updates[sync.SNAPSHOT])
+
+
+class SyncSimulation(Simulation):
+
+    """Sends the parts to a client of every player as the game goes on"""
+
+    def __init__(self, test, *args, **kwargs):
+        Simulation.__init__(self, *args, **kwargs)
+        self.test = test
+        self.clients = dict((p, Client()) for p in self.players)
+        self.updates = {sync.SNAPSHOT: 0, sync.CHANGES: 0}
+        handler = self.ev.handler
+        handler[ChangeHandEvent] = self.hand
+        handler[ChangeBoardEvent] = self.board
+        handler[ChangePilesEvent] = self.piles
+        handler[PlayerInfoEvent] = self.infos
+
+    def send(self, clients, parts):
+        for client in clients:
+            for (field, part) in parts.iteritems():
+                update = self.test.send(client, field, part)
+                if update is not None:
+                    self.updates[update[0]] += 1
+
+    def hand(self, event):
+        for card in event.player.hand:
+            card.calc_cost = self.game.get_cost(card)
+        self.send([self.clients[event.player]], {HAND: event.player.hand, DECK: event.player.deck})
+
+    def board(self, event):
+        for card in event.player.board:
+            card.calc_cost = self.game.get_cost(card)
+        self.send(self.clients.values(), {BOARD: event.player.board})
+
+    def piles(self, event):
+        game = self.game
+        self.send(self.clients.values(),
+                  {BOARDSETUP: [(p.id, p.card, len(p), game.get_cost(p)) for p in game.kingdompiles],
+                   BOARDCOMMON: [(p.id, p.card, len(p), game.get_cost(p)) for p in game.commonpiles]})
+
+    def infos(self, event):
+        for (info, player) in zip(event.playerinfos, self.players):
+            info.player_id = player.id
+        self.send(self.clients.values(), {PLAYERINFO: event.playerinfos})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import unittest
+from uuid import uuid4, UUID
+
+from framework.locals import *
+from framework.PodSixNet.rencode import dumps, loads
+from framework.regnancyexception import RegnancyException
+from game import wire
+from game.askplayerinfo import AskYesNo
+from game.cards.base import Moat
+from game.cards.common import Copper, Curse, Estate
+from game.pile import Pile
+from game.playerinfo import PlayerInfo
+
+
+def sent(value):
+    """value as it arrives at the other end"""
+
+    return wire.unpack_value(loads(dumps(wire.pack_value(value))))
+
+
+class WireTestCase(unittest.TestCase):
+
+    def assertCard(self, card, other):
+        self.assertIs(card.__class__, other.__class__)
+        self.assertEqual(card.id, other.id)
+        self.assertEqual(getattr(card, 'calc_cost', None), getattr(other, 'calc_cost', None))
+
+    def test_native(self):
+        for value in (None, True, False, 0, -7, 2 ** 40, -2 ** 62, 0.5, '', 'text',
+                      [], [1, 'a', [2.5, None]], {'a': 1, 2: [3]}):
+            self.assertEqual(sent(value), value)
+        self.assertIs(type(sent(True)), bool)
+
+    def test_tuple_unicode(self):
+        for value in ((), (1, 2), ((1, ), [(2, 'b')]), u'', u'Gr\xfc\xdfe ☺',
+                      (u'a', 'a'), {u'k': (u'v', )}):
+            self.assertEqual(sent(value), value)
+        self.assertIs(type(sent(u'a')), unicode)
+        self.assertIs(type(sent('a')), str)
+        self.assertIs(type(sent((1, ))), tuple)
+        self.assertIs(type(sent([1])), list)
+
+    def test_uuid(self):
+        for value in [uuid4() for _ in xrange(20)] + [UUID(int=0), UUID(int=(1 << 128) - 1),
+                                                      UUID(int=1 << 63), UUID(int=1 << 127)]:
+            self.assertEqual(sent(value), value)
+            self.assertEqual(wire.unpack_uuid(*wire.pack_uuid(value)), value)
+            for half in wire.pack_uuid(value):
+                self.assertTrue(-2 ** 63 <= half < 2 ** 63)
+
+    def test_card(self):
+        card = Moat()
+        copy = sent(card)
+        self.assertCard(copy, card)
+        self.assertFalse(copy.virtual)
+        card.calc_cost = (2, 0)
+        self.assertCard(sent(card), card)
+
+    def test_card_class(self):
+        for cls in wire.CARD_CLASSES:
+            self.assertIs(sent(cls), cls)
+        self.assertEqual(wire.CARD_NUMBERS[Copper], wire.CARD_CLASSES.index(Copper))
+
+    def test_pile(self):
+        pile = Pile()
+        for card in (Copper(), Estate(), Curse(), Moat()):
+            pile.add(card)
+        pile[1].calc_cost = (2, 1)
+        pile.remove(pile[2])
+        cards = sent(pile)
+        self.assertEqual(len(cards), len(pile))
+        for (card, other) in zip(cards, pile):
+            self.assertCard(card, other)
+        self.assertEqual(sent(Pile()), [])
+
+    def test_playerinfo(self):
+        info = PlayerInfo(u'J\xfcrgen', 5, 10, 2, 1, 1, 3, True, 7, 0, uuid4())
+        for player_id in (None, uuid4()):
+            if player_id is not None:
+                info.player_id = player_id
+            copy = sent(info)
+            self.assertIs(copy.__class__, PlayerInfo)
+            for field in wire.PLAYERINFO_FIELDS:
+                self.assertEqual(getattr(copy, field, None), getattr(info, field, None))
+
+    def test_infotoken(self):
+        card = Moat()
+        info = AskYesNo(card, u'Reveal it?')
+        copy = sent(info)
+        self.assertIs(copy.__class__, AskYesNo)
+        self.assertEqual(copy.__dict__, info.__dict__)
+        self.assertEqual(str(copy), str(info))
+
+    def test_nested(self):
+        (card, pile_id) = (Moat(), uuid4())
+        value = [(card, pile_id), {pile_id: [Copper, u'x']}]
+        copy = sent(value)
+        self.assertCard(copy[0][0], card)
+        self.assertEqual(copy[0][1], pile_id)
+        self.assertEqual(copy[1], {pile_id: [Copper, u'x']})
+
+    def test_unknown(self):
+        self.assertRaises(RegnancyException, wire.pack_value, object())
+
+    def test_encode(self):
+        card = Moat()
+        message = {ACTION: RESPONSE, ANSWER: [card], RESULT: (u'\xe4', 1), VALUE: 'plain'}
+        packed = wire.encode(message)
+        self.assertEqual(packed[VALUE], 'plain')
+        self.assertEqual(packed[ACTION], RESPONSE)
+        copy = wire.decode(loads(dumps(packed)))
+        self.assertEqual(sorted(copy), sorted(message))
+        self.assertCard(copy[ANSWER][0], card)
+        self.assertEqual(copy[RESULT], (u'\xe4', 1))
+        self.assertEqual(wire.decode(wire.encode({})), {})
+
+
+if __name__ == '__main__':
+    unittest.main()